@@ -1,9 +1,12 @@
 from django.contrib import admin
 
-from .models import Author, Category, Publisher, Book, Profile
+from .models import Author, Category, Publisher, Book, Profile, EnrichmentJob, GoogleBooksVolume, GoogleBooksSearch
 
 admin.site.register(Author)
 admin.site.register(Category)
 admin.site.register(Publisher)
 admin.site.register(Book)
-admin.site.register(Profile)
\ No newline at end of file
+admin.site.register(Profile)
+admin.site.register(EnrichmentJob)
+admin.site.register(GoogleBooksVolume)
+admin.site.register(GoogleBooksSearch)
\ No newline at end of file
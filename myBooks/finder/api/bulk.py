@@ -0,0 +1,419 @@
+from collections import Counter
+
+from django.db import IntegrityError, connections, router, transaction
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .. import caching
+from .. import duplicates
+from .. import editions
+from .. import models
+from .. import library
+from .. import names
+from .. import recommendations
+from .. import search
+from .. import votes
+
+MAX_ITEMS = 5000
+CONFLICT = 'A concurrent request changed the same objects, try again.'
+
+
+class NamedItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(max_length=50)
+
+
+class RelatedItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(max_length=50, required=False)
+
+    def validate(self, attrs):
+        if 'id' not in attrs and not attrs.get('name', '').strip():
+            raise serializers.ValidationError('Either id or name is required.')
+        return attrs
+
+
+class BookItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=200)
+    year = serializers.IntegerField(min_value=0, max_value=32767, required=False, allow_null=True)
+    isbn = serializers.CharField(max_length=13, required=False, allow_blank=True, allow_null=True)
+    g_rank = serializers.FloatField(required=False, allow_null=True)
+    thumbnail = serializers.URLField(max_length=500, required=False, allow_blank=True, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    authors = RelatedItemSerializer(many=True, required=False)
+    categories = RelatedItemSerializer(many=True, required=False)
+    publisher = RelatedItemSerializer(required=False, allow_null=True)
+
+
+class VoteItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    book_id = serializers.IntegerField()
+    value = serializers.ChoiceField(choices=models.Vote.VOTE_CHOICES)
+
+
+class BulkHandler:
+    model = None
+    item_serializer_class = None
+
+    def __init__(self, request):
+        self.request = request
+        self.profile = getattr(request.user, 'profile', None)
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def validate_items(self, items, partial=False):
+        serializer = self.item_serializer_class(data=items, many=True, partial=partial)
+        serializer.is_valid()
+        errors = [dict(error) for error in serializer.errors] if serializer.errors else [{} for _ in items]
+        validated = serializer.validated_data if not serializer.errors else [None for _ in items]
+        if partial:
+            for index, item in enumerate(items):
+                if not isinstance(item, dict) or 'id' not in item:
+                    errors[index]['id'] = ['This field is required.']
+        return validated, errors
+
+    def get_instances(self, validated, errors):
+        ids = [item['id'] for item in validated if item and 'id' in item]
+        for pk, count in Counter(ids).items():
+            if count > 1:
+                self.add_error(validated, errors, 'id', pk, 'Duplicated in this request.')
+        instances = self.get_queryset().in_bulk(ids)
+        for index, item in enumerate(validated):
+            if item and 'id' in item and item['id'] not in instances:
+                errors[index].setdefault('id', []).append('Not found.')
+        return instances
+
+    @staticmethod
+    def add_error(validated, errors, field, value, message):
+        for index, item in enumerate(validated):
+            if item and item.get(field) == value:
+                errors[index].setdefault(field, []).append(message)
+
+    @staticmethod
+    def raise_for_errors(errors):
+        if any(errors):
+            raise ValidationError(errors)
+
+    def bulk_create(self, objects):
+        # backends that cannot return the ids of a bulk insert save the objects one by one, like the importer
+        using = router.db_for_write(self.model)
+        if connections[using].features.can_return_rows_from_bulk_insert:
+            return self.model.objects.using(using).bulk_create(objects)
+        for obj in objects:
+            obj.save(using=using)
+        return objects
+
+    def create(self, items):
+        validated, errors = self.validate_items(items)
+        self.validate_create(validated, errors)
+        self.raise_for_errors(errors)
+        objects = self.create_objects(validated)
+        return [{'id': str(obj.pk), 'status': 'created'} for obj in objects]
+
+    def conflict_errors(self, items, partial=False):
+        # a write failed on a unique constraint, the rows a concurrent request committed after the validation
+        # are visible now and validating again points at the conflicting items
+        validated, errors = self.validate_items(items, partial=partial)
+        if partial:
+            self.validate_update(validated, errors, self.get_instances(validated, errors))
+        else:
+            self.validate_create(validated, errors)
+        if any(errors):
+            return errors
+        return [{api_settings.NON_FIELD_ERRORS_KEY: [CONFLICT]} for _ in items]
+
+    def update(self, items):
+        validated, errors = self.validate_items(items, partial=True)
+        instances = self.get_instances(validated, errors)
+        self.validate_update(validated, errors, instances)
+        self.raise_for_errors(errors)
+        objects = self.update_objects(validated, instances)
+        return [{'id': str(obj.pk), 'status': 'updated'} for obj in objects]
+
+    def delete(self, items):
+        validated = [{'id': item.get('id') if isinstance(item, dict) else item} for item in items]
+        errors = [{} for _ in items]
+        for index, item in enumerate(validated):
+            if not isinstance(item['id'], int) or isinstance(item['id'], bool):
+                errors[index]['id'] = ['A valid integer is required.']
+                item.pop('id')
+        instances = self.get_instances(validated, errors)
+        self.raise_for_errors(errors)
+        # deletes send signals, which keep the search index, vote aggregates and caches up to date
+        with search.deferred_indexing():
+            self.get_queryset().filter(pk__in=list(instances)).delete()
+        return [{'id': str(item['id']), 'status': 'deleted'} for item in validated]
+
+    def validate_create(self, validated, errors):
+        pass
+
+    def validate_update(self, validated, errors, instances):
+        pass
+
+    def create_objects(self, validated):
+        raise NotImplementedError
+
+    def update_objects(self, validated, instances):
+        raise NotImplementedError
+
+
+class NamedBulkHandler(BulkHandler):
+    item_serializer_class = NamedItemSerializer
+
+    def __init__(self, request, model):
+        super().__init__(request)
+        self.model = model
+        self.scope = model._meta.model_name
+        if model is models.Publisher:
+            self.book_ids = lambda objects: models.Book.objects.filter(publisher__in=objects).values_list('id')
+        else:
+            through = getattr(models.Book, 'authors' if model is models.Author else 'categories').through
+            self.book_ids = lambda objects: through.objects.filter(**{self.scope + '__in': objects}).values_list(
+                'book_id')
+
+    def validate_names(self, validated, errors, instances=None):
+        item_names = [item['name'] for item in validated if item and 'name' in item]
+        for name, count in Counter(item_names).items():
+            if count > 1:
+                self.add_error(validated, errors, 'name', name, 'Duplicated in this request.')
+        existing = dict(self.model.objects.filter(name__in=item_names).values_list('name', 'id'))
+        for index, item in enumerate(validated):
+            if item and item.get('name') in existing and existing[item['name']] != item.get('id'):
+                errors[index].setdefault('name', []).append('{} with this name already exists.'.format(
+                    self.model._meta.verbose_name.capitalize()))
+
+    def validate_create(self, validated, errors):
+        self.validate_names(validated, errors)
+
+    def validate_update(self, validated, errors, instances):
+        self.validate_names(validated, errors)
+
+    def create_objects(self, validated):
+        objects = self.bulk_create([self.model(name=item['name'], added_by=self.profile) for item in validated])
+        caching.bump_objects(self.scope, [obj.pk for obj in objects])
+        return objects
+
+    def update_objects(self, validated, instances):
+        objects = []
+        for item in validated:
+            instance = instances[item['id']]
+            instance.name = item.get('name', instance.name)
+            objects.append(instance)
+        self.model.objects.bulk_update(objects, ['name'])
+        # bulk_update sends no signals, so the books listing the renamed objects are refreshed here
+        book_ids = [pk for pk, in self.book_ids(objects)]
+        search.index_books(book_ids)
+        caching.bump_objects(self.scope, [obj.pk for obj in objects])
+        caching.bump_objects('book', book_ids)
+        caching.bump_scope(caching.BOOK_LIST_SCOPE)
+        return objects
+
+
+class BookBulkHandler(BulkHandler):
+    model = models.Book
+    item_serializer_class = BookItemSerializer
+    scope = 'book'
+    fields = ['title', 'year', 'isbn', 'g_rank', 'thumbnail', 'description']
+    relations = [('authors', models.Author), ('categories', models.Category)]
+
+    def validate_related(self, validated, errors):
+        # every id referenced by the batch is checked with one query per related model
+        for field, model in self.relations + [('publisher', models.Publisher)]:
+            related = [(index, value) for index, item in enumerate(validated) if item and item.get(field)
+                       for value in (item[field] if field != 'publisher' else [item[field]])]
+            existing = set(model.objects.filter(id__in={value['id'] for _, value in related if 'id' in value})
+                           .values_list('id', flat=True))
+            for index, value in related:
+                if 'id' in value and value['id'] not in existing:
+                    errors[index].setdefault(field, []).append('{} {} not found.'.format(
+                        model._meta.verbose_name.capitalize(), value['id']))
+
+    def validate_isbns(self, validated, errors):
+        # the whole batch is checked against the catalogue with one query of the canonical isbn index
+        isbns = [(index, editions.canonical_isbn(item['isbn'])) for index, item in enumerate(validated)
+                 if item and item.get('isbn')]
+        for index, isbn in isbns:
+            if isbn is None:
+                errors[index].setdefault('isbn', []).append(duplicates.INVALID_ISBN)
+        counts = Counter(isbn for _, isbn in isbns if isbn)
+        existing = duplicates.find_books(counts)
+        for index, isbn in isbns:
+            if counts.get(isbn, 0) > 1:
+                errors[index].setdefault('isbn', []).append('Duplicated in this request.')
+            elif isbn in existing and existing[isbn] != validated[index].get('id'):
+                errors[index].setdefault('isbn', []).append(duplicates.DUPLICATE_ISBN)
+
+    def validate_create(self, validated, errors):
+        self.validate_related(validated, errors)
+        self.validate_isbns(validated, errors)
+
+    def validate_update(self, validated, errors, instances):
+        self.validate_related(validated, errors)
+        self.validate_isbns(validated, errors)
+
+    def resolve(self, validated):
+        resolved = {}
+        for field, model in self.relations + [('publisher', models.Publisher)]:
+            values = [value for item in validated if item.get(field)
+                      for value in (item[field] if field != 'publisher' else [item[field]])]
+            item_names = names.split_names([value['name'] for value in values if 'id' not in value])
+            resolved[field] = names.NameResolver(model, self.profile).resolve(item_names)
+        return resolved
+
+    @staticmethod
+    def related_ids(values, ids):
+        return list(dict.fromkeys(value['id'] if 'id' in value else ids.get(value['name'].strip()[:50])
+                                  for value in values))
+
+    def apply(self, book, item, resolved):
+        for field in self.fields:
+            if field in item:
+                setattr(book, field, item[field])
+        # bulk writes skip Book.save, which keeps the canonical isbn
+        book.isbn_canonical = editions.canonical_isbn(book.isbn)
+        if 'publisher' in item:
+            publisher = item['publisher']
+            book.publisher_id = self.related_ids([publisher], resolved['publisher'])[0] if publisher else None
+
+    def set_relations(self, books, validated, resolved, replace=False):
+        for field, model in self.relations:
+            through = getattr(models.Book, field).through
+            changed = [(book, item) for book, item in zip(books, validated) if field in item]
+            if replace and changed:
+                through.objects.filter(book_id__in=[book.id for book, _ in changed]).delete()
+            through.objects.bulk_create([
+                through(**{'book_id': book.id, model._meta.model_name + '_id': pk})
+                for book, item in changed for pk in self.related_ids(item[field], resolved[field])])
+
+    def after_write(self, books, validated, resolved, previous=()):
+        search.index_books([book.id for book in books])
+        caching.bump_objects('book', [book.id for book in books])
+        caching.bump_scope(caching.BOOK_LIST_SCOPE)
+        for field, model in self.relations:
+            pks = list(resolved[field].values()) + [value['id'] for item in validated
+                                                    for value in item.get(field) or [] if 'id' in value]
+            caching.bump_objects(model._meta.model_name, pks + [pk for name, pk in previous if name == field])
+        caching.bump_objects('publisher', [book.publisher_id for book in books if book.publisher_id] +
+                             [pk for name, pk in previous if name == 'publisher'])
+
+    def create_objects(self, validated):
+        resolved = self.resolve(validated)
+        books = []
+        for item in validated:
+            book = models.Book(added_by=self.profile)
+            self.apply(book, item, resolved)
+            books.append(book)
+        self.bulk_create(books)
+        self.set_relations(books, validated, resolved)
+        self.after_write(books, validated, resolved)
+        return books
+
+    def update_objects(self, validated, instances):
+        resolved = self.resolve(validated)
+        books = [instances[item['id']] for item in validated]
+        # the pages of relations the books are moved away from have to be refreshed too
+        previous = [('publisher', book.publisher_id) for book in books if book.publisher_id]
+        for field, model in self.relations:
+            previous += [(field, pk) for pk, in getattr(models.Book, field).through.objects.filter(
+                book_id__in=[book.id for book in books]).values_list(model._meta.model_name + '_id')]
+        for book, item in zip(books, validated):
+            self.apply(book, item, resolved)
+        fields = [field for field in self.fields if any(field in item for item in validated)]
+        if 'isbn' in fields:
+            fields.append('isbn_canonical')
+        if any('publisher' in item for item in validated):
+            fields.append('publisher')
+        if fields:
+            models.Book.objects.bulk_update(books, fields)
+        self.set_relations(books, validated, resolved, replace=True)
+        self.after_write(books, validated, resolved, previous)
+        return books
+
+
+class VoteBulkHandler(BulkHandler):
+    model = models.Vote
+    item_serializer_class = VoteItemSerializer
+
+    def __init__(self, request):
+        super().__init__(request)
+        if self.profile is None:
+            raise PermissionDenied('Only users with a profile can vote.')
+
+    def get_queryset(self):
+        return models.Vote.objects.filter(profile=self.profile)
+
+    def validate_create(self, validated, errors):
+        book_ids = [item['book_id'] for item in validated if item]
+        for book_id, count in Counter(book_ids).items():
+            if count > 1:
+                self.add_error(validated, errors, 'book_id', book_id, 'Duplicated in this request.')
+        existing = set(models.Book.objects.filter(id__in=book_ids).values_list('id', flat=True))
+        voted = set(self.get_queryset().filter(book_id__in=book_ids).values_list('book_id', flat=True))
+        for index, item in enumerate(validated):
+            if item and item['book_id'] not in existing:
+                errors[index].setdefault('book_id', []).append('Book not found.')
+            elif item and item['book_id'] in voted:
+                errors[index].setdefault('book_id', []).append('You have already voted on this book.')
+
+    def validate_update(self, validated, errors, instances):
+        for index, item in enumerate(validated):
+            if item and item.get('id') in instances and item.get('book_id', instances[item['id']].book_id) \
+                    != instances[item['id']].book_id:
+                errors[index].setdefault('book_id', []).append('The book of a vote cannot be changed.')
+
+    def refresh_books(self, book_ids):
+        votes.rebuild_vote_aggregates(models.Book.objects.filter(id__in=book_ids))
+        models.Book.objects.filter(id__in=book_ids).update(similarity_stale=True)
+        library.invalidate([self.profile.pk])
+        recommendations.invalidate([self.profile.pk])
+        caching.bump_objects('book', book_ids)
+        caching.bump_scope(caching.BOOK_LIST_SCOPE)
+
+    def create_objects(self, validated):
+        objects = self.bulk_create([models.Vote(profile=self.profile, book_id=item['book_id'], value=item['value'])
+                                    for item in validated])
+        self.refresh_books([vote.book_id for vote in objects])
+        return objects
+
+    def update_objects(self, validated, instances):
+        objects = []
+        for item in validated:
+            vote = instances[item['id']]
+            vote.value = item.get('value', vote.value)
+            objects.append(vote)
+        models.Vote.objects.bulk_update(objects, ['value'])
+        self.refresh_books([vote.book_id for vote in objects])
+        return objects
+
+
+class BulkModelMixin:
+    bulk_handler_class = None
+
+    def get_bulk_handler(self):
+        if self.bulk_handler_class is None:
+            return NamedBulkHandler(self.request, self.queryset.model)
+        return self.bulk_handler_class(self.request)
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk', permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError('Send a non-empty list of items.')
+        if len(items) > MAX_ITEMS:
+            raise ValidationError('Send at most {} items at once.'.format(MAX_ITEMS))
+        handler = self.get_bulk_handler()
+        try:
+            with transaction.atomic():
+                if request.method == 'POST':
+                    return Response(handler.create(items), status=status.HTTP_201_CREATED)
+                elif request.method == 'PATCH':
+                    return Response(handler.update(items))
+                return Response(handler.delete(items))
+        except IntegrityError:
+            raise ValidationError(handler.conflict_errors(items, partial=request.method == 'PATCH'))
@@ -1,6 +1,11 @@
+from collections import defaultdict
+
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
+from .. import duplicates
+from .. import editions
 from .. import models
 
 
@@ -82,6 +87,25 @@ class BookSerializer(serializers.Serializer):
     authors = AuthorSerializer(many=True, required=False)
     categories = CategorySerializer(many=True, required=False)
     publisher = PublisherSerializer(many=False, required=False)
+    year = serializers.IntegerField(min_value=0, max_value=32767, required=False, allow_null=True)
+    isbn = serializers.CharField(max_length=13, required=False, allow_blank=True, allow_null=True)
+    g_rank = serializers.FloatField(required=False, allow_null=True)
+    thumbnail = serializers.URLField(max_length=500, required=False, allow_blank=True, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    added_by = serializers.CharField(source='added_by_id', read_only=True)
+    added_date = serializers.DateField(read_only=True)
+    vote_count = serializers.IntegerField(read_only=True)
+    vote_average = serializers.FloatField(read_only=True)
+
+    def validate_isbn(self, value):
+        isbn = editions.clean_isbn(value)
+        if not isbn:
+            return value
+        if not editions.is_valid_isbn(isbn):
+            raise serializers.ValidationError(duplicates.INVALID_ISBN)
+        if duplicates.find_book(isbn, exclude=self.instance.pk if self.instance else None) is not None:
+            raise serializers.ValidationError(duplicates.DUPLICATE_ISBN)
+        return isbn
 
     def create(self, validated_data):
         auth_list = []
@@ -130,6 +154,49 @@ class BookSerializer(serializers.Serializer):
         return instance
 
 
+class BookReadSerializer:
+    # serializes values() rows with relations loaded in bulk, the output matches BookSerializer
+    fields = ['title', 'id', 'year', 'isbn', 'g_rank', 'thumbnail', 'description', 'added_by', 'added_date',
+              'vote_count', 'vote_average']
+
+    def __init__(self, instance, many=False):
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def get_values(cls, queryset, *extra):
+        return queryset.values(*cls.fields, 'publisher_id', 'publisher__name', *extra)
+
+    @staticmethod
+    def get_names(through, field, book_ids):
+        names = defaultdict(list)
+        rows = through.objects.filter(book_id__in=book_ids).order_by(field + '__name').values_list(
+            'book_id', field + '_id', field + '__name')
+        for book_id, pk, name in rows:
+            names[book_id].append({'name': name, 'id': str(pk)})
+        return names
+
+    def to_representation(self, row, authors, categories):
+        book = {field: row[field] for field in self.fields}
+        book['id'] = str(row['id'])
+        book['added_by'] = str(row['added_by']) if row['added_by'] else None
+        book['added_date'] = row['added_date'].isoformat() if row['added_date'] else None
+        book['authors'] = authors.get(row['id'], [])
+        book['categories'] = categories.get(row['id'], [])
+        book['publisher'] = ({'name': row['publisher__name'], 'id': str(row['publisher_id'])}
+                             if row['publisher_id'] else None)
+        return book
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        book_ids = [row['id'] for row in rows]
+        authors = self.get_names(models.Book.authors.through, 'author', book_ids) if book_ids else {}
+        categories = self.get_names(models.Book.categories.through, 'category', book_ids) if book_ids else {}
+        books = [self.to_representation(row, authors, categories) for row in rows]
+        return books if self.many else books[0]
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -173,7 +240,11 @@ class VoteSerializer(serializers.Serializer):
         if 'book_id' in validated_data:
             validated_data.pop('book')
             book = models.Book.objects.get(id=validated_data.pop('book_id'))
-            vote = models.Vote.objects.create(book=book, **validated_data)
+            try:
+                with transaction.atomic():
+                    vote = models.Vote.objects.create(book=book, **validated_data)
+            except IntegrityError:
+                raise serializers.ValidationError('You have already voted on this book.')
             return vote
         else:
             raise serializers.ValidationError('Book id number is required.')
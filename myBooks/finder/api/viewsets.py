@@ -1,24 +1,110 @@
+import io
+
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, \
     ListModelMixin
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
-from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
 from django.contrib.auth.models import User
+from django.shortcuts import get_object_or_404
 from ..models import Book, Author, Category, Publisher, Profile, Vote
-from .serializers import BookSerializer, AuthorSerializer, CategorySerializer, \
+from .. import enrichment
+from .. import fanout
+from .. import importer
+from .. import search
+from .. import similarity
+from .. import recommendations
+from .. import ranking
+from .. import friends
+from . import bulk
+from ..pagination import get_ordering
+from .serializers import BookSerializer, BookReadSerializer, AuthorSerializer, CategorySerializer, \
     PublisherSerializer, VoteSerializer, RegisterSerializer, ProfileSerializer
 
 
-class BookModelViewSet(ModelViewSet):
-    queryset = Book.objects.all()
+class BookModelViewSet(bulk.BulkModelMixin, ModelViewSet):
+    queryset = Book.objects.order_by('title', 'id')
+    bulk_handler_class = bulk.BookBulkHandler
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-    def perform_create(self, serializer):
-        serializer.save(added_by=self.request.user.profile)
-
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = search.search_books(queryset, self.request.query_params)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = [field.lstrip('-') for field in get_ordering(queryset)]
+        rows = BookReadSerializer.get_values(
+            queryset, *[field for field in ordering if field not in BookReadSerializer.fields])
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(BookReadSerializer(page, many=True).data)
+        return Response(BookReadSerializer(rows, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        row = get_object_or_404(BookReadSerializer.get_values(self.get_queryset()), pk=kwargs['pk'])
+        return Response(BookReadSerializer(row).data)
 
-class AuthorModelViewSet(ModelViewSet):
-    queryset = Author.objects.all()
+    def perform_create(self, serializer):
+        book = serializer.save(added_by=self.request.user.profile)
+        enrichment.enqueue_incomplete([book])
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', similarity.SIMILAR_LIMIT)), similarity.TOP_K))
+        except ValueError:
+            limit = similarity.SIMILAR_LIMIT
+        get_object_or_404(Book.objects.values('id'), pk=pk)
+        return Response([{'id': str(item.similar_id), 'title': item.similar.title, 'score': item.score}
+                         for item in similarity.get_similar(pk, limit)])
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        try:
+            category = int(request.query_params['category']) if request.query_params.get('category') else None
+            limit = int(request.query_params.get('limit') or 0) or None
+        except ValueError:
+            raise ValidationError('category and limit must be integers.')
+        return Response([{'position': rank.position, 'score': rank.score, 'id': str(rank.book_id),
+                          'title': rank.book.title, 'vote_count': rank.book.vote_count,
+                          'vote_average': rank.book.vote_average, 'g_rank': rank.book.g_rank}
+                         for rank in ranking.get_top(category, limit, request.query_params.get('order'))])
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        found = fanout.search_all(request.query_params)
+        return Response({'partial': found['partial'], 'sources': found['sources'],
+                         'results': [{**item, 'book_id': str(item['book_id']) if item['book_id'] else None}
+                                     for item in found['results']]})
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser],
+            parser_classes=[JSONParser, MultiPartParser])
+    def bulk_import(self, request):
+        if 'file' in request.FILES:
+            stream = io.TextIOWrapper(request.FILES['file'].file, encoding='utf-8', newline='')
+            records = importer.read_records(stream, request.data.get('format', 'jsonl'))
+        elif isinstance(request.data, list):
+            records = request.data
+        else:
+            raise ValidationError('Send a list of books or a file with its format (csv, jsonl or gbooks).')
+        books_importer = importer.BookImporter(added_by=getattr(request.user, 'profile', None))
+        try:
+            stats = books_importer.run(records)
+        except importer.InvalidRecord as e:
+            raise ValidationError(str(e))
+        return Response(stats.as_dict(), status=status.HTTP_201_CREATED)
+
+
+class AuthorModelViewSet(bulk.BulkModelMixin, ModelViewSet):
+    queryset = Author.objects.order_by('name')
     serializer_class = AuthorSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
@@ -26,8 +112,8 @@ class AuthorModelViewSet(ModelViewSet):
         serializer.save(added_by=self.request.user.profile)
 
 
-class CategoryModelViewSet(ModelViewSet):
-    queryset = Category.objects.all()
+class CategoryModelViewSet(bulk.BulkModelMixin, ModelViewSet):
+    queryset = Category.objects.order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
@@ -35,8 +121,8 @@ class CategoryModelViewSet(ModelViewSet):
         serializer.save(added_by=self.request.user.profile)
 
 
-class PublisherModelViewSet(ModelViewSet):
-    queryset = Publisher.objects.all()
+class PublisherModelViewSet(bulk.BulkModelMixin, ModelViewSet):
+    queryset = Publisher.objects.order_by('name')
     serializer_class = PublisherSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
@@ -51,13 +137,41 @@ class RegisterView(CreateModelMixin, GenericViewSet):
 
 
 class ProfileViewSet(RetrieveModelMixin, UpdateModelMixin, ListModelMixin, GenericViewSet):
-    queryset = Profile.objects.all()
+    queryset = Profile.objects.order_by('name')
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
 
-
-class VoteModelViewSet(ModelViewSet):
-    queryset = Vote.objects.all()
+    @action(detail=True, methods=['get'])
+    def recommendations(self, request, pk=None):
+        profile = self.get_object()
+        if profile != getattr(request.user, 'profile', None) and not request.user.is_superuser:
+            raise PermissionDenied('Recommendations are visible to their profile only.')
+        return Response([{'id': str(book.id), 'title': book.title, 'score': score}
+                         for book, score in recommendations.get_recommended_books(profile.pk)])
+
+    @action(detail=True, methods=['get'])
+    def friends(self, request, pk=None):
+        profile = self.get_object()
+        own_id = getattr(getattr(request.user, 'profile', None), 'pk', None)
+        adjacency = friends.get_adjacency([profile.pk, own_id] if own_id else [profile.pk])
+        mutual = adjacency[profile.pk] & adjacency[own_id] if own_id and own_id != profile.pk else set()
+        return Response({'friends': sorted(str(pk) for pk in adjacency[profile.pk]),
+                         'is_friend': own_id in adjacency[profile.pk],
+                         'mutual': sorted(str(pk) for pk in mutual)})
+
+    @action(detail=True, methods=['get'])
+    def suggestions(self, request, pk=None):
+        profile = self.get_object()
+        if profile != getattr(request.user, 'profile', None) and not request.user.is_superuser:
+            raise PermissionDenied('Friend suggestions are visible to their profile only.')
+        counts = friends.get_suggestions(profile.pk)
+        names = dict(Profile.objects.filter(pk__in=[pk for pk, count in counts]).values_list('pk', 'name'))
+        return Response([{'id': str(pk), 'name': names[pk], 'mutual': count} for pk, count in counts if pk in names])
+
+
+class VoteModelViewSet(bulk.BulkModelMixin, ModelViewSet):
+    queryset = Vote.objects.order_by('id')
+    bulk_handler_class = bulk.VoteBulkHandler
     serializer_class = VoteSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
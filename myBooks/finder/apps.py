@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FinderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finder'
+
+    def ready(self):
+        from . import metrics
+        from . import routers
+        from . import signals
@@ -0,0 +1,139 @@
+import random
+import string
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.migrations.loader import MigrationLoader
+from django.core.management import call_command
+
+from . import search
+
+ALIAS = 'finder_benchmark'
+# the last migration before the indexes of the hot queries were added
+BEFORE = ('finder', '0008_book_rank')
+BOOKS = 1000000
+PROFILES = 1000
+VOTES_PER_PROFILE = 200
+RATED_SHARE = 0.3
+BATCH_SIZE = 20000
+REPEAT = 5
+PAGE_SIZE = 11
+
+
+def _book_list(apps, params):
+    return apps.get_model('finder', 'Book').objects.using(ALIAS).order_by('title', 'id')
+
+
+# the queries behind the book list, book detail and library lookups
+QUERIES = {
+    'book list': lambda apps, params: _book_list(apps, params)[:PAGE_SIZE],
+    'book list by year': lambda apps, params: search.search_books(_book_list(apps, params),
+                                                                  {'year': str(params['year'])})[:PAGE_SIZE],
+    'book list by rating': lambda apps, params: search.search_books(_book_list(apps, params),
+                                                                    {'order': 'rating'})[:PAGE_SIZE],
+    'book by isbn': lambda apps, params: apps.get_model('finder', 'Book').objects.using(ALIAS).filter(
+        isbn=params['isbn']),
+    'vote of profile for book': lambda apps, params: apps.get_model('finder', 'Vote').objects.using(ALIAS).filter(
+        profile_id=params['profile_id'], book_id=params['book_id']),
+    'votes of profile': lambda apps, params: apps.get_model('finder', 'Vote').objects.using(ALIAS).filter(
+        profile_id=params['profile_id']).values_list('book_id', 'value'),
+    'profile list': lambda apps, params: apps.get_model('finder', 'Profile').objects.using(ALIAS).order_by(
+        'name')[:PAGE_SIZE],
+}
+
+
+@contextmanager
+def scratch_database(path):
+    # a separate sqlite file, the configured databases are never touched
+    connections.settings[ALIAS] = connections.configure_settings({
+        'default': connections.settings['default'],
+        ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(path)},
+    })[ALIAS]
+    try:
+        yield ALIAS
+    finally:
+        connections[ALIAS].close()
+        del connections[ALIAS]
+        del connections.settings[ALIAS]
+
+
+def get_apps(target=None):
+    loader = MigrationLoader(connections[ALIAS])
+    return loader.project_state(target or loader.graph.leaf_nodes('finder')[0]).apps
+
+
+def migrate(target=None):
+    call_command('migrate', *(target or ['finder']), database=ALIAS, verbosity=0)
+    with connections[ALIAS].cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return get_apps(target)
+
+
+def _batches(items, size=BATCH_SIZE):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(apps, books=BOOKS, profiles=PROFILES, votes_per_profile=VOTES_PER_PROFILE, seed=0):
+    generator = random.Random(seed)
+    User = apps.get_model('auth', 'User')
+    Profile = apps.get_model('finder', 'Profile')
+    Book = apps.get_model('finder', 'Book')
+    Vote = apps.get_model('finder', 'Vote')
+
+    users = User.objects.using(ALIAS).bulk_create([User(username='reader{}'.format(number), password='!')
+                                                   for number in range(profiles)])
+    profile_ids = [uuid.UUID(int=generator.getrandbits(128), version=4) for _ in range(profiles)]
+    Profile.objects.using(ALIAS).bulk_create([Profile(id=profile_id, user_id=user.id, name=user.username)
+                                              for profile_id, user in zip(profile_ids, users)])
+    for batch in _batches(Book(
+            title='{} {}'.format(''.join(generator.choices(string.ascii_lowercase, k=8)).capitalize(), number),
+            year=generator.randint(1800, 2022), isbn='978{:010d}'.format(generator.randrange(10 ** 10)),
+            vote_average=round(generator.uniform(1, 10), 2) if generator.random() < RATED_SHARE else None)
+            for number in range(books)):
+        Book.objects.using(ALIAS).bulk_create(batch)
+    # a fresh database numbers the books from one
+    for batch in _batches(Vote(profile_id=profile_id, book_id=book_id, value=generator.randint(1, 10))
+                          for profile_id in profile_ids
+                          for book_id in generator.sample(range(1, books + 1), min(votes_per_profile, books))):
+        Vote.objects.using(ALIAS).bulk_create(batch)
+
+
+def get_params(apps):
+    Book = apps.get_model('finder', 'Book')
+    Vote = apps.get_model('finder', 'Vote')
+    book = Book.objects.using(ALIAS).order_by('id')[Book.objects.using(ALIAS).count() // 2]
+    vote = Vote.objects.using(ALIAS).order_by('id').last()
+    return {'year': book.year, 'isbn': book.isbn, 'profile_id': vote.profile_id, 'book_id': vote.book_id}
+
+
+def measure(apps, params, repeat=REPEAT):
+    results = {}
+    for name, query in QUERIES.items():
+        queryset = query(apps, params)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - started)
+        results[name] = {'ms': min(timings) * 1000, 'plan': queryset.explain()}
+    return results
+
+
+def run(path, books=BOOKS, profiles=PROFILES, votes_per_profile=VOTES_PER_PROFILE, repeat=REPEAT):
+    with scratch_database(path):
+        apps = migrate(BEFORE)
+        seed(apps, books, profiles, votes_per_profile)
+        params = get_params(apps)
+        before = measure(apps, params, repeat)
+        after = measure(migrate(), params, repeat)
+    return [{'name': name, 'before_ms': before[name]['ms'], 'after_ms': after[name]['ms'],
+             'before_plan': before[name]['plan'], 'after_plan': after[name]['plan']} for name in QUERIES]
@@ -0,0 +1,78 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import prefetch_related_objects
+from django.utils.functional import SimpleLazyObject
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 600,
+}
+
+GLOBAL_SCOPE = 'global'
+BOOK_LIST_SCOPE = 'book-list'
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PAGE_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_options()['CACHE']]
+
+
+def version_key(scope, pk=None):
+    return 'finder:version:{}'.format(scope if pk is None else '{}:{}'.format(scope, pk))
+
+
+def _get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # an evicted version must never fall back to a token that fragments were cached with before
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def get_version(*scopes):
+    # a scope is a name like 'book-list' or a (model name, pk) pair, its token changes on every bump
+    keys = [version_key(GLOBAL_SCOPE)] + [version_key(*scope) if isinstance(scope, tuple) else version_key(scope)
+                                          for scope in scopes]
+    versions = _get_versions(keys)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def get_object_versions(scope, pks):
+    # get_version((scope, pk)) of every pk, read in one round trip
+    keys = {pk: version_key(scope, pk) for pk in pks}
+    versions = _get_versions([version_key(GLOBAL_SCOPE), *keys.values()])
+    return {pk: '{}.{}'.format(versions[version_key(GLOBAL_SCOPE)], versions[key]) for pk, key in keys.items()}
+
+
+def bump(*keys):
+    keys = [key for key in keys if key]
+    if keys:
+        get_cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def bump_objects(scope, pks):
+    bump(*[version_key(scope, pk) for pk in set(pks)])
+
+
+def bump_scope(scope):
+    bump(version_key(scope))
+
+
+def lazy_prefetch(objects, *lookups):
+    def load():
+        prefetch_related_objects(objects, *lookups)
+        return objects
+    return SimpleLazyObject(load)
+
+
+def get_context(*scopes):
+    options = get_options()
+    return {'cache_alias': options['CACHE'], 'cache_timeout': options['TIMEOUT'], 'cache_version': get_version(*scopes)}
@@ -0,0 +1,7 @@
+from django.utils.functional import SimpleLazyObject
+
+from .library import get_library
+
+
+def library(request):
+    return {'library': SimpleLazyObject(lambda: get_library(request))}
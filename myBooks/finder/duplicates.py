@@ -0,0 +1,152 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from . import caching
+from . import editions
+from . import library
+from . import models
+from . import recommendations
+from . import search
+from . import votes
+
+BATCH_SIZE = 1000
+# filled in on the kept book from its duplicates when it has no value of its own
+MERGED_FIELDS = ['year', 'g_rank', 'thumbnail', 'description', 'publisher_id']
+
+INVALID_ISBN = 'Enter a valid ISBN-10 or ISBN-13.'
+DUPLICATE_ISBN = 'A book with this ISBN is already in the catalogue.'
+
+
+def find_book(isbn, exclude=None, using='default'):
+    # a single lookup of the canonical isbn index
+    canonical = editions.canonical_isbn(isbn)
+    if canonical is None:
+        return None
+    books = models.Book.objects.using(using).filter(isbn_canonical=canonical)
+    if exclude is not None:
+        books = books.exclude(pk=exclude)
+    return books.order_by('id').values_list('id', flat=True).first()
+
+
+def find_books(isbns, using='default'):
+    # maps the canonical isbns among isbns to the oldest book of each edition
+    canonical = {editions.canonical_isbn(isbn) for isbn in isbns} - {None}
+    if not canonical:
+        return {}
+    found = {}
+    rows = models.Book.objects.using(using).filter(isbn_canonical__in=sorted(canonical)).order_by('id').values_list(
+        'isbn_canonical', 'id')
+    for isbn, book_id in rows:
+        found.setdefault(isbn, book_id)
+    return found
+
+
+def backfill(using='default', batch_size=BATCH_SIZE):
+    # books written by bulk queries or before the column existed get their canonical isbn
+    changed, updated = [], 0
+    rows = models.Book.objects.using(using).exclude(isbn__isnull=True).values_list('id', 'isbn', 'isbn_canonical')
+    for book_id, isbn, current in rows.iterator(chunk_size=batch_size):
+        canonical = editions.canonical_isbn(isbn)
+        if canonical != current:
+            changed.append(models.Book(id=book_id, isbn_canonical=canonical))
+        if len(changed) >= batch_size:
+            updated += models.Book.objects.using(using).bulk_update(changed, ['isbn_canonical'])
+            changed = []
+    if changed:
+        updated += models.Book.objects.using(using).bulk_update(changed, ['isbn_canonical'])
+    return updated
+
+
+def find_groups(using='default'):
+    # the ids of every edition with more than one book, the oldest book comes first and is kept
+    books = models.Book.objects.using(using).filter(isbn_canonical__isnull=False)
+    isbns = books.values('isbn_canonical').annotate(count=Count('id')).filter(count__gt=1).values_list(
+        'isbn_canonical', flat=True)
+    groups = defaultdict(list)
+    for isbn, book_id in books.filter(isbn_canonical__in=isbns).order_by('isbn_canonical', 'id').values_list(
+            'isbn_canonical', 'id'):
+        groups[isbn].append(book_id)
+    return list(groups.values())
+
+
+def _move_links(through, field, targets, using):
+    # links of a duplicate are added to the kept book unless it has them already
+    rows = through.objects.using(using).filter(book_id__in=list(targets)).values_list(field, 'book_id')
+    through.objects.using(using).bulk_create([through(**{field: pk, 'book_id': targets[book_id]})
+                                              for pk, book_id in rows], ignore_conflicts=True)
+    return {pk for pk, _ in rows}
+
+
+def _move_votes(targets, using):
+    # a profile keeps one vote per book, its vote on the kept book or else its latest one on a duplicate
+    kept, dropped = {}, []
+    rows = models.Vote.objects.using(using).filter(book_id__in=list(targets) + list(set(targets.values())))
+    for vote_id, profile_id, book_id in rows.order_by('-date', '-id').values_list('id', 'profile_id', 'book_id'):
+        key = (profile_id, targets.get(book_id, book_id))
+        if key not in kept:
+            kept[key] = (vote_id, book_id)
+        elif book_id == key[1] and kept[key][1] != key[1]:
+            dropped.append(kept[key][0])
+            kept[key] = (vote_id, book_id)
+        else:
+            dropped.append(vote_id)
+    models.Vote.objects.using(using).filter(id__in=dropped).delete()
+    models.Vote.objects.using(using).bulk_update([models.Vote(id=vote_id, book_id=target)
+                                                  for (_, target), (vote_id, book_id) in kept.items()
+                                                  if book_id != target], ['book'])
+    return {profile_id for profile_id, _ in kept}
+
+
+def _fill_missing(targets, using):
+    books = models.Book.objects.using(using).in_bulk(list(targets) + list(set(targets.values())))
+    changed = {}
+    for book_id in sorted(targets):
+        book, duplicate = books[targets[book_id]], books[book_id]
+        for field in MERGED_FIELDS:
+            if getattr(book, field) in [None, ''] and getattr(duplicate, field) not in [None, '']:
+                setattr(book, field, getattr(duplicate, field))
+                changed[book.id] = book
+    if changed:
+        models.Book.objects.using(using).bulk_update(list(changed.values()), MERGED_FIELDS)
+
+
+def merge(groups, using='default'):
+    # every group is merged into its first book, the others are deleted
+    targets = {book_id: group[0] for group in groups for book_id in group[1:]}
+    if not targets:
+        return 0
+    kept = sorted(set(targets.values()))
+    with transaction.atomic(using), search.deferred_indexing(using):
+        _fill_missing(targets, using)
+        profile_ids = _move_votes(targets, using)
+        profile_ids |= _move_links(models.Profile.books.through, 'profile_id', targets, using)
+        authors = _move_links(models.Book.authors.through, 'author_id', targets, using)
+        categories = _move_links(models.Book.categories.through, 'category_id', targets, using)
+        # deletes send signals, which drop the duplicates from the search index and the caches
+        models.Book.objects.using(using).filter(id__in=list(targets)).delete()
+        votes.rebuild_vote_aggregates(models.Book.objects.using(using).filter(id__in=kept))
+        models.Book.objects.using(using).filter(id__in=kept).update(similarity_stale=True)
+        search.index_books(kept, using)
+    caching.bump_objects('book', kept)
+    caching.bump_objects('author', authors)
+    caching.bump_objects('category', categories)
+    caching.bump_scope(caching.BOOK_LIST_SCOPE)
+    library.invalidate(profile_ids, using)
+    recommendations.invalidate(profile_ids, using)
+    return len(targets)
+
+
+def deduplicate(using='default', batch_size=BATCH_SIZE, dry_run=False):
+    # a dry run only counts the duplicates of the canonical isbns already filled in
+    stats = {'backfilled': 0 if dry_run else backfill(using, batch_size), 'editions': 0, 'merged': 0}
+    batch = []
+    for group in find_groups(using) + [None]:
+        if group is not None:
+            stats['editions'] += 1
+            batch.append(group)
+        if batch and (group is None or sum(map(len, batch)) >= batch_size):
+            stats['merged'] += sum(len(books) - 1 for books in batch) if dry_run else merge(batch, using)
+            batch = []
+    return stats
@@ -0,0 +1,31 @@
+import re
+
+# editions are told apart by their ISBN, every valid ISBN-10 has an ISBN-13 with the 978 prefix
+
+
+def clean_isbn(value):
+    return re.sub(r'[\s-]', '', str(value or '')).upper()
+
+
+def isbn10_check_digit(digits):
+    check = (11 - sum((10 - position) * int(digit) for position, digit in enumerate(digits[:9])) % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def isbn13_check_digit(digits):
+    return str((10 - sum(int(digit) * (3 if position % 2 else 1)
+                         for position, digit in enumerate(digits[:12])) % 10) % 10)
+
+
+def canonical_isbn(value):
+    # the ISBN-13 of a valid ISBN-10 or ISBN-13, None for anything else
+    value = clean_isbn(value)
+    if re.fullmatch(r'\d{9}[\dX]', value) and isbn10_check_digit(value) == value[9]:
+        return '978' + value[:9] + isbn13_check_digit('978' + value[:9])
+    if re.fullmatch(r'97[89]\d{10}', value) and isbn13_check_digit(value) == value[12]:
+        return value
+    return None
+
+
+def is_valid_isbn(value):
+    return canonical_isbn(value) is not None
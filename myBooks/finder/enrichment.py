@@ -0,0 +1,262 @@
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.utils import timezone
+
+from . import caching
+from . import editions
+from . import gbooks
+from . import models
+from . import search
+
+DEFAULTS = {
+    'BATCH_SIZE': 20,
+    # Google Books requests per second of all workers together, each worker gets an equal share
+    'RATE': 1.0,
+    'BURST': 5,
+    'MAX_ATTEMPTS': 5,
+    # seconds before the first retry of a failed job, doubled with every attempt
+    'RETRY_DELAY': 60,
+    # running jobs of a worker that died are claimed again after this many seconds
+    'LOCK_TIMEOUT': 600,
+    'POLL_INTERVAL': 5,
+}
+
+FIELDS = ['thumbnail', 'description', 'isbn', 'year', 'g_rank']
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'ENRICHMENT', {})}
+
+
+def _is_missing(value):
+    return value is None or value == ''
+
+
+def missing_condition(field):
+    if field in ['thumbnail', 'description', 'isbn']:
+        return Q(**{field + '__isnull': True}) | Q(**{field: ''})
+    return Q(**{field + '__isnull': True})
+
+
+def missing_filter():
+    return Q(*[missing_condition(field) for field in FIELDS], _connector=Q.OR)
+
+
+def enqueue(book_ids, using='default', batch_size=1000):
+    # books with a pending or running job are skipped, the partial unique constraint only backs this up where
+    # conditional constraints are supported, MySQL ignores it
+    book_ids = list(dict.fromkeys(book_ids))
+    queued = 0
+    for start in range(0, len(book_ids), batch_size):
+        batch = book_ids[start:start + batch_size]
+        active = set(models.EnrichmentJob.objects.using(using).filter(
+            book_id__in=batch, status__in=models.EnrichmentJob.ACTIVE).values_list('book_id', flat=True))
+        jobs = [models.EnrichmentJob(book_id=book_id) for book_id in batch if book_id not in active]
+        models.EnrichmentJob.objects.using(using).bulk_create(jobs, ignore_conflicts=True)
+        queued += len(jobs)
+    return queued
+
+
+def enqueue_incomplete(books, using='default'):
+    return enqueue([book.id for book in books if any(_is_missing(getattr(book, field)) for field in FIELDS)], using)
+
+
+def enqueue_missing(using='default'):
+    book_ids = models.Book.objects.using(using).filter(missing_filter()).exclude(
+        enrichment_jobs__status__in=models.EnrichmentJob.ACTIVE).values_list('id', flat=True)
+    return enqueue(book_ids.iterator(), using)
+
+
+def get_status(using='default'):
+    counts = dict(models.EnrichmentJob.objects.using(using).values_list('status').annotate(count=Count('id')))
+    return {status: counts.get(status, 0) for status, _ in models.EnrichmentJob.STATUS_CHOICES}
+
+
+class RateLimiter:
+    # token bucket, acquire() blocks until a request may be sent
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+            self.tokens -= 1
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+def claim(worker, batch_size, using='default'):
+    # the conditional UPDATE is the lock, a job claimed by another worker meanwhile no longer matches it
+    options = get_options()
+    now = timezone.now()
+    jobs = models.EnrichmentJob.objects.using(using)
+    due = Q(status=models.EnrichmentJob.PENDING, run_after__lte=now) | Q(
+        status=models.EnrichmentJob.RUNNING, locked_at__lt=now - timedelta(seconds=options['LOCK_TIMEOUT']))
+    token = '{}:{}'.format(worker, uuid.uuid4().hex)[-64:]
+    candidates = jobs.filter(due).order_by('run_after', 'id').values_list('id', flat=True)
+    claimed = {'status': models.EnrichmentJob.RUNNING, 'locked_by': token, 'locked_at': now, 'updated': now}
+    if connections[using].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using):
+            jobs.filter(due, id__in=list(candidates.select_for_update(skip_locked=True)[:batch_size])).update(
+                **claimed)
+    else:
+        # a single statement, sqlite would fail to upgrade a read transaction while another worker writes
+        jobs.filter(due, id__in=candidates[:batch_size]).update(**claimed)
+    claimed = jobs.filter(locked_by=token, status=models.EnrichmentJob.RUNNING).order_by('id')
+    return list(claimed.select_related('book').prefetch_related('book__authors'))
+
+
+def _normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+def _isbns(volume):
+    return {editions.canonical_isbn(identifier.get('identifier')) for identifier in
+            volume.get('volumeInfo', {}).get('industryIdentifiers', [])} - {None}
+
+
+def find_volume(client, book):
+    # an isbn match is trusted, a title search only counts when the title is the same
+    if book.isbn:
+        volumes = client.search(isbn=book.isbn, strict=True)
+        volume = next((volume for volume in volumes if editions.canonical_isbn(book.isbn) in _isbns(volume)), None)
+        if volume is not None:
+            return volume
+    authors = ' '.join(author.name for author in book.authors.all()[:1])
+    volumes = client.search(title=book.title, authors=authors, strict=True)
+    return next((volume for volume in volumes
+                 if _normalize(volume.get('volumeInfo', {}).get('title')) == _normalize(book.title)), None)
+
+
+def fill_missing(book, volume):
+    details = gbooks.serialize_volume(volume)
+    year = str(details.get('year') or '')
+    found = {
+        'thumbnail': details.get('thumbnail') or None,
+        'description': details.get('description') or None,
+        'isbn': (details.get('isbn') or '')[:13] or None,
+        'year': int(year) if year.isdigit() and int(year) <= 32767 else None,
+        'g_rank': float(details['gbooks_rank']) if details.get('gbooks_rank') not in ['', None] else None,
+    }
+    filled = [field for field in FIELDS if _is_missing(getattr(book, field)) and found[field] is not None]
+    for field in filled:
+        setattr(book, field, found[field])
+    # the update skips Book.save, which keeps the canonical isbn
+    book.isbn_canonical = editions.canonical_isbn(book.isbn)
+    return filled
+
+
+def filled_values(book, filled):
+    # a field is only written while it is still missing, values edited after the job was claimed are kept
+    def fill(field, condition):
+        return Case(When(condition, then=Value(getattr(book, field))), default=F(field),
+                    output_field=models.Book._meta.get_field(field))
+
+    values = {field: fill(field, missing_condition(field)) for field in filled}
+    if 'isbn' in filled:
+        values['isbn_canonical'] = fill('isbn_canonical', missing_condition('isbn'))
+    return values
+
+
+class Worker:
+    def __init__(self, name=None, client=None, limiter=None, using='default', **options):
+        self.options = {**get_options(), **options}
+        self.name = name or 'worker-{}'.format(uuid.uuid4().hex[:8])
+        self.client = client or gbooks.get_client()
+        self.limiter = limiter or RateLimiter(self.options['RATE'], self.options['BURST'])
+        self.using = using
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def process(self, jobs):
+        done, retried, failed = [], [], []
+        for job in jobs:
+            try:
+                self.limiter.acquire()
+                volume = find_volume(self.client, job.book)
+            except gbooks.GoogleBooksError as e:
+                job.attempts += 1
+                job.error = str(e)
+                if job.attempts >= self.options['MAX_ATTEMPTS']:
+                    failed.append(job)
+                else:
+                    job.run_after = timezone.now() + timedelta(
+                        seconds=self.options['RETRY_DELAY'] * 2 ** (job.attempts - 1))
+                    retried.append(job)
+                continue
+            except Exception as e:
+                # a job that breaks the worker is recorded and never retried
+                job.attempts += 1
+                job.error = '{}: {}'.format(type(e).__name__, e)
+                failed.append(job)
+                continue
+            job.attempts += 1
+            if volume is None:
+                job.error = 'No matching Google Books volume.'
+                failed.append(job)
+                continue
+            job.filled = ','.join(fill_missing(job.book, volume))
+            job.error = ''
+            done.append(job)
+        books = self.save(done, retried, failed)
+        return {'done': len(done), 'retried': len(retried), 'failed': len(failed), 'books': len(books)}
+
+    def save(self, done, retried, failed):
+        now = timezone.now()
+        jobs = models.EnrichmentJob.objects.using(self.using)
+        book_ids = []
+        with transaction.atomic(self.using):
+            for finished, status in [(done, models.EnrichmentJob.DONE), (retried, models.EnrichmentJob.PENDING),
+                                     (failed, models.EnrichmentJob.FAILED)]:
+                for job in finished:
+                    # a job claimed again after LOCK_TIMEOUT belongs to the other worker, its results are dropped
+                    saved = jobs.filter(id=job.id, status=models.EnrichmentJob.RUNNING, locked_by=job.locked_by).update(
+                        status=status, attempts=job.attempts, run_after=job.run_after, locked_by='', locked_at=None,
+                        filled=job.filled, error=job.error, updated=now)
+                    if not saved:
+                        continue
+                    job.status, job.locked_by, job.locked_at, job.updated = status, '', None, now
+                    if status == models.EnrichmentJob.DONE and job.filled:
+                        models.Book.objects.using(self.using).filter(id=job.book_id).update(
+                            **filled_values(job.book, job.filled.split(',')))
+                        book_ids.append(job.book_id)
+        if book_ids:
+            # the updates send no signals, the search index and cached pages are refreshed here
+            search.index_books(book_ids, self.using)
+            caching.bump_objects('book', book_ids)
+            caching.bump_scope(caching.BOOK_LIST_SCOPE)
+        return book_ids
+
+    def run_once(self):
+        jobs = claim(self.name, self.options['BATCH_SIZE'], self.using)
+        return self.process(jobs) if jobs else None
+
+    def run(self, burst=False, callback=None):
+        # burst workers stop once no job is due, the others poll for new jobs until stopped
+        while not self.stopped:
+            stats = self.run_once()
+            if stats is not None:
+                if callback:
+                    callback(self, stats)
+            elif burst:
+                break
+            else:
+                time.sleep(self.options['POLL_INTERVAL'])
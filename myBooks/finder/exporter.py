@@ -0,0 +1,108 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import models
+from . import names
+
+FORMATS = ['jsonl', 'csv']
+CHUNK_SIZE = 2000
+
+BOOK_FIELDS = ['id', 'title', 'authors', 'categories', 'publisher', 'year', 'isbn', 'g_rank', 'thumbnail',
+               'description', 'added_date', 'vote_count', 'vote_average']
+VOTE_FIELDS = ['id', 'book_id', 'profile_id', 'value', 'date']
+OWNED_FIELDS = ['profile_id', 'book_id']
+
+
+class UnknownExport(ValueError):
+    pass
+
+
+def _chunks(rows, chunk_size):
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _names(through, field, book_ids, using):
+    book_names = defaultdict(list)
+    rows = through.objects.using(using).filter(book_id__in=book_ids).order_by(field + '__name').values_list(
+        'book_id', field + '__name')
+    for book_id, name in rows:
+        book_names[book_id].append(name)
+    return book_names
+
+
+def iter_books(chunk_size=CHUNK_SIZE, using='default'):
+    fields = [field for field in BOOK_FIELDS if field not in ['authors', 'categories', 'publisher']]
+    rows = models.Book.objects.using(using).order_by('id').values(*fields, 'publisher__name').iterator(
+        chunk_size=chunk_size)
+    # relation names are loaded per chunk, so memory use depends on the chunk size only
+    for chunk in _chunks(rows, chunk_size):
+        book_ids = [row['id'] for row in chunk]
+        authors = _names(models.Book.authors.through, 'author', book_ids, using)
+        categories = _names(models.Book.categories.through, 'category', book_ids, using)
+        for row in chunk:
+            row['authors'] = authors.get(row['id'], [])
+            row['categories'] = categories.get(row['id'], [])
+            row['publisher'] = row.pop('publisher__name')
+            yield {field: row[field] for field in BOOK_FIELDS}
+
+
+def _for_profiles(queryset, profile_ids):
+    # None exports the rows of every profile
+    return queryset if profile_ids is None else queryset.filter(profile_id__in=profile_ids)
+
+
+def iter_votes(chunk_size=CHUNK_SIZE, using='default', profile_ids=None):
+    return _for_profiles(models.Vote.objects.using(using), profile_ids).order_by('id').values(*VOTE_FIELDS).iterator(
+        chunk_size=chunk_size)
+
+
+def iter_owned(chunk_size=CHUNK_SIZE, using='default', profile_ids=None):
+    return _for_profiles(models.Profile.books.through.objects.using(using), profile_ids).order_by('id').values(
+        *OWNED_FIELDS).iterator(chunk_size=chunk_size)
+
+
+DATASETS = {
+    'books': (iter_books, BOOK_FIELDS),
+    'votes': (iter_votes, VOTE_FIELDS),
+    'owned': (iter_owned, OWNED_FIELDS),
+}
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def write_jsonl(records, fields):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def write_csv(records, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for record in records:
+        # lists are joined the way the csv importer splits them
+        yield writer.writerow([names.SEPARATOR.join(value) if isinstance(value, list) else
+                               '' if value is None else value for value in (record[field] for field in fields)])
+
+
+WRITERS = {'jsonl': write_jsonl, 'csv': write_csv}
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def export(dataset, format, chunk_size=CHUNK_SIZE, using='default', **filters):
+    if dataset not in DATASETS:
+        raise UnknownExport('Unknown dataset {}, choose one of: {}.'.format(dataset, ', '.join(DATASETS)))
+    if format not in WRITERS:
+        raise UnknownExport('Unknown format {}, choose one of: {}.'.format(format, ', '.join(FORMATS)))
+    iter_records, fields = DATASETS[dataset]
+    return WRITERS[format](iter_records(chunk_size, using, **filters), fields)
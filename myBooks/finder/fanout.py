@@ -0,0 +1,220 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections, router
+
+from . import duplicates
+from . import editions
+from . import gbooks
+from . import models
+from . import search
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # seconds both sources share, a source that has not answered by then is left out of the results
+    'TIMEOUT': 2.5,
+    'LOCAL_LIMIT': 20,
+    'WORKERS': 8,
+}
+
+FIELDS = ['title', 'authors', 'publisher', 'isbn']
+
+LOCAL, GOOGLE = 'local', 'google'
+OK, TIMEOUT, ERROR = 'ok', 'timeout', 'error'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'FANOUT_SEARCH', {})}
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(max_workers=get_options()['WORKERS'],
+                                                                  thread_name_prefix='finder-search')
+    return _executor
+
+
+def volume_isbns(volume):
+    return {editions.canonical_isbn(identifier.get('identifier')) for identifier in
+            volume.get('volumeInfo', {}).get('industryIdentifiers', [])
+            if identifier.get('type') in ['ISBN_10', 'ISBN_13']} - {None}
+
+
+def search_local(query, limit, using=None):
+    queryset = models.Book.objects.using(using).select_related('publisher').prefetch_related('authors')
+    return list(search.search_books(queryset.order_by('title', 'id'), query)[:limit])
+
+
+def _search_local_in_thread(query, limit, using):
+    # worker threads have their own connections, their queries count towards the request metrics copied with the
+    # context
+    close_old_connections()
+    try:
+        return search_local(query, limit, using)
+    finally:
+        close_old_connections()
+
+
+def _search_google_in_thread(client, query):
+    # the client's store uses a connection of the worker thread
+    close_old_connections()
+    try:
+        return client.search(strict=True, **query)
+    finally:
+        close_old_connections()
+
+
+def _submit(function, *args, **kwargs):
+    return get_executor().submit(contextvars.copy_context().run, function, *args, **kwargs)
+
+
+def _run(function, *args, **kwargs):
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(function(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _start_local(query, limit, using):
+    if connections[using].in_atomic_block:
+        # another connection would not see the uncommitted rows of this transaction, the query runs here and
+        # cannot be cut off at the deadline
+        return _run(search_local, query, limit, using)
+    return _submit(_search_local_in_thread, query, limit, using)
+
+
+def _local_item(book):
+    return {
+        'title': book.title,
+        'authors': [author.name for author in book.authors.all()],
+        'publisher': book.publisher.name if book.publisher else '',
+        'year': book.year or '',
+        'isbn': book.isbn or '',
+        'thumbnail': book.thumbnail or '',
+        'gbooks_rank': book.g_rank if book.g_rank is not None else '',
+        'gbooks_id': '',
+        'book_id': book.id,
+        'in_catalogue': True,
+        'sources': [LOCAL],
+    }
+
+
+def merge(books, volumes, catalogue=None):
+    # catalogue maps canonical isbns to ids of books outside the local results
+    catalogue = catalogue or {}
+    items, by_isbn, by_gbooks_id = [], {}, {}
+    for book in books:
+        item = _local_item(book)
+        items.append(item)
+        if book.isbn_canonical:
+            by_isbn.setdefault(book.isbn_canonical, item)
+    for volume in volumes:
+        isbns = volume_isbns(volume)
+        item = next((by_isbn[isbn] for isbn in sorted(isbns) if isbn in by_isbn), None)
+        if item is None:
+            item = by_gbooks_id.get(volume.get('id'))
+        if item is not None:
+            if GOOGLE not in item['sources']:
+                item['sources'].append(GOOGLE)
+                item['gbooks_id'] = item['gbooks_id'] or volume.get('id', '')
+                details = gbooks.serialize_volume(volume)
+                for field in ['thumbnail', 'gbooks_rank']:
+                    item[field] = item[field] or details[field]
+            continue
+        item = {**gbooks.serialize_volume(volume), 'book_id': None, 'in_catalogue': False, 'sources': [GOOGLE]}
+        book_id = next((catalogue[isbn] for isbn in sorted(isbns) if isbn in catalogue), None)
+        if book_id is not None:
+            item.update(book_id=book_id, in_catalogue=True)
+        items.append(item)
+        by_gbooks_id[volume.get('id')] = item
+        for isbn in isbns:
+            by_isbn.setdefault(isbn, item)
+    return items
+
+
+def get_query(params):
+    return {field: (params.get(field, '') or '').strip() for field in FIELDS}
+
+
+def _collect(futures):
+    # works for thread pool futures and asyncio tasks alike
+    sources, found = {}, {LOCAL: [], GOOGLE: []}
+    for source, future in futures.items():
+        if not future.done() or future.cancelled():
+            sources[source] = TIMEOUT
+            continue
+        try:
+            found[source] = future.result()
+            sources[source] = OK
+        except gbooks.GoogleBooksError:
+            sources[source] = ERROR
+        except Exception:
+            # a failing source leaves the results of the other one
+            logger.exception('%s search failed.', source.capitalize())
+            sources[source] = ERROR
+    return sources, found
+
+
+def _results(sources, found, using):
+    local_isbns = {book.isbn_canonical for book in found[LOCAL]}
+    missing = {isbn for volume in found[GOOGLE] for isbn in volume_isbns(volume)} - local_isbns
+    return {'results': merge(found[LOCAL], found[GOOGLE], duplicates.find_books(missing, using)), 'sources': sources,
+            'partial': any(status != OK for status in sources.values())}
+
+
+def search_all(params, timeout=None, limit=None, client=None):
+    options = get_options()
+    query = get_query(params)
+    if not any(query.values()):
+        return {'results': [], 'sources': {}, 'partial': False}
+    deadline = time.monotonic() + (options['TIMEOUT'] if timeout is None else timeout)
+    limit = limit or options['LOCAL_LIMIT']
+    client = client or gbooks.get_client()
+    using = router.db_for_read(models.Book)
+
+    # a google search that misses the deadline keeps running and fills the client cache for the next request
+    futures = {GOOGLE: _submit(_search_google_in_thread, client, query), LOCAL: _start_local(query, limit, using)}
+    concurrent.futures.wait(futures.values(), timeout=max(deadline - time.monotonic(), 0))
+    return _results(*_collect(futures), using)
+
+
+async def asearch_all(params, timeout=None, limit=None, client=None):
+    options = get_options()
+    query = get_query(params)
+    if not any(query.values()):
+        return {'results': [], 'sources': {}, 'partial': False}
+    limit = limit or options['LOCAL_LIMIT']
+    client = client or gbooks.get_async_client()
+    using = router.db_for_read(models.Book)
+
+    # the google request waits on the event loop and the catalogue is queried by a worker thread, both under the
+    # same deadline; the transaction check needs the request's thread, which asgiref 3.4 finds only from the view's
+    # own task
+    deadline = time.monotonic() + (options['TIMEOUT'] if timeout is None else timeout)
+    google = asyncio.ensure_future(client.search(strict=True, **query))
+    waiting = [google]
+    try:
+        local = await sync_to_async(_start_local)(query, limit, using)
+        waiting.append(asyncio.wrap_future(local))
+        await asyncio.wait(waiting, timeout=max(deadline - time.monotonic(), 0))
+    finally:
+        # a catalogue query still queued is dropped, one already running finishes in its thread
+        for future in waiting:
+            future.cancel()
+    sources, found = _collect({GOOGLE: google, LOCAL: local})
+    return await sync_to_async(_results)(sources, found, using)
@@ -2,29 +2,35 @@ from datetime import date
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.urls import reverse_lazy
+from . import duplicates
+from . import editions
 from . import models
 
 
+def autocomplete(model_name):
+    return reverse_lazy('autocomplete', args=[model_name])
+
+
 class BookCreateForm(forms.ModelForm):
     authors = forms.CharField(label='Author', max_length=100, required=False,
                               widget=forms.TextInput(attrs={'placeholder': 'J.R.R. Tolkien',
-                                                            'extra': models.Author.objects.all()}))
+                                                            'autocomplete_url': autocomplete('author')}))
     categories = forms.CharField(label='Category', max_length=100, required=False,
                                  widget=forms.TextInput(attrs={'placeholder': 'fantasy, children',
-                                                               'extra': models.Category.objects.all()}))
+                                                               'autocomplete_url': autocomplete('category')}))
     publisher = forms.CharField(label='Publisher', max_length=100, required=False,
                                 widget=forms.TextInput(attrs={'placeholder': 'Mordor Inc.',
-                                                              'extra': models.Publisher.objects.all()}))
+                                                              'autocomplete_url': autocomplete('publisher')}))
+    # hyphens and spaces are allowed in the input and dropped by clean_isbn
+    isbn = forms.CharField(label='ISBN', max_length=17, required=False,
+                           widget=forms.TextInput(attrs={'placeholder': '1234567890123'}))
 
     class Meta:
         model = models.Book
         fields = ['title', 'year', 'isbn', 'description', 'thumbnail']
-        labels = {
-            'isbn': 'ISBN',
-        }
         widgets = {
             'title': forms.TextInput(attrs={'placeholder': 'Hobbit'}),
-            'isbn': forms.TextInput(attrs={'placeholder': '1234567890123'}),
             'year': forms.NumberInput(attrs={'placeholder': '1937'}),
             'description': forms.Textarea(attrs={'placeholder': 'A great tale!'}),
             'thumbnail': forms.Textarea(attrs={'placeholder': 'https://example.jpg'}),
@@ -32,20 +38,32 @@ class BookCreateForm(forms.ModelForm):
 
     field_order = ['title', 'authors', 'categories', 'publisher', 'year', 'isbn', 'description', 'thumbnail']
 
+    def clean_isbn(self):
+        isbn = editions.clean_isbn(self.cleaned_data.get('isbn'))
+        if not isbn:
+            return None
+        if not editions.is_valid_isbn(isbn):
+            raise forms.ValidationError(duplicates.INVALID_ISBN)
+        if duplicates.find_book(isbn, exclude=self.instance.pk) is not None:
+            raise forms.ValidationError(duplicates.DUPLICATE_ISBN)
+        return isbn
+
 
 class BookSearchForm(forms.Form):
     title = forms.CharField(label='Title', max_length=100, required=False, widget=forms.TextInput(
         attrs={'placeholder': 'Hobbit'}))
     authors = forms.CharField(label='Authors:', max_length=100, required=False, widget=forms.TextInput(
-        attrs={'placeholder': 'J.R.R. Tolkien', 'extra': models.Author.objects.all()}))
+        attrs={'placeholder': 'J.R.R. Tolkien', 'autocomplete_url': autocomplete('author')}))
     categories = forms.CharField(label='Categories', max_length=100, required=False, widget=forms.TextInput(
-        attrs={'placeholder': 'fantasy, children', 'extra': models.Category.objects.all()}))
+        attrs={'placeholder': 'fantasy, children', 'autocomplete_url': autocomplete('category')}))
     publisher = forms.CharField(label='Publisher', max_length=100, required=False, widget=forms.TextInput(
-        attrs={'placeholder': 'Mordor Inc.', 'extra': models.Publisher.objects.all()}))
+        attrs={'placeholder': 'Mordor Inc.', 'autocomplete_url': autocomplete('publisher')}))
     year = forms.IntegerField(label='Year', min_value=1800, max_value=date.today().year, required=False,
                               widget=forms.NumberInput(attrs={'placeholder': '1937'}))
     isbn = forms.CharField(label='ISBN', required=False, widget=forms.TextInput(
         attrs={'placeholder': '1234567890123'}))
+    min_rating = forms.IntegerField(label='Min. rating', min_value=1, max_value=10, required=False,
+                                    widget=forms.NumberInput(attrs={'placeholder': '7'}))
 
 
 class NameSearchForm(forms.Form):
@@ -55,25 +73,25 @@ class NameSearchForm(forms.Form):
 class AuthorSearchForm(forms.Form):
     name = forms.CharField(label='Name', max_length=100, required=False,
                            widget=forms.TextInput(attrs={'placeholder': 'J.R.R. Tolkien',
-                                                         'extra': models.Author.objects.all()}))
+                                                         'autocomplete_url': autocomplete('author')}))
 
 
 class PublisherSearchForm(forms.Form):
     name = forms.CharField(label='Publisher', max_length=100, required=False,
                            widget=forms.TextInput(attrs={'placeholder': 'Mordor Inc.',
-                                                         'extra': models.Publisher.objects.all()}))
+                                                         'autocomplete_url': autocomplete('publisher')}))
 
 
 class CategorySearchForm(forms.Form):
     name = forms.CharField(label='Category', max_length=100, required=False,
                            widget=forms.TextInput(attrs={'placeholder': 'fantasy, children',
-                                                         'extra': models.Category.objects.all()}))
+                                                         'autocomplete_url': autocomplete('category')}))
 
 
 class ProfileSearchForm(forms.Form):
     name = forms.CharField(label='Profile', max_length=100, required=False,
                            widget=forms.TextInput(attrs={'placeholder': '',
-                                                         'extra': models.Profile.objects.all()}))
+                                                         'autocomplete_url': autocomplete('profile')}))
 
 
 class VoteForm(forms.ModelForm):
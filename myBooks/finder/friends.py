@@ -0,0 +1,60 @@
+from collections import Counter
+
+from . import caching
+from . import models
+
+TIMEOUT = 24 * 3600
+SUGGESTIONS_LIMIT = 10
+SCOPE = 'friends'
+
+
+def cache_key(profile_id, version):
+    return 'finder:friends:{}:{}'.format(profile_id, version)
+
+
+def get_adjacency(profile_ids, using='default'):
+    # friend ids of every profile as a frozenset, so membership checks do not touch the database; the versions are
+    # read before the rows, a list loaded while a friendship changes is stored under a version nobody reads again
+    profile_ids = list(dict.fromkeys(profile_ids))
+    keys = {profile_id: cache_key(profile_id, version)
+            for profile_id, version in caching.get_object_versions(SCOPE, profile_ids).items()}
+    cache = caching.get_cache()
+    cached = cache.get_many(list(keys.values()))
+    adjacency = {profile_id: cached[key] for profile_id, key in keys.items() if key in cached}
+    missing = [profile_id for profile_id in profile_ids if profile_id not in adjacency]
+    if missing:
+        loaded = {profile_id: set() for profile_id in missing}
+        rows = models.Profile.friends.through.objects.using(using).filter(from_profile_id__in=missing).values_list(
+            'from_profile_id', 'to_profile_id')
+        for profile_id, friend_id in rows:
+            loaded[profile_id].add(friend_id)
+        loaded = {profile_id: frozenset(friend_ids) for profile_id, friend_ids in loaded.items()}
+        cache.set_many({keys[profile_id]: friend_ids for profile_id, friend_ids in loaded.items()}, TIMEOUT)
+        adjacency.update(loaded)
+    return adjacency
+
+
+def get_friend_ids(profile_id, using='default'):
+    return get_adjacency([profile_id], using)[profile_id]
+
+
+def are_friends(profile_id, other_id, using='default'):
+    return other_id in get_friend_ids(profile_id, using)
+
+
+def get_mutual_friend_ids(profile_id, other_id, using='default'):
+    adjacency = get_adjacency([profile_id, other_id], using)
+    return adjacency[profile_id] & adjacency[other_id]
+
+
+def get_suggestions(profile_id, limit=SUGGESTIONS_LIMIT, using='default'):
+    # friends of friends ranked by the number of mutual friends
+    friend_ids = get_friend_ids(profile_id, using)
+    counts = Counter()
+    for friends_of_friend in get_adjacency(friend_ids, using).values():
+        counts.update(friends_of_friend - friend_ids - {profile_id})
+    return sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
+
+
+def invalidate(profile_ids):
+    caching.bump_objects(SCOPE, profile_ids)
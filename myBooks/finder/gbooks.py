@@ -0,0 +1,432 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import editions
+from . import metrics
+from . import volumes
+
+DEFAULTS = {
+    'API_URL': 'https://www.googleapis.com/books/v1/volumes',
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 5,
+    'RETRIES': 2,
+    'BACKOFF_FACTOR': 0.2,
+    'POOL_SIZE': 10,
+    'CACHE_TTL': 600,
+    'CACHE_SIZE': 1000,
+    'FAILURE_THRESHOLD': 5,
+    'RECOVERY_TIMEOUT': 30,
+    'MAX_RESULTS': 20,
+    # keep fetched volumes and searches in the database too, see volumes.DEFAULTS
+    'STORE': True,
+}
+
+_MISSING = object()
+_NOT_MODIFIED = object()
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+SEARCH_FIELDS = [('title', 'intitle'), ('authors', 'inauthor'), ('publisher', 'inpublisher'), ('isbn', 'isbn')]
+
+
+class GoogleBooksError(Exception):
+    pass
+
+
+class CircuitOpenError(GoogleBooksError):
+    pass
+
+
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            expires, value = self._data[key]
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, recovery_timeout):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.recovery_timeout
+
+    def allow_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.recovery_timeout:
+                # half-open: let a single probe through, any failure re-opens the circuit
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def build_query(title='', authors='', publisher='', isbn=''):
+    values = {'title': title, 'authors': authors, 'publisher': publisher, 'isbn': isbn}
+    terms = []
+    for field, operator in SEARCH_FIELDS:
+        value = (values[field] or '').strip().lower()
+        if field == 'isbn':
+            value = value.replace('-', '').replace(' ', '')
+            terms += [operator + ':' + value] if value else []
+        else:
+            terms += [operator + ':' + word for word in value.split()]
+    return ' '.join(terms)
+
+
+def serialize_volume(gbook):
+    book = dict()
+    book['title'] = gbook['volumeInfo'].get('title', '')
+    book['authors'] = gbook['volumeInfo'].get('authors', '')
+    book['publisher'] = gbook['volumeInfo'].get('publisher', '')
+    identifiers = {identifier.get('type'): identifier.get('identifier', '')
+                   for identifier in gbook['volumeInfo'].get('industryIdentifiers', [])}
+    isbn = identifiers.get('ISBN_13') or identifiers.get('ISBN_10') or ''
+    # volumes with only an ISBN-10 get its ISBN-13, the form and the catalogue use the same one
+    book['isbn'] = editions.canonical_isbn(isbn) or isbn
+    book['description'] = gbook['volumeInfo'].get('description', '')
+    if 'imageLinks' in gbook['volumeInfo']:
+        book['thumbnail'] = gbook['volumeInfo']['imageLinks'].get('thumbnail', '')
+    else:
+        book['thumbnail'] = ''
+    book['gbooks_rank'] = gbook['volumeInfo'].get('averageRating', '')
+    book['gbooks_link'] = gbook['volumeInfo'].get('previewLink', '')
+    book['gbooks_id'] = gbook.get('id', '')
+    book['year'] = gbook['volumeInfo'].get('publishedDate', '')[:4]
+    return book
+
+
+class BaseGoogleBooksClient:
+    # the in-memory cache is the first level and the optional store in the database the second one
+    def __init__(self, cache=None, breaker=None, store=None, **options):
+        self.options = {**DEFAULTS, **getattr(settings, 'GOOGLE_BOOKS', {}), **options}
+        self.cache = cache if cache is not None else TTLCache(self.options['CACHE_SIZE'], self.options['CACHE_TTL'])
+        self.breaker = breaker if breaker is not None else CircuitBreaker(self.options['FAILURE_THRESHOLD'],
+                                                                          self.options['RECOVERY_TIMEOUT'])
+        self.store = store
+
+    def search_request(self, title='', authors='', publisher='', isbn=''):
+        query = build_query(title=title, authors=authors, publisher=publisher, isbn=isbn)
+        if not query:
+            return None
+        return (('search', query, self.options['MAX_RESULTS']), self.options['API_URL'],
+                {'q': query, 'maxResults': self.options['MAX_RESULTS']})
+
+    def volume_request(self, gbooks_id):
+        gbooks_id = (gbooks_id or '').strip()
+        if not gbooks_id:
+            return None
+        return ('volume', gbooks_id), '{}/{}'.format(self.options['API_URL'].rstrip('/'), gbooks_id), None
+
+    def serialize(self, key, data):
+        # serialized once per fetch, cached and stored next to the payload
+        if data is None:
+            return None
+        if key[0] == 'search':
+            return [serialize_volume(item) for item in data.get('items', [])]
+        return serialize_volume(data)
+
+    def record(self, outcome):
+        metrics.count('gbooks_' + outcome)
+        if self.store is not None:
+            self.store.record(outcome)
+
+    def recall(self, key):
+        cached = self.cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            self.record('memory')
+        return cached
+
+    def remember(self, key, data, details, outcome):
+        self.record(outcome)
+        self.cache.set(key, (data, details))
+        return data, details
+
+    def conditional_headers(self, entry):
+        return {'If-None-Match': entry.etag} if entry is not None and entry.etag else None
+
+    def check_response(self, status_code, parse, headers=None):
+        if status_code >= 500 or status_code == 429:
+            self.breaker.record_failure()
+            raise GoogleBooksError('Google Books API responded with {}.'.format(status_code))
+        self.breaker.record_success()
+        if status_code == 304:
+            return _NOT_MODIFIED, ''
+        if status_code != 200:
+            return None, ''
+        try:
+            return parse(), (headers or {}).get('ETag', '')
+        except ValueError as e:
+            raise GoogleBooksError('Google Books API responded with invalid JSON.') from e
+
+    def check_circuit(self):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError('Google Books API is unavailable, circuit is open.')
+
+
+class GoogleBooksClient(BaseGoogleBooksClient):
+    def __init__(self, cache=None, breaker=None, store=None, **options):
+        super().__init__(cache, breaker, store, **options)
+        self.timeout = (self.options['CONNECT_TIMEOUT'], self.options['READ_TIMEOUT'])
+        self.session = requests.Session()
+        # slow responses are not retried, so READ_TIMEOUT bounds how long a worker can wait
+        retry = Retry(total=self.options['RETRIES'], read=0, backoff_factor=self.options['BACKOFF_FACTOR'],
+                      status_forcelist=RETRY_STATUSES, allowed_methods=['GET'],
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.options['POOL_SIZE'], max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def search(self, title='', authors='', publisher='', isbn='', strict=False):
+        # strict searches raise GoogleBooksError instead of returning no results when the API fails
+        data, _ = self._search(title, authors, publisher, isbn, strict)
+        return data.get('items', []) if data else []
+
+    def search_details(self, title='', authors='', publisher='', isbn=''):
+        return self._search(title, authors, publisher, isbn)[1] or []
+
+    def _search(self, title, authors, publisher, isbn, strict=False):
+        request = self.search_request(title=title, authors=authors, publisher=publisher, isbn=isbn)
+        return self._get(*request, strict=strict) if request else (None, None)
+
+    def volume(self, gbooks_id):
+        request = self.volume_request(gbooks_id)
+        return self._get(*request)[0] if request else None
+
+    def volume_details(self, gbooks_id):
+        request = self.volume_request(gbooks_id)
+        return self._get(*request)[1] if request else None
+
+    def _get(self, key, url, params=None, strict=False):
+        cached = self.recall(key)
+        if cached is not _MISSING:
+            return cached
+        entry = self.store.safely(self.store.get, key) if self.store is not None else None
+        if entry is not None and entry.fresh:
+            return self.remember(key, entry.data, entry.details, 'stored')
+        try:
+            data, etag = self._fetch(url, params, self.conditional_headers(entry))
+        except GoogleBooksError:
+            if entry is not None:
+                # an expired copy is better than nothing while the API fails
+                self.record('stale')
+                return entry.data, entry.details
+            if strict:
+                raise
+            return None, None
+        if data is _NOT_MODIFIED:
+            self.store.safely(self.store.refresh, key)
+            return self.remember(key, entry.data, entry.details, 'revalidated')
+        details = self.serialize(key, data)
+        if self.store is not None and data is not None:
+            self.store.safely(self.store.set, key, data, details, etag)
+        return self.remember(key, data, details, 'fetched')
+
+    def _fetch(self, url, params=None, headers=None):
+        self.check_circuit()
+        try:
+            with metrics.timer('gbooks'):
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise GoogleBooksError(str(e)) from e
+        return self.check_response(response.status_code, response.json, response.headers)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncGoogleBooksClient(BaseGoogleBooksClient):
+    def __init__(self, cache=None, breaker=None, store=None, **options):
+        super().__init__(cache, breaker, store, **options)
+        self.timeout = httpx.Timeout(self.options['READ_TIMEOUT'], connect=self.options['CONNECT_TIMEOUT'])
+        # loading the certificates takes longer than most requests, the sessions of all loops share them
+        self.ssl_context = httpx.create_ssl_context()
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def get_session(self):
+        # httpx connections belong to the event loop that opened them, under ASGI all requests share one loop
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None:
+            session = self._sessions[loop] = httpx.AsyncClient(
+                timeout=self.timeout, verify=self.ssl_context,
+                limits=httpx.Limits(max_connections=self.options['POOL_SIZE']))
+        return session
+
+    async def search(self, title='', authors='', publisher='', isbn='', strict=False):
+        data, _ = await self._search(title, authors, publisher, isbn, strict)
+        return data.get('items', []) if data else []
+
+    async def search_details(self, title='', authors='', publisher='', isbn=''):
+        return (await self._search(title, authors, publisher, isbn))[1] or []
+
+    async def _search(self, title, authors, publisher, isbn, strict=False):
+        request = self.search_request(title=title, authors=authors, publisher=publisher, isbn=isbn)
+        return await self._get(*request, strict=strict) if request else (None, None)
+
+    async def volume(self, gbooks_id):
+        request = self.volume_request(gbooks_id)
+        return (await self._get(*request))[0] if request else None
+
+    async def volume_details(self, gbooks_id):
+        request = self.volume_request(gbooks_id)
+        return (await self._get(*request))[1] if request else None
+
+    async def _get(self, key, url, params=None, strict=False):
+        cached = self.recall(key)
+        if cached is not _MISSING:
+            return cached
+        entry = await self._from_store('get', key)
+        if entry is not None and entry.fresh:
+            return self.remember(key, entry.data, entry.details, 'stored')
+        try:
+            data, etag = await self._fetch(url, params, self.conditional_headers(entry))
+        except GoogleBooksError:
+            if entry is not None:
+                self.record('stale')
+                return entry.data, entry.details
+            if strict:
+                raise
+            return None, None
+        if data is _NOT_MODIFIED:
+            await self._from_store('refresh', key)
+            return self.remember(key, entry.data, entry.details, 'revalidated')
+        details = self.serialize(key, data)
+        if data is not None:
+            await self._from_store('set', key, data, details, etag)
+        return self.remember(key, data, details, 'fetched')
+
+    async def _from_store(self, method, *args):
+        if self.store is None:
+            return None
+        return await sync_to_async(self.store.safely)(getattr(self.store, method), *args)
+
+    async def _fetch(self, url, params=None, headers=None):
+        self.check_circuit()
+        # the same retries as the requests adapter of the sync client, slow responses are not retried
+        for attempt in range(self.options['RETRIES'] + 1):
+            if attempt:
+                await asyncio.sleep(self.options['BACKOFF_FACTOR'] * 2 ** (attempt - 1))
+            try:
+                with metrics.timer('gbooks'):
+                    response = await self.get_session().get(url, params=params, headers=headers)
+            except httpx.TimeoutException as e:
+                self.breaker.record_failure()
+                raise GoogleBooksError(str(e) or 'Google Books API timed out.') from e
+            except httpx.HTTPError as e:
+                if attempt < self.options['RETRIES']:
+                    continue
+                self.breaker.record_failure()
+                raise GoogleBooksError(str(e)) from e
+            if response.status_code in RETRY_STATUSES and attempt < self.options['RETRIES']:
+                continue
+            return self.check_response(response.status_code, response.json, response.headers)
+
+    async def close_session(self):
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.aclose()
+
+    async def aclose(self):
+        for session in list(self._sessions.values()):
+            await session.aclose()
+        self._sessions.clear()
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                options = {**DEFAULTS, **getattr(settings, 'GOOGLE_BOOKS', {})}
+                _client = GoogleBooksClient(store=volumes.VolumeStore() if options['STORE'] else None)
+    return _client
+
+
+def get_async_client():
+    # both clients share the caches and the circuit breaker, a volume fetched by an async view serves the sync one
+    global _async_client
+    if _async_client is None:
+        client = get_client()
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncGoogleBooksClient(cache=client.cache, breaker=client.breaker, store=client.store)
+    return _async_client
+
+
+async def close_request_session():
+    # under WSGI every async view runs its own event loop, the session opened on it would never be used again
+    if _async_client is not None:
+        await _async_client.close_session()
+
+
+@receiver(setting_changed)
+def reset_client(setting, **kwargs):
+    global _client, _async_client
+    if setting in ['GOOGLE_BOOKS', 'GOOGLE_BOOKS_STORE']:
+        if _client is not None:
+            _client.close()
+        _client = _async_client = None
@@ -0,0 +1,200 @@
+import csv
+import json
+import re
+import time
+from itertools import islice
+
+from django.db import connections, transaction
+
+from . import caching
+from . import duplicates
+from . import editions
+from . import gbooks
+from . import models
+from . import names
+from . import search
+
+FORMATS = ['csv', 'jsonl', 'gbooks']
+BATCH_SIZE = 1000
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise InvalidRecord('Line {} is not valid JSON.'.format(number))
+
+
+def read_gbooks(stream):
+    # every line is either a single volume or a whole search response with its "items"
+    for data in read_jsonl(stream):
+        for volume in data.get('items', []) if 'items' in data else [data]:
+            if 'volumeInfo' in volume:
+                yield gbooks.serialize_volume(volume)
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'gbooks': read_gbooks}
+
+
+def read_records(stream, format):
+    if format not in READERS:
+        raise InvalidRecord('Unknown format {}, choose one of: {}.'.format(format, ', '.join(FORMATS)))
+    return READERS[format](stream)
+
+
+def _number(value, cast):
+    try:
+        return cast(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize(record):
+    if not isinstance(record, dict):
+        raise InvalidRecord('Record is not an object.')
+    title = str(record.get('title') or '').strip()
+    if not title:
+        raise InvalidRecord('Record has no title.')
+    year = _number(str(record.get('year') or '')[:4], int)
+    g_rank = record.get('g_rank', record.get('gbooks_rank'))
+    return {
+        'title': title[:200],
+        'authors': names.split_names(record.get('authors')),
+        'categories': names.split_names(record.get('categories')),
+        'publisher': next(iter(names.split_names([record.get('publisher') or ''])), None),
+        'year': year if year is not None and 0 <= year <= 32767 else None,
+        'isbn': re.sub(r'[\s-]', '', str(record.get('isbn') or ''))[:13] or None,
+        'description': record.get('description') or None,
+        'thumbnail': str(record.get('thumbnail') or '')[:500] or None,
+        'g_rank': _number(g_rank, float),
+    }
+
+
+class ImportStats:
+    def __init__(self, position=0):
+        self.position = position
+        self.imported = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.started = time.monotonic()
+
+    @property
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.imported / self.seconds if self.seconds else 0
+
+    def as_dict(self):
+        return {'position': self.position, 'imported': self.imported, 'skipped': self.skipped,
+                'duplicates': self.duplicates, 'batches': self.batches, 'seconds': round(self.seconds, 3),
+                'rate': round(self.rate, 1)}
+
+
+class BookImporter:
+    def __init__(self, batch_size=BATCH_SIZE, added_by=None, using='default'):
+        self.batch_size = batch_size
+        self.added_by = added_by
+        self.using = using
+        self.authors = names.NameResolver(models.Author, added_by, using)
+        self.categories = names.NameResolver(models.Category, added_by, using)
+        self.publishers = names.NameResolver(models.Publisher, added_by, using)
+
+    def run(self, records, offset=0, checkpoint=None, callback=None):
+        if checkpoint:
+            offset = max(offset, models.ImportCheckpoint.objects.using(self.using).filter(
+                name=checkpoint).values_list('position', flat=True).first() or 0)
+        stats = ImportStats(offset)
+        records = islice(records, offset, None)
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            # books, their relations, the search index and the checkpoint are committed together,
+            # so a resumed import neither skips nor duplicates a batch
+            with transaction.atomic(using=self.using):
+                imported = self.import_batch(batch, stats)
+                stats.position += len(batch)
+                if checkpoint:
+                    models.ImportCheckpoint.objects.using(self.using).update_or_create(
+                        name=checkpoint, defaults={'position': stats.position})
+            stats.imported += imported
+            stats.batches += 1
+            if callback:
+                callback(stats)
+        return stats
+
+    def import_batch(self, records, stats):
+        rows = []
+        for record in records:
+            try:
+                rows.append(normalize(record))
+            except InvalidRecord:
+                stats.skipped += 1
+        rows = self.skip_duplicates(rows, stats)
+        if not rows:
+            return 0
+
+        authors = self.authors.resolve([name for row in rows for name in row['authors']])
+        categories = self.categories.resolve([name for row in rows for name in row['categories']])
+        publishers = self.publishers.resolve([row['publisher'] for row in rows if row['publisher']])
+
+        books = [models.Book(title=row['title'], year=row['year'], isbn=row['isbn'],
+                             isbn_canonical=row['isbn_canonical'], g_rank=row['g_rank'],
+                             description=row['description'], thumbnail=row['thumbnail'],
+                             publisher_id=publishers.get(row['publisher']), added_by=self.added_by)
+                 for row in rows]
+        self.create_books(books)
+
+        book_authors = models.Book.authors.through
+        book_categories = models.Book.categories.through
+        book_authors.objects.using(self.using).bulk_create(
+            [book_authors(book_id=book.id, author_id=authors[name])
+             for book, row in zip(books, rows) for name in row['authors']], batch_size=self.batch_size)
+        book_categories.objects.using(self.using).bulk_create(
+            [book_categories(book_id=book.id, category_id=categories[name])
+             for book, row in zip(books, rows) for name in row['categories']], batch_size=self.batch_size)
+
+        # bulk writes send no signals, so the search index and cached pages are updated here
+        search.index_books([book.id for book in books], using=self.using)
+        caching.bump_objects('book', [book.id for book in books])
+        caching.bump_objects('author', {authors[name] for row in rows for name in row['authors']})
+        caching.bump_objects('category', {categories[name] for row in rows for name in row['categories']})
+        caching.bump_objects('publisher', {book.publisher_id for book in books if book.publisher_id})
+        caching.bump_scope(caching.BOOK_LIST_SCOPE)
+        return len(books)
+
+    def skip_duplicates(self, rows, stats):
+        # an edition already in the catalogue or earlier in the batch is not imported again
+        isbns = [editions.canonical_isbn(row['isbn']) for row in rows]
+        seen = set(duplicates.find_books([isbn for isbn in isbns if isbn], self.using))
+        unique = []
+        for row, isbn in zip(rows, isbns):
+            if isbn in seen:
+                stats.duplicates += 1
+                continue
+            if isbn:
+                seen.add(isbn)
+            unique.append({**row, 'isbn_canonical': isbn})
+        return unique
+
+    def create_books(self, books):
+        if connections[self.using].features.can_return_rows_from_bulk_insert:
+            models.Book.objects.using(self.using).bulk_create(books, batch_size=self.batch_size)
+        else:
+            for book in books:
+                book.save(using=self.using)
@@ -0,0 +1,82 @@
+from django.db.models import F, IntegerField, Value
+
+from . import models
+from . import routers
+
+SESSION_KEY = 'finder_library'
+
+
+class Library:
+    # the owned book ids and the votes (book id -> value) of a profile
+    def __init__(self, owned=(), votes=None):
+        self.owned = frozenset(owned)
+        self.votes = dict(votes or {})
+
+    def owns(self, book_id):
+        return book_id in self.owned
+
+    def vote_for(self, book_id):
+        return self.votes.get(book_id)
+
+    @classmethod
+    def load(cls, profile_id):
+        # one query, owned books come without a value and votes always have one
+        owned = models.Profile.books.through.objects.filter(profile_id=profile_id).annotate(
+            value=Value(None, output_field=IntegerField())).values_list('book_id', 'value')
+        votes = models.Vote.objects.filter(profile_id=profile_id).values_list('book_id', 'value')
+        rows = list(owned.union(votes, all=True))
+        return cls([pk for pk, value in rows if value is None],
+                   [(pk, value) for pk, value in rows if value is not None])
+
+    def as_session(self, version):
+        return {'version': version, 'owned': sorted(self.owned),
+                'votes': [[pk, value] for pk, value in self.votes.items()]}
+
+    @classmethod
+    def from_session(cls, data):
+        return cls(data['owned'], data['votes'])
+
+
+EMPTY = Library()
+
+
+def _session_library(request, profile):
+    # kept in the session and reloaded once the profile's library version has been bumped, the version is read
+    # together with the profile, before the library, so a concurrent change can only make the copy look stale
+    version = profile.library_version
+    data = request.session.get(SESSION_KEY)
+    if data and data.get('profile') == str(profile.pk) and data.get('version') == version:
+        return Library.from_session(data)
+    library = Library.load(profile.pk)
+    # pages only read it, the copy is saved by logins and by the requests changing the library
+    if request.method not in routers.SAFE_METHODS:
+        request.session[SESSION_KEY] = {'profile': str(profile.pk), **library.as_session(version)}
+    return library
+
+
+def get_library(request):
+    if not hasattr(request, '_finder_library'):
+        profile = getattr(request.user, 'profile', None) if request.user.is_authenticated else None
+        request._finder_library = EMPTY if profile is None else _session_library(request, profile)
+    return request._finder_library
+
+
+def preload(request, user):
+    # filled while logging in, when the session is written anyway
+    profile = getattr(user, 'profile', None)
+    if profile is not None:
+        request._finder_library = _session_library(request, profile)
+
+
+def refresh(request):
+    # called after a view changed the library, the redirected page finds a fresh copy in the session
+    profile = request.user.profile
+    profile.refresh_from_db(fields=['library_version'])
+    request._finder_library = _session_library(request, profile)
+
+
+def invalidate(profile_ids, using=None):
+    profile_ids = list(profile_ids)
+    if profile_ids:
+        models.Profile.objects.using(using).filter(pk__in=profile_ids).update(
+            library_version=F('library_version') + 1)
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.test.utils import override_settings
+
+REQUESTS = 200
+CONCURRENCY = 50
+# the sync workers of a typical WSGI deployment, e.g. gunicorn --threads 8
+WSGI_THREADS = 8
+LATENCY = 0.2
+# every request searches for something else, so the client cache never answers instead of the upstream
+PATH = '/gbooks/?title={}'
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        body = json.dumps({'totalItems': 1, 'items': [
+            {'id': query, 'volumeInfo': {'title': query, 'authors': ['Load Test'], 'publishedDate': '2022'}}]})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    # answers like the Google Books API after a fixed latency
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), UpstreamHandler)
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def api_url(self):
+        return 'http://127.0.0.1:{}/books/v1/volumes'.format(self.server_port)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+def _split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+def wsgi_request(application, path):
+    path, query = _split(path)
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': '127.0.0.1'}
+    setup_testing_defaults(environ)
+    status = []
+    started = time.perf_counter()
+    body = application(environ, lambda line, headers, exc_info=None: status.append(int(line.split()[0])))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return status[0], time.perf_counter() - started
+
+
+async def asgi_request(application, path):
+    path, query = _split(path)
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+             'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+             'headers': [(b'host', b'127.0.0.1')], 'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80)}
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    started = time.perf_counter()
+    await application(scope, receive, send)
+    return status[0], time.perf_counter() - started
+
+
+def run_wsgi(paths, threads=WSGI_THREADS):
+    application = WSGIHandler()
+
+    def work(chunk):
+        try:
+            return [wsgi_request(application, path) for path in chunk]
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        chunks = executor.map(work, [paths[number::threads] for number in range(threads)])
+        return [result for chunk in chunks for result in chunk]
+
+
+def run_asgi(paths, concurrency=CONCURRENCY):
+    application = ASGIHandler()
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(path):
+            async with semaphore:
+                return await asgi_request(application, path)
+        return await asyncio.gather(*[request(path) for path in paths])
+    return asyncio.run(main())
+
+
+def summarize(server, results, seconds, upstream_requests):
+    latencies = sorted(latency for _, latency in results)
+    return {
+        'server': server,
+        'requests': len(results),
+        'errors': sum(status != 200 for status, _ in results),
+        'upstream': upstream_requests,
+        'seconds': seconds,
+        'rps': len(results) / seconds if seconds else 0,
+        'p50_ms': latencies[(len(latencies) - 1) // 2] * 1000 if latencies else 0,
+        'p95_ms': latencies[int((len(latencies) - 1) * 0.95)] * 1000 if latencies else 0,
+    }
+
+
+def run(requests=REQUESTS, concurrency=CONCURRENCY, threads=WSGI_THREADS, latency=LATENCY, path=PATH):
+    results = []
+    with UpstreamServer(latency) as upstream:
+        # the connection pool must not be the bottleneck of either server, templates are cached as in production
+        options = {**getattr(settings, 'GOOGLE_BOOKS', {}), 'API_URL': upstream.api_url, 'RETRIES': 0,
+                   'POOL_SIZE': max(concurrency, threads), 'FAILURE_THRESHOLD': requests + 1,
+                   # the fake volumes stay out of the database
+                   'STORE': False}
+        with override_settings(GOOGLE_BOOKS=options, DEBUG=False):
+            for server, runner, workers in [('wsgi', run_wsgi, threads), ('asgi', run_asgi, concurrency)]:
+                paths = [path.format('{}{}'.format(server, number)) for number in range(requests)]
+                before = upstream.requests
+                started = time.perf_counter()
+                responses = runner(paths, workers)
+                results.append(summarize(server, responses, time.perf_counter() - started,
+                                         upstream.requests - before))
+    return results
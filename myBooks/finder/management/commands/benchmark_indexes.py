@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Seeds a scratch SQLite database and compares the query plans and timings of the hot queries before and '
+            'after the index migration.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=benchmark.BOOKS)
+        parser.add_argument('--profiles', type=int, default=benchmark.PROFILES)
+        parser.add_argument('--votes-per-profile', type=int, default=benchmark.VOTES_PER_PROFILE)
+        parser.add_argument('--repeat', type=int, default=benchmark.REPEAT, help='The best of this many runs counts.')
+        parser.add_argument('--path', help='Scratch database file, kept after the run. Defaults to a temporary file.')
+        parser.add_argument('--plans', action='store_true', help='Print the query plans too.')
+
+    def handle(self, *args, **options):
+        if min(options['books'], options['profiles'], options['votes_per_profile'], options['repeat']) < 1:
+            raise CommandError('--books, --profiles, --votes-per-profile and --repeat must be positive.')
+        if options['path'] and os.path.exists(options['path']):
+            raise CommandError('{} already exists.'.format(options['path']))
+        with tempfile.TemporaryDirectory() as directory:
+            results = benchmark.run(options['path'] or os.path.join(directory, 'benchmark.sqlite3'),
+                                    books=options['books'], profiles=options['profiles'],
+                                    votes_per_profile=options['votes_per_profile'], repeat=options['repeat'])
+        self.stdout.write('{:<28}{:>12}{:>12}{:>10}'.format('query', 'before ms', 'after ms', 'speedup'))
+        for result in results:
+            self.stdout.write('{:<28}{:>12.2f}{:>12.2f}{:>9.1f}x'.format(
+                result['name'], result['before_ms'], result['after_ms'],
+                result['before_ms'] / max(result['after_ms'], 1e-6)))
+            if options['plans']:
+                self.stdout.write('  before: {}'.format(result['before_plan'].replace('\n', '\n          ')))
+                self.stdout.write('  after:  {}'.format(result['after_plan'].replace('\n', '\n          ')))
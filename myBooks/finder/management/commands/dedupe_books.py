@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import duplicates
+
+
+class Command(BaseCommand):
+    help = ('Fills in the canonical ISBN-13 of every book and merges the books of the same edition into the oldest '
+            'one, with their votes, owners, authors and categories.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=duplicates.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the duplicates among the canonical ISBNs filled in already.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        stats = duplicates.deduplicate(using=options['database'], batch_size=options['batch_size'],
+                                       dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            '{} canonical ISBNs updated, {} editions with duplicates, {} duplicate books {}.'.format(
+                stats['backfilled'], stats['editions'], stats['merged'],
+                'found' if options['dry_run'] else 'merged')))
@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ... import enrichment
+
+
+class Command(BaseCommand):
+    help = 'Runs workers that fill missing book details from Google Books, queued by new books or --enqueue-missing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enqueue-missing', action='store_true',
+                            help='Queue every book with a missing thumbnail, description, isbn, year or rating.')
+        parser.add_argument('--status', action='store_true', help='Print the number of jobs per status and exit.')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes sharing the rate limit.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due instead of polling.')
+        parser.add_argument('--batch-size', type=int, default=enrichment.get_options()['BATCH_SIZE'])
+        parser.add_argument('--rate', type=float, default=enrichment.get_options()['RATE'],
+                            help='Google Books requests per second of all workers together.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1 or options['rate'] <= 0:
+            raise CommandError('--workers, --batch-size and --rate must be positive.')
+        if options['enqueue_missing']:
+            self.stdout.write('Queued {} books.'.format(enrichment.enqueue_missing(options['database'])))
+        if options['status']:
+            for status, count in enrichment.get_status(options['database']).items():
+                self.stdout.write('{}: {}'.format(status, count))
+            return
+
+        if options['workers'] == 1:
+            return self.run_worker(0, options)
+        # forked workers must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=self.run_process, args=(number, options))
+                     for number in range(options['workers'])]
+        for process in processes:
+            process.start()
+        signal.signal(signal.SIGTERM, lambda *args: [process.terminate() for process in processes])
+        for process in processes:
+            process.join()
+
+    def run_worker(self, number, options):
+        worker = enrichment.Worker(name='{}-{}'.format(os.getpid(), number), using=options['database'],
+                                   BATCH_SIZE=options['batch_size'], RATE=options['rate'] / options['workers'])
+        # the current batch is finished and saved before the worker stops
+        handlers = {signum: signal.signal(signum, lambda *args: worker.stop())
+                    for signum in [signal.SIGINT, signal.SIGTERM]}
+        try:
+            worker.run(burst=options['burst'], callback=self.report)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def run_process(self, number, options):
+        try:
+            self.run_worker(number, options)
+        finally:
+            connections.close_all()
+
+    def report(self, worker, stats):
+        self.stdout.write('{}: {} enriched ({} books updated), {} retried, {} failed.'.format(
+            worker.name, stats['done'], stats['books'], stats['retried'], stats['failed']))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import exporter
+
+
+class Command(BaseCommand):
+    help = 'Streams books, votes or owned books rows as JSON Lines or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(exporter.DATASETS))
+        parser.add_argument('--format', choices=exporter.FORMATS, default='jsonl')
+        parser.add_argument('--output', help='Defaults to the standard output.')
+        parser.add_argument('--chunk-size', type=int, default=exporter.CHUNK_SIZE)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        lines = exporter.export(options['dataset'], options['format'], chunk_size=options['chunk_size'],
+                                using=options['database'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from ... import volumes
+
+
+class Command(BaseCommand):
+    help = ('Prints the size of the Google Books volumes and searches kept in the database, evicts the least recently '
+            'used entries above the limits with --evict or deletes all of them with --clear.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', action='store_true', help='Delete the entries above MAX_VOLUMES and '
+                                                                 'MAX_SEARCHES, least recently used first.')
+        parser.add_argument('--clear', action='store_true', help='Delete every stored volume and search.')
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        store = volumes.VolumeStore(using=options['database'])
+        if options['clear']:
+            self.stdout.write('Deleted {} entries.'.format(store.clear()))
+        elif options['evict']:
+            self.stdout.write('Evicted {} entries.'.format(store.evict()))
+        for name, count in store.count().items():
+            self.stdout.write('{}: {}'.format(name.replace('_', ' '), count))
@@ -0,0 +1,54 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import importer
+from ... import models
+
+
+class Command(BaseCommand):
+    help = 'Imports books from a CSV, JSON Lines or Google Books volumes file in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source')
+        parser.add_argument('--format', choices=importer.FORMATS,
+                            help='Defaults to csv for .csv files and jsonl otherwise.')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE)
+        parser.add_argument('--offset', type=int, default=0, help='Number of records to skip.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue after the last batch committed by a previous run.')
+        parser.add_argument('--checkpoint', help='Checkpoint name, defaults to the absolute source path.')
+        parser.add_argument('--added-by', help='Name of the profile the new objects are added by.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        if not os.path.isfile(source):
+            raise CommandError('File {} does not exist.'.format(source))
+        format = options['format'] or ('csv' if source.lower().endswith('.csv') else 'jsonl')
+        checkpoint = options['checkpoint'] or os.path.abspath(source)
+
+        added_by = None
+        if options['added_by']:
+            added_by = models.Profile.objects.using(options['database']).filter(name=options['added_by']).first()
+            if added_by is None:
+                raise CommandError('Profile {} does not exist.'.format(options['added_by']))
+
+        if not options['resume']:
+            models.ImportCheckpoint.objects.using(options['database']).filter(name=checkpoint).delete()
+
+        books_importer = importer.BookImporter(batch_size=options['batch_size'], added_by=added_by,
+                                               using=options['database'])
+        with open(source, encoding='utf-8', newline='') as stream:
+            try:
+                stats = books_importer.run(importer.read_records(stream, format), offset=options['offset'],
+                                           checkpoint=checkpoint, callback=self.report)
+            except importer.InvalidRecord as e:
+                raise CommandError('{} Run again with --resume to continue after fixing the file.'.format(e))
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {} books in {:.1f}s ({:.0f} books/s), skipped {} invalid records and {} duplicates.'.format(
+                stats.imported, stats.seconds, stats.rate, stats.skipped, stats.duplicates)))
+
+    def report(self, stats):
+        self.stdout.write('Batch {}: {} records processed, {} books imported, {:.0f} books/s'.format(
+            stats.batches, stats.position, stats.imported, stats.rate))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import loadtest
+
+
+class Command(BaseCommand):
+    help = ('Sends the same burst of requests to the app through its WSGI and its ASGI handler, with Google Books '
+            'replaced by a local server of fixed latency, and compares how many requests each serves concurrently.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=loadtest.REQUESTS)
+        parser.add_argument('--concurrency', type=int, default=loadtest.CONCURRENCY,
+                            help='Requests in flight at once under ASGI.')
+        parser.add_argument('--threads', type=int, default=loadtest.WSGI_THREADS,
+                            help='Worker threads under WSGI, each serves one request at a time.')
+        parser.add_argument('--latency', type=float, default=loadtest.LATENCY,
+                            help='Seconds the fake Google Books API takes to answer.')
+        parser.add_argument('--path', default=loadtest.PATH,
+                            help='Path requested, {} is replaced with a different word for every request.')
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency'], options['threads']) < 1 or options['latency'] < 0:
+            raise CommandError('--requests, --concurrency and --threads must be positive.')
+        if '{}' not in options['path']:
+            raise CommandError('--path must contain {}.')
+        results = loadtest.run(requests=options['requests'], concurrency=options['concurrency'],
+                               threads=options['threads'], latency=options['latency'], path=options['path'])
+        self.stdout.write('{:<8}{:>10}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}'.format(
+            'server', 'requests', 'errors', 'upstream', 'seconds', 'req/s', 'p50 ms', 'p95 ms'))
+        for result in results:
+            self.stdout.write('{server:<8}{requests:>10}{errors:>8}{upstream:>10}{seconds:>10.2f}{rps:>10.1f}'
+                              '{p50_ms:>10.1f}{p95_ms:>10.1f}'.format(**result))
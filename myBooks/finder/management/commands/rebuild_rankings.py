@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ... import ranking
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Bayesian scores of books and updates the changed global and per category rank positions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        stats = ranking.refresh(using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Rankings updated: {created} created, {updated} updated, '
+                                             '{deleted} deleted.'.format(**stats)))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of books from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not search.is_available(options['database']):
+            raise CommandError('Full-text search index is available only on SQLite with FTS5.')
+        count = search.rebuild_index(options['database'])
+        self.stdout.write(self.style.SUCCESS('Indexed {} books.'.format(count)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import similarity
+
+
+class Command(BaseCommand):
+    help = 'Updates the similar books of books with new votes and of their neighbours, or of all books with --full.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild the similarities of every voted book.')
+        parser.add_argument('--top-k', type=int, default=similarity.TOP_K, help='Similar books stored per book.')
+        parser.add_argument('--chunk-size', type=int, default=similarity.CHUNK_SIZE)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--top-k and --chunk-size must be positive.')
+        stats = similarity.rebuild(full=options['full'], top_k=options['top_k'], chunk_size=options['chunk_size'],
+                                   using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Updated similar books of {} books ({} pairs).'.format(
+            stats['books'], stats['pairs'])))
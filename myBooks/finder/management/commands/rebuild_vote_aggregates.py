@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ... import caching
+from ... import models
+from ... import votes
+
+
+class Command(BaseCommand):
+    help = 'Recomputes vote count, sum and average of books from their votes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        last_id = 0
+        updated = 0
+        while True:
+            batch = models.Book.objects.filter(id__gt=last_id)
+            ids = batch.order_by('id').values_list('id', flat=True)
+            upper = list(ids[options['batch_size'] - 1:options['batch_size']])
+            if upper:
+                batch = batch.filter(id__lte=upper[0])
+            with transaction.atomic():
+                updated += votes.rebuild_vote_aggregates(batch)
+            if not upper:
+                break
+            last_id = upper[0]
+        caching.bump_scope(caching.GLOBAL_SCOPE)
+        self.stdout.write(self.style.SUCCESS('Updated vote aggregates of {} books.'.format(updated)))
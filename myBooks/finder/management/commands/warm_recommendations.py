@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ... import models
+from ... import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Scores recommended books of all profiles in batches and stores them in the cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        profile_ids = list(models.Profile.objects.using(options['database']).order_by('pk').values_list(
+            'pk', flat=True))
+        recommendations.warm(profile_ids, using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Cached recommendations of {} profiles.'.format(len(profile_ids))))
@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'HEADERS': False,
+    'LOG': False,
+    'STRICT': False,
+    'BUDGETS': {},
+}
+
+_current = contextvars.ContextVar('finder_request_metrics', default=None)
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.timings = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, name, seconds):
+        self.timings[name] += seconds
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add('sql', time.perf_counter() - started)
+
+    def as_dict(self):
+        return {'queries': self.queries, 'total_ms': round(self.total * 1000, 2),
+                **{'{}_ms'.format(name): round(seconds * 1000, 2) for name, seconds in self.timings.items()},
+                **self.counts}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def get_current():
+    return _current.get()
+
+
+def count_query(execute, sql, params, many, context):
+    # installed on every connection, the queries count towards the metrics of the current context, which sync_to_async
+    # and the search threads copy from the request
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute_wrapper(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@contextmanager
+def timer(name):
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.add(name, time.perf_counter() - started)
+
+
+def count(name):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counts[name] += 1
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.url_name:
+        return None
+    # the REST API router reuses the url names of the html views, e.g. book-list
+    prefix = 'api:' if hasattr(match.func, 'cls') else ''
+    return prefix + match.view_name
+
+
+def check_budget(view_name, metrics, budget):
+    exceeded = []
+    if 'queries' in budget and metrics.queries > budget['queries']:
+        exceeded.append('{} queries > {}'.format(metrics.queries, budget['queries']))
+    if 'ms' in budget and metrics.total * 1000 > budget['ms']:
+        exceeded.append('{:.1f}ms > {}ms'.format(metrics.total * 1000, budget['ms']))
+    if exceeded:
+        return '{} exceeded its budget: {}.'.format(view_name, ', '.join(exceeded))
+    return None
+
+
+class RequestMetricsMiddleware:
+    # async capable, under ASGI a sync middleware would move every request to a thread and back
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            # the handler calls it in its own mode, a sync one would be run in a thread too
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = _current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: metrics.add('render', time.perf_counter() - started))
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return RequestMetricsMiddleware.process_template_response(self, request, response)
+
+    def report(self, request, response, metrics):
+        options = get_options()
+        view_name = get_view_name(request)
+        if options['HEADERS']:
+            response['X-Query-Count'] = str(metrics.queries)
+            timings = [(name, seconds) for name, seconds in metrics.timings.items()] + [('total', metrics.total)]
+            response['Server-Timing'] = ', '.join('{};dur={:.1f}'.format(name, seconds * 1000)
+                                                  for name, seconds in timings)
+        if options['LOG']:
+            logger.info(json.dumps({'method': request.method, 'path': request.path, 'view': view_name,
+                                    'status': response.status_code, **metrics.as_dict()}))
+
+        budget = options['BUDGETS'].get(view_name)
+        message = check_budget(view_name, metrics, budget) if budget else None
+        if message and options['STRICT']:
+            raise BudgetExceeded(message)
+        elif message:
+            logger.warning(message)
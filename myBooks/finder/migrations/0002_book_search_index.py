@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS finder_book_fts USING fts5("
+        "title, authors, categories, publisher, isbn, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    schema_editor.execute('''
+        INSERT INTO finder_book_fts(rowid, title, authors, categories, publisher, isbn)
+        SELECT b.id, b.title,
+               (SELECT group_concat(a.name, ' ') FROM finder_book_authors ba
+                JOIN finder_author a ON a.id = ba.author_id WHERE ba.book_id = b.id),
+               (SELECT group_concat(c.name, ' ') FROM finder_book_categories bc
+                JOIN finder_category c ON c.id = bc.category_id WHERE bc.book_id = b.id),
+               p.name, b.isbn
+        FROM finder_book b LEFT JOIN finder_publisher p ON p.id = b.publisher_id
+    ''')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS finder_book_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.0.1 on 2026-10-18 04:39
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0002_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='finder_author_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='finder_category_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='finder_profile_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='publisher',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='finder_publisher_lower_idx'),
+        ),
+    ]
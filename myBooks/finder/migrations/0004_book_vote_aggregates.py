@@ -0,0 +1,41 @@
+# Generated by Django 4.0.1 on 2026-10-18 04:45
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_vote_aggregates(apps, schema_editor):
+    Book = apps.get_model('finder', 'Book')
+    Vote = apps.get_model('finder', 'Vote')
+    votes = Vote.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    Book.objects.using(schema_editor.connection.alias).update(
+        vote_count=Coalesce(Subquery(votes.annotate(count=Count('id')).values('count')), 0),
+        vote_sum=Coalesce(Subquery(votes.annotate(total=Sum('value')).values('total')), 0),
+        vote_average=Subquery(votes.annotate(average=Avg('value')).values('average')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0003_name_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='vote_average',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='vote_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_vote_aggregates, migrations.RunPython.noop),
+    ]
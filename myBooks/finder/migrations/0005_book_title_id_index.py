@@ -0,0 +1,17 @@
+# Generated by Django 4.0.1 on 2026-10-18 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0004_book_vote_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'id'], name='finder_book_title_id_idx'),
+        ),
+    ]
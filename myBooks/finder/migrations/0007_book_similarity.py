@@ -0,0 +1,42 @@
+# Generated by Django 4.0.1 on 2026-10-18 05:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_voted_books(apps, schema_editor):
+    Book = apps.get_model('finder', 'Book')
+    Book.objects.using(schema_editor.connection.alias).filter(vote_count__gt=0).update(similarity_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0006_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='similarity_stale',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='BookSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='finder.book')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='finder.book')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booksimilarity',
+            index=models.Index(fields=['book', '-score'], name='finder_booksimilarity_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='booksimilarity',
+            constraint=models.UniqueConstraint(fields=('book', 'similar'), name='finder_booksimilarity_unique'),
+        ),
+        migrations.RunPython(mark_voted_books, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.0.1 on 2026-10-18 05:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0007_book_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranks', to='finder.book')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ranks', to='finder.category')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookrank',
+            index=models.Index(fields=['category', 'position'], name='finder_bookrank_position_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookrank',
+            constraint=models.UniqueConstraint(fields=('book', 'category'), name='finder_bookrank_unique'),
+        ),
+    ]
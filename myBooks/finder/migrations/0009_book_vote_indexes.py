@@ -0,0 +1,63 @@
+# Generated by Django 4.0.1 on 2026-10-18 05:40
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    # the latest vote of a profile for a book wins, the aggregates of the affected books are rebuilt
+    Book = apps.get_model('finder', 'Book')
+    Vote = apps.get_model('finder', 'Vote')
+    votes = Vote.objects.using(schema_editor.connection.alias)
+    duplicates = votes.values('profile', 'book').order_by().annotate(count=Count('id'), last=Max('id')).filter(
+        count__gt=1)
+    book_ids = set()
+    for duplicate in duplicates:
+        votes.filter(profile=duplicate['profile'], book=duplicate['book'], id__lt=duplicate['last']).delete()
+        book_ids.add(duplicate['book'])
+    if book_ids:
+        book_votes = Vote.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        Book.objects.using(schema_editor.connection.alias).filter(id__in=book_ids).update(
+            vote_count=Coalesce(Subquery(book_votes.annotate(count=Count('id')).values('count')), 0),
+            vote_sum=Coalesce(Subquery(book_votes.annotate(total=Sum('value')).values('total')), 0),
+            vote_average=Subquery(book_votes.annotate(average=Avg('value')).values('average')),
+            similarity_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0008_book_rank'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['year', 'title', 'id'], name='finder_book_year_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn'], name='finder_book_isbn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['vote_average', 'id'], name='finder_book_rating_idx'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='vote_average',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('profile', 'book'), name='finder_vote_profile_book_unique'),
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='profile',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='finder.profile'),
+        ),
+    ]
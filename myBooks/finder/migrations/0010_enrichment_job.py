@@ -0,0 +1,43 @@
+# Generated by Django 4.0.1 on 2026-10-18 05:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0009_book_vote_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrichmentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=64)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('filled', models.CharField(blank=True, default='', max_length=100)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrichment_jobs', to='finder.book')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='enrichmentjob',
+            index=models.Index(fields=['status', 'run_after', 'id'], name='finder_enrichmentjob_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrichmentjob',
+            index=models.Index(fields=['locked_by'], name='finder_enrichmentjob_lock_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='enrichmentjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('book',), name='finder_enrichmentjob_active_unique'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.1 on 2026-10-18 06:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0010_enrichment_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleBooksSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('query', models.TextField()),
+                ('volume_ids', models.JSONField(default=list)),
+                ('etag', models.CharField(blank=True, default='', max_length=128)),
+                ('expires', models.DateTimeField()),
+                ('accessed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GoogleBooksVolume',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gbooks_id', models.CharField(max_length=64, unique=True)),
+                ('payload', models.JSONField()),
+                ('details', models.JSONField()),
+                ('complete', models.BooleanField(default=False)),
+                ('etag', models.CharField(blank=True, default='', max_length=128)),
+                ('expires', models.DateTimeField()),
+                ('accessed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='googlebooksvolume',
+            index=models.Index(fields=['accessed'], name='finder_gbooksvolume_lru_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='googlebookssearch',
+            index=models.Index(fields=['accessed'], name='finder_gbookssearch_lru_idx'),
+        ),
+    ]
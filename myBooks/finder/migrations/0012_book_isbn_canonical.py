@@ -0,0 +1,22 @@
+# Generated by Django 4.0.1 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0011_gbooks_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn_canonical',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn_canonical'], name='finder_book_isbn_canonical_idx'),
+        ),
+    ]
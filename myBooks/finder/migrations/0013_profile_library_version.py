@@ -0,0 +1,18 @@
+# Generated by Django 4.0.1 on 2026-10-18 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finder', '0012_book_isbn_canonical'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='library_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,8 +1,12 @@
 from django.db import models
+from django.db.models.functions import Lower
 from datetime import date
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
+from . import editions
+
 
 class AddedBy(models.Model):
     added_by = models.ForeignKey('Profile', on_delete=models.SET_NULL, null=True)
@@ -15,6 +19,9 @@ class AddedBy(models.Model):
 class Category(AddedBy):
     name = models.CharField(max_length=50, blank=False, null=False, unique=True)
 
+    class Meta:
+        indexes = [models.Index(Lower('name'), name='finder_category_lower_idx')]
+
     def __str__(self):
         return self.name
 
@@ -22,6 +29,9 @@ class Category(AddedBy):
 class Author(AddedBy):
     name = models.CharField(max_length=50, blank=False, null=False, unique=True)
 
+    class Meta:
+        indexes = [models.Index(Lower('name'), name='finder_author_lower_idx')]
+
     def __str__(self):
         return self.name
 
@@ -29,6 +39,9 @@ class Author(AddedBy):
 class Publisher(AddedBy):
     name = models.CharField(max_length=50, blank=False, null=False, unique=True)
 
+    class Meta:
+        indexes = [models.Index(Lower('name'), name='finder_publisher_lower_idx')]
+
     def __str__(self):
         return self.name
 
@@ -40,13 +53,40 @@ class Book(AddedBy):
     thumbnail = models.URLField(max_length=500, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     isbn = models.CharField(max_length=13, blank=True, null=True)
+    # the ISBN-13 of isbn when its checksum is valid, duplicates of an edition share it
+    isbn_canonical = models.CharField(max_length=13, blank=True, null=True, editable=False)
     authors = models.ManyToManyField(Author, blank=True)
     categories = models.ManyToManyField(Category, blank=True)
     publisher = models.ForeignKey(Publisher, on_delete=models.SET_NULL, blank=True, null=True)
+    vote_count = models.PositiveIntegerField(default=0, editable=False)
+    vote_sum = models.PositiveIntegerField(default=0, editable=False)
+    vote_average = models.FloatField(blank=True, null=True, editable=False)
+    similarity_stale = models.BooleanField(default=False, editable=False)
+
+    VOTE_AGGREGATE_FIELDS = ['vote_count', 'vote_sum', 'vote_average']
+    MAINTAINED_FIELDS = VOTE_AGGREGATE_FIELDS + ['similarity_stale']
+
+    class Meta:
+        # shaped to the book list: title ordering, the year filter, isbn lookups and the rating ordering
+        indexes = [models.Index(fields=['title', 'id'], name='finder_book_title_id_idx'),
+                   models.Index(fields=['year', 'title', 'id'], name='finder_book_year_title_idx'),
+                   models.Index(fields=['isbn'], name='finder_book_isbn_idx'),
+                   models.Index(fields=['isbn_canonical'], name='finder_book_isbn_canonical_idx'),
+                   models.Index(fields=['vote_average', 'id'], name='finder_book_rating_idx')]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.isbn_canonical = editions.canonical_isbn(self.isbn)
+        if kwargs.get('update_fields') is not None and 'isbn' in kwargs['update_fields']:
+            kwargs['update_fields'] = [*kwargs['update_fields'], 'isbn_canonical']
+        # vote aggregates are maintained by UPDATE ... F() queries, never write back stale in-memory values
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.MAINTAINED_FIELDS]
+        super().save(*args, **kwargs)
+
 
 class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -54,17 +94,141 @@ class Profile(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     books = models.ManyToManyField(Book, blank=True)
     friends = models.ManyToManyField('self', blank=True)
+    # bumped whenever the owned books or votes change, validates the copy of the library kept in the session
+    library_version = models.PositiveIntegerField(default=0, editable=False)
+
+    MAINTAINED_FIELDS = ['library_version']
+
+    class Meta:
+        indexes = [models.Index(Lower('name'), name='finder_profile_lower_idx')]
 
     def __str__(self):
         return '_'.join([self.name, 'profile'])
 
+    def save(self, *args, **kwargs):
+        # the library version is maintained by UPDATE ... F() queries, never write back a stale in-memory value
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.MAINTAINED_FIELDS]
+        super().save(*args, **kwargs)
+
 
 class Vote(models.Model):
     VOTE_CHOICES = [(i, str(i)) for i in range(1, 11)]
     value = models.SmallIntegerField(blank=False, null=False, choices=VOTE_CHOICES)
     date = models.DateField(default=date.today)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
-    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    # the unique constraint starts with profile and serves its lookups
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['profile', 'book'], name='finder_vote_profile_book_unique')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return '_'.join([self.profile.name[:10], 'vote_on', self.book.title[:10]])
+
+
+class ImportCheckpoint(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '_'.join([self.name, str(self.position)])
+
+
+class EnrichmentJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+    ACTIVE = [PENDING, RUNNING]
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='enrichment_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True, default='')
+    locked_at = models.DateTimeField(blank=True, null=True)
+    filled = models.CharField(max_length=100, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # a book is queued at most once at a time, workers claim the oldest due jobs
+        constraints = [models.UniqueConstraint(fields=['book'], condition=models.Q(status__in=['pending', 'running']),
+                                               name='finder_enrichmentjob_active_unique')]
+        indexes = [models.Index(fields=['status', 'run_after', 'id'], name='finder_enrichmentjob_due_idx'),
+                   models.Index(fields=['locked_by'], name='finder_enrichmentjob_lock_idx')]
+
+    def __str__(self):
+        return '_'.join([str(self.book_id), 'enrichment', self.status])
+
+
+class BookSimilarity(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_to')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['book', 'similar'], name='finder_booksimilarity_unique')]
+        indexes = [models.Index(fields=['book', '-score'], name='finder_booksimilarity_top_idx')]
+
+    def __str__(self):
+        return '_'.join([str(self.book_id), 'similar_to', str(self.similar_id)])
+
+
+class BookRank(models.Model):
+    # category is empty for the global ranking
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='ranks')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='ranks')
+    position = models.PositiveIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['book', 'category'], name='finder_bookrank_unique')]
+        indexes = [models.Index(fields=['category', 'position'], name='finder_bookrank_position_idx')]
+
+    def __str__(self):
+        return '_'.join([str(self.book_id), 'rank', str(self.position)])
+
+
+class GoogleBooksVolume(models.Model):
+    # complete volumes come from the volume endpoint, the others are the shorter search results
+    gbooks_id = models.CharField(max_length=64, unique=True)
+    payload = models.JSONField()
+    details = models.JSONField()
+    complete = models.BooleanField(default=False)
+    etag = models.CharField(max_length=128, blank=True, default='')
+    expires = models.DateTimeField()
+    accessed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['accessed'], name='finder_gbooksvolume_lru_idx')]
+
+    def __str__(self):
+        return '_'.join(['gbooks', self.gbooks_id])
+
+
+class GoogleBooksSearch(models.Model):
+    # key is a hash of the normalized query, volume_ids keep the order of the results
+    key = models.CharField(max_length=64, unique=True)
+    query = models.TextField()
+    volume_ids = models.JSONField(default=list)
+    etag = models.CharField(max_length=128, blank=True, default='')
+    expires = models.DateTimeField()
+    accessed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['accessed'], name='finder_gbookssearch_lru_idx')]
+
+    def __str__(self):
+        return '_'.join(['gbooks_search', self.query[:30]])
@@ -0,0 +1,44 @@
+CHUNK_SIZE = 500
+SEPARATOR = ','
+
+
+def split_names(value, max_length=50):
+    if isinstance(value, str):
+        value = value.split(SEPARATOR)
+    names = []
+    for name in value or []:
+        name = str(name).strip()[:max_length]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+class NameResolver:
+    def __init__(self, model, added_by=None, using='default'):
+        self.model = model
+        self.added_by = added_by
+        self.using = using
+        self.ids = {}
+
+    def _load(self, names):
+        for start in range(0, len(names), CHUNK_SIZE):
+            self.ids.update(self.model.objects.using(self.using).filter(
+                name__in=names[start:start + CHUNK_SIZE]).values_list('name', 'id'))
+
+    def resolve(self, names):
+        unknown = [name for name in dict.fromkeys(names) if name not in self.ids]
+        if unknown:
+            self._load(unknown)
+            missing = [name for name in unknown if name not in self.ids]
+            if missing:
+                # names created concurrently by another request are skipped here and picked up by the reload
+                self.model.objects.using(self.using).bulk_create(
+                    [self.model(name=name, added_by=self.added_by) for name in missing],
+                    batch_size=CHUNK_SIZE, ignore_conflicts=True)
+                self._load(missing)
+        return self.ids
+
+
+def resolve_names(model, names, added_by=None, using='default'):
+    ids = NameResolver(model, added_by, using).resolve(names)
+    return [ids[name] for name in dict.fromkeys(names) if name in ids]
@@ -0,0 +1,203 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.http import Http404
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+AFTER_PARAM = 'after'
+BEFORE_PARAM = 'before'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def get_ordering(queryset):
+    ordering = [field for field in (queryset.query.order_by or queryset.model._meta.ordering)
+                if isinstance(field, str)]
+    pk_name = queryset.model._meta.pk.name
+    if not ordering:
+        return [pk_name]
+    last = ordering[-1].lstrip('-')
+    if last not in [pk_name, 'pk'] and not _is_unique(queryset.model, last):
+        # a unique tie breaker makes every position in the ordering distinct, so cursors are stable
+        ordering.append('-' + pk_name if ordering[-1].startswith('-') else pk_name)
+    return ordering
+
+
+def _is_unique(model, name):
+    try:
+        return model._meta.get_field(name).unique
+    except FieldDoesNotExist:
+        return False
+
+
+class KeysetPage:
+    def __init__(self, object_list, ordering, has_next, has_previous):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def cursor_for(self, obj):
+        if isinstance(obj, dict):
+            return encode_cursor([obj[field.lstrip('-')] for field in self.ordering])
+        return encode_cursor([getattr(obj, field.lstrip('-')) for field in self.ordering])
+
+    @property
+    def next_cursor(self):
+        return self.cursor_for(self.object_list[-1]) if self.has_next_page and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return self.cursor_for(self.object_list[0]) if self.has_previous_page and self.object_list else None
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, per_page, ordering=None):
+        self.ordering = ordering or get_ordering(queryset)
+        self.queryset = queryset
+        self.per_page = int(per_page)
+
+    def keyset_filter(self, values, reverse=False):
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(values)
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            descending = field.startswith('-') != reverse
+            name = field.lstrip('-')
+            term = Q(**{'{}__{}'.format(name, 'lt' if descending else 'gt'): values[position]})
+            for previous, value in zip(self.ordering[:position], values):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        # the redundant bound on the leading column lets the database seek into the index instead of scanning it
+        descending = self.ordering[0].startswith('-') != reverse
+        leading = Q(**{'{}__{}'.format(self.ordering[0].lstrip('-'), 'lte' if descending else 'gte'): values[0]})
+        return leading & condition
+
+    def page(self, after=None, before=None):
+        queryset = self.queryset
+        reverse = bool(before)
+        ordering = self.ordering
+        if before or after:
+            queryset = queryset.filter(self.keyset_filter(decode_cursor(before or after), reverse=reverse))
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else '-' + field for field in ordering]
+
+        object_list = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if reverse:
+            object_list.reverse()
+            return KeysetPage(object_list, self.ordering, has_next=True, has_previous=has_more)
+        return KeysetPage(object_list, self.ordering, has_next=has_more, has_previous=bool(after))
+
+
+class KeysetPaginationMixin:
+    paginator_class = KeysetPaginator
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return self.paginator_class(queryset, per_page, **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(queryset, page_size)
+        try:
+            page = paginator.page(after=self.request.GET.get(AFTER_PARAM), before=self.request.GET.get(BEFORE_PARAM))
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_query_string(self):
+        q = self.request.GET.copy()
+        for param in [self.page_kwarg, AFTER_PARAM, BEFORE_PARAM]:
+            q.pop(param, None)
+        return q.urlencode()
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            page_size = self.page_size
+        page_size = max(1, min(page_size, self.max_page_size))
+        try:
+            self.page = KeysetPaginator(queryset, page_size).page(
+                after=request.query_params.get(AFTER_PARAM), before=request.query_params.get(BEFORE_PARAM))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        return list(self.page)
+
+    def get_next_link(self):
+        if not self.page.next_cursor:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), BEFORE_PARAM)
+        return replace_query_param(url, AFTER_PARAM, self.page.next_cursor)
+
+    def get_previous_link(self):
+        if not self.page.previous_cursor:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), AFTER_PARAM)
+        return replace_query_param(url, BEFORE_PARAM, self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
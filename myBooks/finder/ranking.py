@@ -0,0 +1,98 @@
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from . import models
+
+DEFAULTS = {
+    # votes the prior mean is worth, books with few votes stay close to it
+    'PRIOR_VOTES': 5,
+    # share of the prior taken from the Google Books rating (1-5 stars) when a book has one
+    'GOOGLE_WEIGHT': 0.5,
+    'TOP_LIMIT': 100,
+    'BATCH_SIZE': 1000,
+}
+
+ORDERINGS = {
+    'rank': lambda rank: rank.position,
+    'title': lambda rank: (rank.book.title.lower(), rank.position),
+    'year': lambda rank: (-(rank.book.year or 0), rank.position),
+    'votes': lambda rank: (-rank.book.vote_count, rank.position),
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'RANKING', {})}
+
+
+def bayesian_scores(vote_counts, vote_sums, google_ranks, options=None):
+    options = options or get_options()
+    counts = np.asarray(vote_counts, dtype=np.float64)
+    sums = np.asarray(vote_sums, dtype=np.float64)
+    google = np.asarray(google_ranks, dtype=np.float64) * 2
+    mean = sums.sum() / counts.sum() if counts.sum() else 5.5
+    has_google = ~np.isnan(google)
+    prior = np.where(has_google, options['GOOGLE_WEIGHT'] * np.nan_to_num(google) +
+                     (1 - options['GOOGLE_WEIGHT']) * mean, mean)
+    return (options['PRIOR_VOTES'] * prior + sums) / (options['PRIOR_VOTES'] + counts)
+
+
+def compute_ranks(using='default'):
+    rows = list(models.Book.objects.using(using).filter(Q(vote_count__gt=0) | Q(g_rank__isnull=False)).values_list(
+        'id', 'vote_count', 'vote_sum', 'g_rank'))
+    if not rows:
+        return {}
+    book_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    counts = np.array([row[1] for row in rows], dtype=np.int64)
+    sums = np.array([row[2] for row in rows], dtype=np.int64)
+    google = np.array([np.nan if row[3] is None else row[3] for row in rows], dtype=np.float64)
+    scores = bayesian_scores(counts, sums, google)
+    # ties go to the book with more votes, then to the older one
+    order = np.lexsort((book_ids, -counts, -scores))
+    ranks = {(int(book_ids[i]), None): (position, float(scores[i])) for position, i in enumerate(order, start=1)}
+
+    # a category ranking keeps the global order of its books
+    global_ranks = {book_id: rank for (book_id, _), rank in ranks.items()}
+    memberships = sorted(models.Book.categories.through.objects.using(using).values_list('category_id', 'book_id'),
+                         key=lambda row: (row[0], global_ranks.get(row[1], (0,))[0]))
+    position, last_category = 0, None
+    for category_id, book_id in memberships:
+        if book_id not in global_ranks:
+            continue
+        position = position + 1 if category_id == last_category else 1
+        last_category = category_id
+        ranks[(book_id, category_id)] = (position, global_ranks[book_id][1])
+    return ranks
+
+
+def refresh(using='default'):
+    # only rows whose position or score changed are written, unchanged ranks are left alone
+    options = get_options()
+    ranks = compute_ranks(using)
+    existing = {(rank.book_id, rank.category_id): rank for rank in models.BookRank.objects.using(using).only(
+        'id', 'book_id', 'category_id', 'position', 'score').iterator(chunk_size=options['BATCH_SIZE'])}
+    created = [models.BookRank(book_id=book_id, category_id=category_id, position=position, score=score)
+               for (book_id, category_id), (position, score) in ranks.items() if (book_id, category_id) not in existing]
+    updated = []
+    for key, (position, score) in ranks.items():
+        rank = existing.get(key)
+        if rank is not None and (rank.position != position or not np.isclose(rank.score, score, rtol=0, atol=1e-9)):
+            rank.position, rank.score = position, score
+            updated.append(rank)
+    deleted = [rank.id for key, rank in existing.items() if key not in ranks]
+    with transaction.atomic(using):
+        for start in range(0, len(deleted), options['BATCH_SIZE']):
+            models.BookRank.objects.using(using).filter(id__in=deleted[start:start + options['BATCH_SIZE']]).delete()
+        models.BookRank.objects.using(using).bulk_update(updated, ['position', 'score'],
+                                                          batch_size=options['BATCH_SIZE'])
+        models.BookRank.objects.using(using).bulk_create(created, batch_size=options['BATCH_SIZE'])
+    return {'created': len(created), 'updated': len(updated), 'deleted': len(deleted)}
+
+
+def get_top(category_id=None, limit=None, order='rank'):
+    limit = min(limit or get_options()['TOP_LIMIT'], get_options()['TOP_LIMIT'])
+    ranks = list(models.BookRank.objects.filter(category_id=category_id).select_related('book').order_by(
+        'position')[:limit])
+    return sorted(ranks, key=ORDERINGS.get(order, ORDERINGS['rank']))
@@ -0,0 +1,128 @@
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+
+from . import caching
+from . import models
+
+DEFAULTS = {
+    'LIMIT': 10,
+    'TIMEOUT': 3600,
+    'BATCH_SIZE': 200,
+    # weights of the signals blended into a book's score
+    'FRIEND_VOTES': 1.0,
+    'FRIEND_OWNED': 0.5,
+    'SIMILAR': 1.0,
+    'OWNED': 0.5,
+}
+
+SCOPE = 'recommendations'
+NEUTRAL_VOTE = 5.5
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'RECOMMENDATIONS', {})}
+
+
+def _index(ids):
+    return {pk: position for position, pk in enumerate(dict.fromkeys(ids))}
+
+
+def _matrix(rows, columns, values, shape):
+    return sparse.csr_matrix((np.asarray(values, dtype=np.float64), (np.asarray(rows, dtype=np.int64),
+                                                                       np.asarray(columns, dtype=np.int64))),
+                             shape=shape)
+
+
+def _top(scores, limit):
+    values = scores.data
+    positive = values > 0
+    columns, values = scores.indices[positive], values[positive]
+    if len(values) > limit:
+        best = np.argpartition(-values, limit - 1)[:limit]
+        columns, values = columns[best], values[best]
+    order = np.argsort(-values, kind='stable')
+    return columns[order], values[order]
+
+
+def get_friend_ids(profile_ids, using='default'):
+    return list(models.Profile.friends.through.objects.using(using).filter(
+        from_profile_id__in=profile_ids).values_list('from_profile_id', 'to_profile_id'))
+
+
+def score_profiles(profile_ids, limit=None, using='default'):
+    options = get_options()
+    limit = limit or options['LIMIT']
+    friendships = get_friend_ids(profile_ids, using)
+    people = _index(list(profile_ids) + [friend_id for _, friend_id in friendships])
+    votes = list(models.Vote.objects.using(using).filter(profile_id__in=list(people)).values_list(
+        'profile_id', 'book_id', 'value'))
+    owned = list(models.Profile.books.through.objects.using(using).filter(profile_id__in=list(people)).values_list(
+        'profile_id', 'book_id'))
+    own_books = {book_id for profile_id, book_id, *_ in votes + owned if people[profile_id] < len(profile_ids)}
+    similar = list(models.BookSimilarity.objects.using(using).filter(book_id__in=own_books).values_list(
+        'book_id', 'similar_id', 'score'))
+    books = _index([row[1] for row in votes + owned] + [row[1] for row in similar])
+    book_ids = np.array(list(books), dtype=np.int64)
+    shape = (len(people), len(books))
+
+    # votes are centered on the middle of the scale, so disliked books push their neighbours down
+    voted = _matrix([people[row[0]] for row in votes], [books[row[1]] for row in votes],
+                    [(row[2] - NEUTRAL_VOTE) / (10 - NEUTRAL_VOTE) for row in votes], shape)
+    owning = _matrix([people[row[0]] for row in owned], [books[row[1]] for row in owned], np.ones(len(owned)), shape)
+    friends = _matrix([people[row[0]] for row in friendships], [people[row[1]] for row in friendships],
+                      np.ones(len(friendships)), (len(profile_ids), len(people)))
+    friends = sparse.diags(1 / np.maximum(np.asarray(friends.sum(axis=1)).ravel(), 1)) @ friends
+    similarities = _matrix([books[row[0]] for row in similar], [books[row[1]] for row in similar],
+                           [row[2] for row in similar], (len(books), len(books)))
+
+    # every row of the batch is scored at once, friends' tastes are averaged over the number of friends
+    preferences = voted[:len(profile_ids)] + options['OWNED'] * owning[:len(profile_ids)]
+    scores = (friends @ (options['FRIEND_VOTES'] * voted + options['FRIEND_OWNED'] * owning)
+              + options['SIMILAR'] * (preferences @ similarities)).tocsr()
+    seen = (abs(voted[:len(profile_ids)]) + owning[:len(profile_ids)]).tocsr()
+    scores = (scores - scores.multiply(seen.sign())).tocsr()
+    scores.eliminate_zeros()
+
+    recommendations = {}
+    for row, profile_id in enumerate(profile_ids):
+        columns, values = _top(scores[row], limit)
+        recommendations[profile_id] = list(zip(book_ids[columns].tolist(), values.tolist()))
+    return recommendations
+
+
+def cache_key(profile_id):
+    return 'finder:recommendations:{}:{}'.format(profile_id, caching.get_version((SCOPE, profile_id)))
+
+
+def get_recommendations(profile_id, using='default'):
+    key = cache_key(profile_id)
+    cache = caching.get_cache()
+    recommendations = cache.get(key)
+    if recommendations is None:
+        recommendations = score_profiles([profile_id], using=using)[profile_id]
+        cache.set(key, recommendations, get_options()['TIMEOUT'])
+    return recommendations
+
+
+def get_recommended_books(profile_id, using='default'):
+    scores = dict(get_recommendations(profile_id, using))
+    books = models.Book.objects.using(using).in_bulk(list(scores))
+    # books deleted after the scores were cached are skipped
+    return [(books[book_id], score) for book_id, score in scores.items() if book_id in books]
+
+
+def warm(profile_ids, using='default'):
+    options = get_options()
+    for start in range(0, len(profile_ids), options['BATCH_SIZE']):
+        batch = profile_ids[start:start + options['BATCH_SIZE']]
+        recommendations = score_profiles(batch, using=using)
+        caching.get_cache().set_many({cache_key(profile_id): recommendations[profile_id] for profile_id in batch},
+                                     options['TIMEOUT'])
+
+
+def invalidate(profile_ids, using='default'):
+    # a profile's votes and books feed the recommendations of all of its friends
+    profile_ids = set(profile_ids)
+    caching.bump_objects(SCOPE, profile_ids | {friend_id for _, friend_id in get_friend_ids(profile_ids, using)})
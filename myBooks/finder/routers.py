@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'REPLICAS': [],
+    # reads of a client stay on the primary for this long after it wrote, so it sees its own writes
+    'STICKY_SECONDS': 10,
+    'COOKIE_NAME': 'finder_primary',
+}
+
+SAFE_METHODS = ['GET', 'HEAD', 'OPTIONS']
+
+_current = contextvars.ContextVar('finder_routing', default=None)
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_ROUTING', {})}
+
+
+class RoutingState:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+def get_pool():
+    return {DEFAULT_DB_ALIAS, *get_options()['REPLICAS']}
+
+
+def _hinted_database(hints):
+    # objects of databases outside the primary and its replicas stay where they came from
+    instance = hints.get('instance')
+    database = instance._state.db if instance is not None else None
+    return database if database is not None and database not in get_pool() else None
+
+
+class ReplicaRouter:
+    # reads go to a random replica only inside a request that allows it, everything else uses the primary
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        replicas = get_options()['REPLICAS']
+        if _hinted_database(hints):
+            return _hinted_database(hints)
+        if state is None or not state.use_replicas or not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if _hinted_database(hints):
+            return _hinted_database(hints)
+        state = _current.get()
+        if state is not None:
+            state.use_replicas = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = get_pool()
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_options()['REPLICAS']:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, the state is shared with the threads running the queries
+        state = self.start(request)
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        use_replicas = request.method in SAFE_METHODS and get_options()['COOKIE_NAME'] not in request.COOKIES
+        return RoutingState(use_replicas)
+
+    def finish(self, request, response, state):
+        options = get_options()
+        if state.wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(options['COOKIE_NAME'], '1', max_age=options['STICKY_SECONDS'], httponly=True,
+                                samesite='Lax')
+        return response
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    # persistent connections are pinged before a request reuses them, broken ones reconnect on the next query
+    for connection in connections.all():
+        if connection.connection is not None and connection.settings_dict.get('CONN_HEALTH_CHECKS') and \
+                not connection.in_atomic_block and not connection.is_usable():
+            connection.close()
@@ -0,0 +1,163 @@
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from . import models
+
+FTS_TABLE = 'finder_book_fts'
+SEARCH_FIELDS = ['title', 'authors', 'categories', 'publisher', 'isbn']
+CHUNK_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+REBUILD_SQL = '''
+    INSERT INTO finder_book_fts(rowid, title, authors, categories, publisher, isbn)
+    SELECT b.id, b.title,
+           (SELECT group_concat(a.name, ' ') FROM finder_book_authors ba
+            JOIN finder_author a ON a.id = ba.author_id WHERE ba.book_id = b.id),
+           (SELECT group_concat(c.name, ' ') FROM finder_book_categories bc
+            JOIN finder_category c ON c.id = bc.category_id WHERE bc.book_id = b.id),
+           p.name, b.isbn
+    FROM finder_book b LEFT JOIN finder_publisher p ON p.id = b.publisher_id
+'''
+
+_available = {}
+_deferred = threading.local()
+
+
+def is_available(using='default'):
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = (connection.vendor == 'sqlite'
+                             and FTS_TABLE in connection.introspection.table_names())
+    return _available[using]
+
+
+def build_match_query(params):
+    terms = []
+    for field in SEARCH_FIELDS + ['q']:
+        value = params.get(field, '') or ''
+        if field == 'isbn':
+            value = re.sub(r'[\s-]', '', value)
+        tokens = TOKEN_RE.findall(value)
+        if field == 'q':
+            terms += ['"{}"*'.format(token) for token in tokens]
+        else:
+            terms += ['{} : "{}"*'.format(field, token) for token in tokens]
+    return ' AND '.join(terms)
+
+
+def search_books(queryset, params):
+    year = (params.get('year', '') or '').strip()
+    if year.isdigit() and len(year) == 4:
+        # a whole year is an equality on the year index, only partial years fall back to a scan
+        queryset = queryset.filter(year=int(year))
+    elif year:
+        queryset = queryset.filter(year__icontains=year)
+
+    try:
+        min_rating = float(params.get('min_rating', '') or 0)
+    except ValueError:
+        min_rating = 0
+    if min_rating:
+        queryset = queryset.filter(vote_average__gte=min_rating)
+
+    match = build_match_query(params)
+    if match and is_available(queryset.db):
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=['{0}.rowid = finder_book.id'.format(FTS_TABLE), '{0} MATCH %s'.format(FTS_TABLE)],
+            params=[match])
+        queryset = queryset.annotate(search_rank=RawSQL('{0}.rank'.format(FTS_TABLE), ()))
+        queryset = queryset.order_by('search_rank', 'id')
+    elif match:
+        queryset = _filter_icontains(queryset, params)
+
+    if params.get('order') == 'rating':
+        # unrated books are left out so the ordering is a plain scan of the vote_average index
+        queryset = queryset.filter(vote_average__isnull=False).order_by('-vote_average', '-id')
+    return queryset
+
+
+def _filter_icontains(queryset, params):
+    for field in SEARCH_FIELDS:
+        value = params.get(field, '') or ''
+        if len(value) > 0:
+            key = '{}__icontains'.format(field)
+            if field in ['authors', 'categories', 'publisher']:
+                key = '{}__name__icontains'.format(field)
+            queryset = queryset.filter(**{key: value})
+    if params.get('q'):
+        queryset = queryset.filter(title__icontains=params.get('q'))
+    return queryset.distinct()
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+@contextmanager
+def deferred_indexing(using='default'):
+    if getattr(_deferred, 'book_ids', None) is not None:
+        yield
+        return
+    _deferred.book_ids = set()
+    try:
+        yield
+        book_ids = _deferred.book_ids
+    finally:
+        _deferred.book_ids = None
+    index_books(book_ids, using)
+
+
+def index_books(book_ids, using='default'):
+    if not is_available(using):
+        return
+    if getattr(_deferred, 'book_ids', None) is not None:
+        _deferred.book_ids.update(book_ids)
+        return
+    for chunk in _chunks(set(book_ids)):
+        books = models.Book.objects.using(using).filter(id__in=chunk).values_list(
+            'id', 'title', 'publisher__name', 'isbn')
+        authors = defaultdict(list)
+        for book_id, name in models.Book.authors.through.objects.using(using).filter(
+                book_id__in=chunk).values_list('book_id', 'author__name'):
+            authors[book_id].append(name)
+        categories = defaultdict(list)
+        for book_id, name in models.Book.categories.through.objects.using(using).filter(
+                book_id__in=chunk).values_list('book_id', 'category__name'):
+            categories[book_id].append(name)
+
+        rows = [(book_id, title, ' '.join(authors[book_id]), ' '.join(categories[book_id]), publisher, isbn)
+                for book_id, title, publisher, isbn in books]
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, ', '.join(['%s'] * len(chunk))),
+                           chunk)
+            cursor.executemany('INSERT INTO {}(rowid, title, authors, categories, publisher, isbn) '
+                               'VALUES (%s, %s, %s, %s, %s, %s)'.format(FTS_TABLE), rows)
+
+
+def remove_books(book_ids, using='default'):
+    if not is_available(using):
+        return
+    for chunk in _chunks(set(book_ids)):
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, ', '.join(['%s'] * len(chunk))),
+                           chunk)
+
+
+def rebuild_index(using='default'):
+    if not is_available(using):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+        cursor.execute(REBUILD_SQL)
+        cursor.execute("INSERT INTO {0}({0}) VALUES ('optimize')".format(FTS_TABLE))
+        cursor.execute('SELECT count(*) FROM {}'.format(FTS_TABLE))
+        return cursor.fetchone()[0]
@@ -0,0 +1,191 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from . import caching
+from . import friends
+from . import library
+from . import models
+from . import recommendations
+from . import search
+from . import votes
+
+
+@receiver(post_save, sender=models.Book)
+def index_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=models.Book)
+def unindex_book(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(post_save, sender=models.Author)
+@receiver(post_save, sender=models.Category)
+@receiver(post_save, sender=models.Publisher)
+def reindex_named_books(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_books(instance.book_set.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=models.Author)
+@receiver(pre_delete, sender=models.Category)
+@receiver(pre_delete, sender=models.Publisher)
+def collect_named_books(sender, instance, **kwargs):
+    instance._indexed_book_ids = list(instance.book_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=models.Author)
+@receiver(post_delete, sender=models.Category)
+@receiver(post_delete, sender=models.Publisher)
+def reindex_deleted_named_books(sender, instance, **kwargs):
+    search.index_books(getattr(instance, '_indexed_book_ids', []))
+
+
+@receiver(m2m_changed, sender=models.Book.authors.through)
+@receiver(m2m_changed, sender=models.Book.categories.through)
+def reindex_book_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._indexed_book_ids = list(instance.book_set.values_list('id', flat=True))
+    elif action in ['post_add', 'post_remove']:
+        search.index_books(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        search.index_books(getattr(instance, '_indexed_book_ids', []) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=models.Vote)
+def update_vote_aggregates(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        votes.vote_saved(instance, created)
+
+
+@receiver(post_delete, sender=models.Vote)
+def remove_from_vote_aggregates(sender, instance, **kwargs):
+    votes.vote_deleted(instance)
+
+
+def _book_related_pks(book_ids):
+    return {
+        'author': models.Book.authors.through.objects.filter(book_id__in=book_ids).values_list('author_id', flat=True),
+        'category': models.Book.categories.through.objects.filter(book_id__in=book_ids).values_list(
+            'category_id', flat=True),
+    }
+
+
+def _invalidate_books(book_ids, related=None):
+    caching.bump_objects('book', book_ids)
+    caching.bump_scope(caching.BOOK_LIST_SCOPE)
+    for scope, pks in (related or {}).items():
+        caching.bump_objects(scope, pks)
+
+
+@receiver(pre_delete, sender=models.Book)
+def collect_book_relations(sender, instance, **kwargs):
+    instance._cached_related = {scope: list(pks) for scope, pks in _book_related_pks([instance.pk]).items()}
+
+
+@receiver(post_save, sender=models.Book)
+@receiver(post_delete, sender=models.Book)
+def invalidate_book(sender, instance, created=False, **kwargs):
+    related = getattr(instance, '_cached_related', None)
+    if related is None:
+        related = {} if created else _book_related_pks([instance.pk])
+    _invalidate_books([instance.pk], {**related, 'publisher': [instance.publisher_id]})
+
+
+@receiver(post_save, sender=models.Author)
+@receiver(post_save, sender=models.Category)
+@receiver(post_save, sender=models.Publisher)
+@receiver(post_delete, sender=models.Author)
+@receiver(post_delete, sender=models.Category)
+@receiver(post_delete, sender=models.Publisher)
+def invalidate_named(sender, instance, created=False, **kwargs):
+    caching.bump_objects(sender._meta.model_name, [instance.pk])
+    if not created:
+        book_ids = getattr(instance, '_indexed_book_ids', None)
+        _invalidate_books(instance.book_set.values_list('id', flat=True) if book_ids is None else book_ids)
+
+
+@receiver(m2m_changed, sender=models.Book.authors.through)
+@receiver(m2m_changed, sender=models.Book.categories.through)
+def invalidate_book_relations(sender, instance, action, model, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._cached_cleared_pks = list(sender.objects.filter(
+            **{instance._meta.model_name: instance.pk}).values_list(model._meta.model_name + '_id', flat=True))
+        return
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    pks = getattr(instance, '_cached_cleared_pks', []) if action == 'post_clear' else pk_set
+    caching.bump_objects(instance._meta.model_name, [instance.pk])
+    caching.bump_objects(model._meta.model_name, pks)
+    caching.bump_scope(caching.BOOK_LIST_SCOPE)
+
+
+@receiver(post_save, sender=models.Vote)
+@receiver(post_delete, sender=models.Vote)
+def invalidate_voted_book(sender, instance, **kwargs):
+    _invalidate_books([instance.book_id])
+
+
+@receiver(pre_save, sender=models.Profile)
+def detect_profile_rename(sender, instance, raw=False, **kwargs):
+    instance._renamed = not raw and not instance._state.adding and models.Profile.objects.filter(
+        pk=instance.pk).exclude(name=instance.name).exists()
+
+
+@receiver(post_save, sender=models.Profile)
+def invalidate_profile_names(sender, instance, **kwargs):
+    # profile names appear on many cached pages, a rename invalidates all of them
+    if getattr(instance, '_renamed', False):
+        caching.bump_scope(caching.GLOBAL_SCOPE)
+
+
+@receiver(post_save, sender=models.Vote)
+@receiver(post_delete, sender=models.Vote)
+def invalidate_profile_votes(sender, instance, raw=False, **kwargs):
+    if not raw:
+        library.invalidate([instance.profile_id])
+        recommendations.invalidate([instance.profile_id])
+
+
+@receiver(m2m_changed, sender=models.Profile.books.through)
+def invalidate_owned_books(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_profile_ids = list(sender.objects.filter(book=instance).values_list('profile_id', flat=True))
+    elif action in ['post_add', 'post_remove', 'post_clear']:
+        if reverse:
+            profile_ids = getattr(instance, '_cleared_profile_ids', []) if pk_set is None else pk_set
+        else:
+            profile_ids = [instance.pk]
+        library.invalidate(profile_ids)
+        recommendations.invalidate(profile_ids)
+
+
+@receiver(m2m_changed, sender=models.Profile.friends.through)
+def invalidate_friends(sender, instance, action, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._cleared_friend_ids = list(instance.friends.values_list('id', flat=True))
+    elif action in ['post_add', 'post_remove', 'post_clear']:
+        # friendships are symmetric, both sides of every changed pair are affected
+        pks = [instance.pk, *(getattr(instance, '_cleared_friend_ids', []) if pk_set is None else pk_set)]
+        friends.invalidate(pks)
+        caching.bump_objects(recommendations.SCOPE, pks)
+
+
+@receiver(pre_delete, sender=models.Profile)
+def collect_profile_friends(sender, instance, **kwargs):
+    instance._deleted_friend_ids = list(friends.get_friend_ids(instance.pk))
+
+
+@receiver(post_delete, sender=models.Profile)
+def invalidate_deleted_profile_friends(sender, instance, **kwargs):
+    # the friendship rows are removed by the cascade, which sends no m2m_changed
+    friends.invalidate([instance.pk, *getattr(instance, '_deleted_friend_ids', [])])
+
+
+@receiver(user_logged_in)
+def preload_library(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        library.preload(request, user)
@@ -0,0 +1,112 @@
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+
+from . import caching
+from . import models
+
+TOP_K = 20
+CHUNK_SIZE = 500
+SIMILAR_LIMIT = 5
+
+
+class Ratings:
+    # profiles x books matrix of votes centered on each profile's mean vote (adjusted cosine)
+    def __init__(self, votes):
+        index = {}
+        profiles = np.fromiter((index.setdefault(profile_id, len(index)) for profile_id, _, _ in votes),
+                               dtype=np.int64, count=len(votes))
+        book_ids = np.fromiter((book_id for _, book_id, _ in votes), dtype=np.int64, count=len(votes))
+        values = np.fromiter((value for _, _, value in votes), dtype=np.float64, count=len(votes))
+        self.book_ids, books = np.unique(book_ids, return_inverse=True)
+        self.vote_counts = np.bincount(books, minlength=len(self.book_ids))
+        self.vote_sums = np.bincount(books, weights=values, minlength=len(self.book_ids))
+        counts = np.bincount(profiles, minlength=len(index))
+        means = np.bincount(profiles, weights=values, minlength=len(index)) / np.maximum(counts, 1)
+        self.matrix = sparse.csc_matrix((values - means[profiles], (profiles, books)),
+                                        shape=(len(index), len(self.book_ids)))
+        self.matrix.eliminate_zeros()
+        norms = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=0)).ravel())
+        self.inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+    @classmethod
+    def load(cls, using='default'):
+        return cls(list(models.Vote.objects.using(using).values_list('profile_id', 'book_id', 'value').iterator(
+            chunk_size=10000)))
+
+    def columns(self, book_ids):
+        book_ids = np.asarray(book_ids, dtype=np.int64)
+        positions = np.searchsorted(self.book_ids, book_ids)
+        found = positions < len(self.book_ids)
+        found[found] = self.book_ids[positions[found]] == book_ids[found]
+        return positions[found]
+
+    def totals(self, book_ids):
+        # vote count and sum of every book as read, to be compared with the aggregates kept on the book
+        columns = dict(zip(self.book_ids.tolist(), range(len(self.book_ids))))
+        return {book_id: (int(self.vote_counts[columns[book_id]]), int(self.vote_sums[columns[book_id]]))
+                if book_id in columns else (0, 0) for book_id in book_ids}
+
+    def neighbours(self, book_ids):
+        # books rated by anyone who rated one of book_ids, their scores against book_ids change too
+        columns = self.columns(book_ids)
+        profiles = np.unique(self.matrix[:, columns].nonzero()[0])
+        return self.book_ids[np.unique(self.matrix.tocsr()[profiles].nonzero()[1])]
+
+    def top_similar(self, columns, top_k=TOP_K):
+        scores = sparse.diags(self.inverse_norms[columns]) @ (self.matrix[:, columns].T @ self.matrix) @ \
+            sparse.diags(self.inverse_norms)
+        scores = scores.tocsr()
+        for row, column in enumerate(columns):
+            similar = scores.indices[scores.indptr[row]:scores.indptr[row + 1]]
+            values = scores.data[scores.indptr[row]:scores.indptr[row + 1]]
+            keep = (similar != column) & (values > 0)
+            similar, values = similar[keep], values[keep]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k - 1)[:top_k]
+                similar, values = similar[best], values[best]
+            order = np.argsort(-values, kind='stable')
+            yield int(self.book_ids[column]), zip(self.book_ids[similar[order]].tolist(), values[order].tolist())
+
+
+def _clear_stale(books, ratings, book_ids):
+    # a book voted on after the ratings were read no longer matches them and stays stale for the next run
+    totals = ratings.totals(book_ids)
+    current = books.select_for_update().filter(id__in=book_ids, similarity_stale=True).values_list(
+        'id', 'vote_count', 'vote_sum')
+    books.filter(id__in=[book_id for book_id, count, total in current if totals[book_id] == (count, total)]).update(
+        similarity_stale=False)
+
+
+def rebuild(full=False, top_k=TOP_K, chunk_size=CHUNK_SIZE, using='default'):
+    books = models.Book.objects.using(using)
+    stale = list(books.filter(similarity_stale=True).values_list('id', flat=True))
+    ratings = Ratings.load(using)
+    # flags are cleared together with the similarities of their books, a failed run leaves the rest stale
+    if full:
+        targets = ratings.book_ids
+        with transaction.atomic(using):
+            models.BookSimilarity.objects.using(using).filter(book__vote_count=0).delete()
+            _clear_stale(books, ratings, sorted(set(stale) - set(targets.tolist())))
+    else:
+        targets = np.union1d(ratings.neighbours(stale), np.array(stale, dtype=np.int64)) if stale else []
+
+    stale = set(stale)
+    pairs = 0
+    for start in range(0, len(targets), chunk_size):
+        chunk = np.asarray(targets[start:start + chunk_size], dtype=np.int64)
+        similarities = [models.BookSimilarity(book_id=book_id, similar_id=similar_id, score=score)
+                        for book_id, similar in ratings.top_similar(ratings.columns(chunk), top_k)
+                        for similar_id, score in similar]
+        with transaction.atomic(using):
+            models.BookSimilarity.objects.using(using).filter(book_id__in=chunk.tolist()).delete()
+            models.BookSimilarity.objects.using(using).bulk_create(similarities)
+            _clear_stale(books, ratings, [book_id for book_id in chunk.tolist() if book_id in stale])
+        caching.bump_objects('book', chunk.tolist())
+        pairs += len(similarities)
+    return {'books': len(targets), 'pairs': pairs}
+
+
+def get_similar(book_id, limit=SIMILAR_LIMIT):
+    return models.BookSimilarity.objects.filter(book_id=book_id).select_related('similar').order_by('-score')[:limit]
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+VOLUME = {
+    'id': 'hobbit1',
+    'volumeInfo': {
+        'title': 'The Hobbit',
+        'authors': ['J.R.R. Tolkien'],
+        'publisher': 'HarperCollins',
+        'publishedDate': '1937-09-21',
+        'description': 'A great tale!',
+        'industryIdentifiers': [{'type': 'ISBN_10', 'identifier': '0261102214'},
+                                {'type': 'ISBN_13', 'identifier': '9780261102217'}],
+        'imageLinks': {'thumbnail': 'http://books.google.com/hobbit.jpg'},
+        'averageRating': 4.5,
+        'previewLink': 'http://books.google.com/hobbit',
+    },
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        server.requests.append((url.path, parse_qs(url.query)))
+        if server.delay:
+            time.sleep(server.delay)
+        if server.status != 200:
+            return self.respond(server.status, {'error': 'stub failure'})
+        if server.etag and self.headers.get('If-None-Match') == server.etag:
+            return self.respond(304, None)
+        prefix = '/books/v1/volumes'
+        if url.path == prefix:
+            return self.respond(200, {'totalItems': len(server.volumes), 'items': list(server.volumes.values())})
+        if url.path.startswith(prefix + '/'):
+            volume = server.volumes.get(url.path[len(prefix) + 1:])
+            if volume is None:
+                return self.respond(404, {'error': 'not found'})
+            return self.respond(200, volume)
+        return self.respond(404, {'error': 'not found'})
+
+    def respond(self, status, payload):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if self.server.etag:
+            self.send_header('ETag', self.server.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GoogleBooksStub:
+    def __init__(self, volumes=None):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.volumes = {volume['id']: volume for volume in (volumes if volumes is not None else [VOLUME])}
+        self.server.requests = []
+        self.server.delay = 0
+        self.server.status = 200
+        self.server.etag = ''
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def api_url(self):
+        return 'http://127.0.0.1:{}/books/v1/volumes'.format(self.server.server_port)
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,16 @@
+from io import StringIO
+
+from django.test import TestCase
+from django.core.management import call_command
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_compares_plans_before_and_after_migration(self):
+        out = StringIO()
+        call_command('benchmark_indexes', books=300, profiles=5, votes_per_profile=10, repeat=1, plans=True,
+                     stdout=out)
+        output = out.getvalue()
+        self.assertIn('book by isbn', output)
+        self.assertIn('SCAN finder_book', output)
+        self.assertIn('finder_book_isbn_idx', output)
+        self.assertIn('finder_book_year_title_idx', output)
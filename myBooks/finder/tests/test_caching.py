@@ -0,0 +1,88 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import caching
+from .. import models
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self) -> None:
+        caching.get_cache().clear()
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        self.profile = models.Profile.objects.create(name=self.user.username, user=self.user)
+        self.author = models.Author.objects.create(name='Frank Herbert')
+        self.category = models.Category.objects.create(name='science fiction')
+        self.publisher = models.Publisher.objects.create(name='Chilton Books')
+        self.book = models.Book.objects.create(title='Dune', publisher=self.publisher)
+        self.book.authors.add(self.author)
+        self.book.categories.add(self.category)
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_book_detail_is_cached(self):
+        response, first = self.get('/book/{}/'.format(self.book.id))
+        self.assertContains(response, 'Frank Herbert')
+        response, second = self.get('/book/{}/'.format(self.book.id))
+        self.assertContains(response, 'Frank Herbert')
+        self.assertEqual(second, 1)
+        self.assertLess(second, first)
+
+    def test_book_detail_follows_related_changes(self):
+        self.get('/book/{}/'.format(self.book.id))
+        self.author.name = 'Brian Herbert'
+        self.author.save()
+        self.assertContains(self.get('/book/{}/'.format(self.book.id))[0], 'Brian Herbert')
+
+        self.book.categories.clear()
+        self.assertNotContains(self.get('/book/{}/'.format(self.book.id))[0], 'science fiction')
+
+        models.Vote.objects.create(profile=self.profile, book=self.book, value=8)
+        self.assertContains(self.get('/book/{}/'.format(self.book.id))[0], 'dummy (8)')
+
+        self.profile.name = 'renamed'
+        self.profile.save()
+        self.assertContains(self.get('/book/{}/'.format(self.book.id))[0], 'renamed (8)')
+
+    def test_named_detail_follows_book_changes(self):
+        for path in ['/author/{}/'.format(self.author.id), '/category/{}/'.format(self.category.id),
+                     '/publisher/{}/'.format(self.publisher.id)]:
+            self.assertContains(self.get(path)[0], 'Dune')
+        self.book.title = 'Dune Messiah'
+        self.book.save()
+        for path in ['/author/{}/'.format(self.author.id), '/category/{}/'.format(self.category.id),
+                     '/publisher/{}/'.format(self.publisher.id)]:
+            self.assertContains(self.get(path)[0], 'Dune Messiah')
+
+        self.book.delete()
+        self.assertNotContains(self.get('/author/{}/'.format(self.author.id))[0], 'Dune')
+
+    def test_user_forms_are_not_cached(self):
+        models.Vote.objects.create(profile=self.profile, book=self.book, value=3)
+        self.get('/book/{}/'.format(self.book.id))
+        self.client.login(username='dummy', password='123secret')
+        response = self.get('/book/{}/'.format(self.book.id))[0]
+        self.assertEqual(response.context['vote_form']['value'].value(), 3)
+        self.assertContains(response, 'Your vote:')
+
+    def test_anonymous_book_list_is_cached(self):
+        first = self.get('/book/list/')[1]
+        response, second = self.get('/book/list/')
+        self.assertContains(response, 'Frank Herbert')
+        self.assertLess(second, first)
+
+        models.Book.objects.create(title='Children of Dune')
+        self.assertContains(self.get('/book/list/')[0], 'Children of Dune')
+        models.Vote.objects.create(profile=self.profile, book=self.book, value=8)
+        self.assertContains(self.get('/book/list/')[0], 'dummy (8)')
+
+    def test_authenticated_book_list_is_not_cached(self):
+        self.get('/book/list/')
+        self.client.login(username='dummy', password='123secret')
+        self.profile.books.add(self.book)
+        self.assertContains(self.get('/book/list/')[0], 'bi-check-circle')
@@ -0,0 +1,145 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import duplicates
+from .. import editions
+from .. import gbooks
+from .. import importer
+from .. import models
+from .. import search
+from .gbooks_stub import VOLUME
+from .test_gbooks import GoogleBooksStubMixin
+
+
+class EditionsTest(SimpleTestCase):
+    def test_isbn10_is_converted(self):
+        self.assertEqual(editions.canonical_isbn('0-261-10221-4'), '9780261102217')
+        self.assertEqual(editions.canonical_isbn('080442957x'), '9780804429573')
+
+    def test_isbn13_is_kept(self):
+        self.assertEqual(editions.canonical_isbn('978 0441 013593'), '9780441013593')
+        self.assertEqual(editions.canonical_isbn('9791032305690'), '9791032305690')
+
+    def test_invalid_isbns(self):
+        for value in [None, '', '1234567890', '1234567890123', '9780261102218', '0261102215', '97802611022']:
+            self.assertIsNone(editions.canonical_isbn(value), value)
+
+    def test_gbooks_serializer_prefers_isbn13(self):
+        volume = {'volumeInfo': {'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': '9780261102217'},
+                                                         {'type': 'ISBN_10', 'identifier': '0261102214'}]}}
+        self.assertEqual(gbooks.serialize_volume(volume)['isbn'], '9780261102217')
+        volume['volumeInfo']['industryIdentifiers'] = [{'type': 'ISBN_10', 'identifier': '0261102214'}]
+        self.assertEqual(gbooks.serialize_volume(volume)['isbn'], '9780261102217')
+        volume['volumeInfo']['industryIdentifiers'] = [{'type': 'OTHER', 'identifier': 'OCLC:1'}]
+        self.assertEqual(gbooks.serialize_volume(volume)['isbn'], '')
+
+
+class DuplicatesTest(TestCase):
+    def setUp(self) -> None:
+        self.users = [get_user_model().objects.create_user(username=name, password='123secret')
+                      for name in ['ann', 'bob']]
+        self.ann, self.bob = [models.Profile.objects.create(name=user.username, user=user) for user in self.users]
+
+    def test_canonical_isbn_is_saved(self):
+        book = models.Book.objects.create(title='Hobbit', isbn='0261102214')
+        self.assertEqual(book.isbn_canonical, '9780261102217')
+        book.isbn = 'unknown'
+        book.save(update_fields=['isbn'])
+        book.refresh_from_db()
+        self.assertIsNone(book.isbn_canonical)
+
+    def test_find_book(self):
+        book = models.Book.objects.create(title='Hobbit', isbn='9780261102217')
+        with self.assertNumQueries(1):
+            self.assertEqual(duplicates.find_book('0-261-10221-4'), book.id)
+        self.assertIsNone(duplicates.find_book('0261102214', exclude=book.id))
+        with self.assertNumQueries(0):
+            self.assertIsNone(duplicates.find_book('oops'))
+
+    def test_backfill(self):
+        models.Book.objects.bulk_create([models.Book(title='Hobbit', isbn='0261102214'),
+                                         models.Book(title='Dune', isbn='n/a')])
+        self.assertEqual(duplicates.backfill(batch_size=1), 1)
+        self.assertEqual(models.Book.objects.get(title='Hobbit').isbn_canonical, '9780261102217')
+        self.assertEqual(duplicates.backfill(), 0)
+
+    def test_merge(self):
+        tolkien = models.Author.objects.create(name='J.R.R. Tolkien')
+        fantasy = models.Category.objects.create(name='fantasy')
+        kept = models.Book.objects.create(title='The Hobbit', isbn='9780261102217')
+        duplicate = models.Book.objects.create(title='Hobbit', isbn='0261102214', year=1937, description='Tale')
+        duplicate.authors.add(tolkien)
+        duplicate.categories.add(fantasy)
+        kept.categories.add(fantasy)
+        self.ann.books.add(kept, duplicate)
+        self.bob.books.add(duplicate)
+        models.Vote.objects.create(profile=self.ann, book=kept, value=10)
+        models.Vote.objects.create(profile=self.ann, book=duplicate, value=2)
+        models.Vote.objects.create(profile=self.bob, book=duplicate, value=6)
+
+        self.assertEqual(duplicates.find_groups(), [[kept.id, duplicate.id]])
+        self.assertEqual(duplicates.merge(duplicates.find_groups()), 1)
+        self.assertFalse(models.Book.objects.filter(id=duplicate.id).exists())
+        kept.refresh_from_db()
+        self.assertEqual((kept.year, kept.description), (1937, 'Tale'))
+        self.assertEqual(sorted(models.Vote.objects.values_list('profile__name', 'book_id', 'value')),
+                         [('ann', kept.id, 10), ('bob', kept.id, 6)])
+        self.assertEqual((kept.vote_count, kept.vote_average), (2, 8.0))
+        self.assertEqual(list(kept.profile_set.order_by('name').values_list('name', flat=True)), ['ann', 'bob'])
+        self.assertEqual(list(kept.authors.all()), [tolkien])
+        self.assertEqual(list(kept.categories.all()), [fantasy])
+        self.assertTrue(kept.similarity_stale)
+        self.assertEqual(list(search.search_books(models.Book.objects.all(), {'authors': 'tolkien'})), [kept])
+
+    def test_command(self):
+        models.Book.objects.bulk_create([models.Book(title='Hobbit {}'.format(number), isbn=isbn)
+                                         for number, isbn in enumerate(['9780261102217', '0261102214', '0-261'])])
+        out = StringIO()
+        call_command('dedupe_books', dry_run=True, stdout=out)
+        self.assertIn('0 editions with duplicates', out.getvalue())
+        call_command('dedupe_books', stdout=out)
+        self.assertIn('2 canonical ISBNs updated, 1 editions with duplicates, 1 duplicate books merged.',
+                      out.getvalue())
+        self.assertEqual(sorted(models.Book.objects.values_list('title', flat=True)), ['Hobbit 0', 'Hobbit 2'])
+
+
+class DuplicateDetectionTest(GoogleBooksStubMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        models.Profile.objects.create(name=self.user.username, user=self.user)
+        self.client.login(username='dummy', password='123secret')
+        self.book = models.Book.objects.create(title='The Hobbit', isbn='9780261102217')
+
+    def test_form(self):
+        response = self.client.post('/book/create/', {'title': 'Hobbit', 'isbn': '0-261-10221-4'})
+        self.assertContains(response, duplicates.DUPLICATE_ISBN)
+        response = self.client.post('/book/create/', {'title': 'Hobbit', 'isbn': '0261102215'})
+        self.assertContains(response, duplicates.INVALID_ISBN)
+        self.client.post('/book/create/', {'title': 'Dune', 'isbn': '978-0441-013593'})
+        self.assertEqual(models.Book.objects.get(title='Dune').isbn, '9780441013593')
+
+    def test_api(self):
+        response = self.client.post('/api/books/', {'title': 'Hobbit', 'isbn': '0261102214'})
+        self.assertEqual(response.json(), {'isbn': [duplicates.DUPLICATE_ISBN]})
+        response = self.client.post('/api/books/bulk/', [{'title': 'Dune', 'isbn': '9780441013593'},
+                                                         {'title': 'Dune', 'isbn': '0441013597'},
+                                                         {'title': 'Hobbit', 'isbn': '0261102214'}],
+                                    content_type='application/json')
+        self.assertEqual([error.get('isbn') for error in response.json()], [
+            ['Duplicated in this request.'], ['Duplicated in this request.'], [duplicates.DUPLICATE_ISBN]])
+
+    def test_import_skips_known_editions(self):
+        records = [{'title': 'Hobbit', 'isbn': '0261102214'}, {'title': 'Dune', 'isbn': '9780441013593'},
+                   {'title': 'Dune again', 'isbn': '0441013597'}]
+        stats = importer.BookImporter().run(records)
+        self.assertEqual((stats.imported, stats.duplicates), (1, 2))
+        self.assertEqual(models.Book.objects.get(title='Dune').isbn_canonical, '9780441013593')
+
+    def test_gbooks_volume_in_catalogue_is_opened(self):
+        with override_settings(GOOGLE_BOOKS=self.client_options):
+            response = self.client.get('/book/create/{}/'.format(VOLUME['id']))
+        self.assertRedirects(response, '/book/{}/'.format(self.book.id), fetch_redirect_response=False)
@@ -0,0 +1,159 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+
+from .. import enrichment
+from .. import gbooks
+from .. import models
+from .. import search
+from .test_gbooks import GoogleBooksStubMixin
+
+
+class RateLimiterTest(SimpleTestCase):
+    def test_waits_once_the_burst_is_spent(self):
+        now, waits = [0.0], []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        limiter = enrichment.RateLimiter(rate=2, burst=2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            limiter.acquire()
+        self.assertEqual(waits, [0.5, 0.5])
+        now[0] += 10
+        limiter.acquire()
+        self.assertEqual(len(waits), 2)
+
+
+class EnrichmentTest(GoogleBooksStubMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.client_options['RECOVERY_TIMEOUT'] = 0
+        self.worker = enrichment.Worker(name='test', client=gbooks.GoogleBooksClient(**self.client_options),
+                                        limiter=enrichment.RateLimiter(rate=1000, burst=100))
+
+    def run_jobs(self):
+        self.worker.run(burst=True)
+        return {job.book_id: job for job in models.EnrichmentJob.objects.all()}
+
+    def test_enqueue_skips_queued_books(self):
+        book = models.Book.objects.create(title='Hobbit')
+        self.assertEqual(enrichment.enqueue([book.id]), 1)
+        # skipped before the insert, the partial unique constraint is not enforced by every database
+        self.assertEqual(enrichment.enqueue([book.id, book.id]), 0)
+        self.assertEqual(models.EnrichmentJob.objects.count(), 1)
+        models.EnrichmentJob.objects.update(status=models.EnrichmentJob.DONE)
+        self.assertEqual(enrichment.enqueue([book.id], batch_size=1), 1)
+        self.assertEqual(models.EnrichmentJob.objects.count(), 2)
+
+    def test_enqueue_missing(self):
+        incomplete = models.Book.objects.create(title='Hobbit', thumbnail='', description='Tale', isbn='1', year=1937,
+                                                g_rank=4)
+        models.Book.objects.create(title='Dune', thumbnail='http://a.jpg', description='Sand', isbn='2', year=1965,
+                                   g_rank=4)
+        self.assertEqual(enrichment.enqueue_missing(), 1)
+        self.assertEqual(enrichment.enqueue_missing(), 0)
+        self.assertEqual(models.EnrichmentJob.objects.get().book, incomplete)
+
+    def test_enrich_by_isbn(self):
+        book = models.Book.objects.create(title='Hobbit', isbn='9780261102217', description='Mine')
+        enrichment.enqueue([book.id])
+        job = self.run_jobs()[book.id]
+        book.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (models.EnrichmentJob.DONE, 1))
+        self.assertEqual(set(job.filled.split(',')), {'thumbnail', 'year', 'g_rank'})
+        self.assertEqual((book.thumbnail, book.year, book.g_rank, book.description),
+                         ('http://books.google.com/hobbit.jpg', 1937, 4.5, 'Mine'))
+        self.assertEqual(self.stub.requests[0][1]['q'], ['isbn:9780261102217'])
+
+    def test_enrich_by_title(self):
+        book = models.Book.objects.create(title='the  hobbit')
+        other = models.Book.objects.create(title='Dune')
+        enrichment.enqueue([book.id, other.id])
+        jobs = self.run_jobs()
+        book.refresh_from_db()
+        self.assertEqual(book.isbn, '9780261102217')
+        self.assertEqual(list(search.search_books(models.Book.objects.all(), {'isbn': '9780261102217'})), [book])
+        self.assertEqual(jobs[other.id].status, models.EnrichmentJob.FAILED)
+        self.assertEqual(jobs[other.id].error, 'No matching Google Books volume.')
+
+    def test_failures_are_retried_with_backoff(self):
+        self.stub.server.status = 503
+        book = models.Book.objects.create(title='The Hobbit')
+        enrichment.enqueue([book.id])
+        job = self.run_jobs()[book.id]
+        self.assertEqual((job.status, job.attempts, job.locked_by), (models.EnrichmentJob.PENDING, 1, ''))
+        self.assertIn('503', job.error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=30))
+
+        self.stub.server.status = 200
+        models.EnrichmentJob.objects.update(run_after=timezone.now())
+        job = self.run_jobs()[book.id]
+        self.assertEqual((job.status, job.attempts, job.error), (models.EnrichmentJob.DONE, 2, ''))
+
+    def test_failed_after_max_attempts(self):
+        self.stub.server.status = 503
+        self.worker.options['MAX_ATTEMPTS'] = 1
+        book = models.Book.objects.create(title='The Hobbit')
+        enrichment.enqueue([book.id])
+        self.assertEqual(self.run_jobs()[book.id].status, models.EnrichmentJob.FAILED)
+
+    def test_claim(self):
+        books = [models.Book.objects.create(title='Book {}'.format(i)) for i in range(3)]
+        enrichment.enqueue([book.id for book in books])
+        first = enrichment.claim('a', 2)
+        second = enrichment.claim('b', 2)
+        self.assertEqual([job.book for job in first], books[:2])
+        self.assertEqual([job.book for job in second], books[2:])
+        self.assertEqual(enrichment.claim('c', 2), [])
+        # jobs of a worker that died are claimed again after the lock timeout
+        models.EnrichmentJob.objects.filter(id=first[0].id).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([job.id for job in enrichment.claim('c', 2)], [first[0].id])
+
+    def test_edits_made_while_running_are_kept(self):
+        book = models.Book.objects.create(title='The Hobbit')
+        enrichment.enqueue([book.id])
+        jobs = enrichment.claim('test', 1)
+        models.Book.objects.filter(id=book.id).update(year=1938, description='Edited')
+        self.assertEqual(self.worker.process(jobs)['books'], 1)
+        book.refresh_from_db()
+        self.assertEqual((book.year, book.description, book.isbn_canonical), (1938, 'Edited', '9780261102217'))
+        self.assertEqual(book.thumbnail, 'http://books.google.com/hobbit.jpg')
+
+    def test_jobs_claimed_again_are_not_saved_twice(self):
+        book = models.Book.objects.create(title='The Hobbit')
+        enrichment.enqueue([book.id])
+        jobs = enrichment.claim('a', 1)
+        models.EnrichmentJob.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(len(enrichment.claim('b', 1)), 1)
+        self.assertEqual(self.worker.process(jobs), {'done': 1, 'retried': 0, 'failed': 0, 'books': 0})
+        book.refresh_from_db()
+        self.assertIsNone(book.year)
+        job = models.EnrichmentJob.objects.get()
+        self.assertEqual((job.status, job.attempts, job.locked_by[:2]), (models.EnrichmentJob.RUNNING, 0, 'b:'))
+
+    def test_book_create_view_queues_incomplete_books(self):
+        user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        models.Profile.objects.create(name=user.username, user=user)
+        self.client.login(username='dummy', password='123secret')
+        self.client.post(path='/book/create/', data={'title': 'The Hobbit'})
+        job = models.EnrichmentJob.objects.get()
+        self.assertEqual((job.book.title, job.status), ('The Hobbit', models.EnrichmentJob.PENDING))
+
+    def test_command(self):
+        book = models.Book.objects.create(title='The Hobbit')
+        out = StringIO()
+        with override_settings(GOOGLE_BOOKS=self.client_options):
+            call_command('enrich_books', enqueue_missing=True, burst=True, rate=1000, stdout=out)
+        self.assertIn('Queued 1 books.', out.getvalue())
+        self.assertIn('1 enriched (1 books updated)', out.getvalue())
+        book.refresh_from_db()
+        self.assertEqual(book.year, 1937)
+        out = StringIO()
+        call_command('enrich_books', status=True, stdout=out)
+        self.assertIn('done: 1', out.getvalue())
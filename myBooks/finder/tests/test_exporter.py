@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import exporter
+from .. import importer
+from .. import models
+
+
+class ExporterTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        self.profile = models.Profile.objects.create(name=self.user.username, user=self.user)
+        publisher = models.Publisher.objects.create(name='Chilton Books')
+        self.books = [models.Book.objects.create(title='Book {}'.format(i), year=1900 + i, publisher=publisher)
+                      for i in range(5)]
+        self.books[0].authors.add(models.Author.objects.create(name='Frank Herbert'),
+                                  models.Author.objects.create(name='Brian Herbert'))
+        self.books[0].categories.add(models.Category.objects.create(name='science fiction'))
+        models.Vote.objects.create(profile=self.profile, book=self.books[0], value=8)
+        self.profile.books.add(self.books[1])
+
+    def test_books_jsonl(self):
+        lines = [json.loads(line) for line in exporter.export('books', 'jsonl')]
+        self.assertEqual([line['title'] for line in lines], ['Book {}'.format(i) for i in range(5)])
+        self.assertEqual(lines[0]['authors'], ['Brian Herbert', 'Frank Herbert'])
+        self.assertEqual((lines[0]['categories'], lines[0]['publisher']), (['science fiction'], 'Chilton Books'))
+        self.assertEqual((lines[0]['vote_count'], lines[0]['vote_average']), (1, 8.0))
+        self.assertEqual(lines[1]['authors'], [])
+
+    def test_books_query_count_depends_on_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(list(exporter.export('books', 'jsonl', chunk_size=2))), 5)
+        # one book query plus two name queries for each of the three chunks
+        self.assertEqual(len(queries), 7)
+
+    def test_csv_can_be_imported(self):
+        stream = io.StringIO(''.join(exporter.export('books', 'csv')))
+        records = list(importer.read_records(stream, 'csv'))
+        self.assertEqual(importer.normalize(records[0])['authors'], ['Brian Herbert', 'Frank Herbert'])
+        self.assertEqual(records[0]['year'], '1900')
+        self.assertEqual(records[1]['vote_average'], '')
+
+    def test_votes_and_owned(self):
+        self.assertEqual([json.loads(line) for line in exporter.export('owned', 'jsonl')],
+                         [{'profile_id': str(self.profile.id), 'book_id': self.books[1].id}])
+        rows = list(csv.DictReader(io.StringIO(''.join(exporter.export('votes', 'csv')))))
+        self.assertEqual((rows[0]['book_id'], rows[0]['value']), (str(self.books[0].id), '8'))
+
+    def test_view(self):
+        response = self.client.get(path='/export/books/', data={'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 6)
+        self.assertEqual(self.client.get(path='/export/books/', data={'format': 'xml'}).status_code, 404)
+        self.assertEqual(self.client.get(path='/export/users/').status_code, 404)
+
+        self.assertEqual(self.client.get(path='/export/votes/').status_code, 302)
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.get(path='/export/votes/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['value'], 8)
+
+    def test_view_exports_only_own_and_friends_rows(self):
+        other_user = get_user_model().objects.create_user(username='other', password='123secret')
+        other = models.Profile.objects.create(name=other_user.username, user=other_user)
+        other.books.add(self.books[2])
+        models.Vote.objects.create(profile=other, book=self.books[3], value=2)
+        self.client.login(username='dummy', password='123secret')
+
+        def exported(dataset):
+            response = self.client.get(path='/export/{}/'.format(dataset))
+            return [(row['profile_id'], row['book_id']) for row in map(json.loads, response.streaming_content)]
+
+        self.assertEqual(exported('owned'), [(str(self.profile.id), self.books[1].id)])
+        self.assertEqual(exported('votes'), [(str(self.profile.id), self.books[0].id)])
+        self.profile.friends.add(other)
+        self.assertEqual(exported('owned'),
+                         [(str(self.profile.id), self.books[1].id), (str(other.id), self.books[2].id)])
+        self.assertEqual(exported('votes'), [(str(self.profile.id), self.books[0].id)])
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(len(exported('votes')), 2)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_data', 'books', '--chunk-size', '2', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
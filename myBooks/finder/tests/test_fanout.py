@@ -0,0 +1,128 @@
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from .. import fanout
+from .. import gbooks
+from .. import models
+from .test_gbooks import GoogleBooksStubMixin
+
+
+class FanoutSearchTest(GoogleBooksStubMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.gbooks = gbooks.GoogleBooksClient(**self.client_options)
+        self.addCleanup(self.gbooks.close)
+
+    def test_same_isbn_is_merged(self):
+        book = models.Book.objects.create(title='The Hobbit', isbn='9780261102217')
+        found = fanout.search_all({'title': 'hobbit'}, client=self.gbooks)
+        self.assertEqual(found['sources'], {'google': 'ok', 'local': 'ok'})
+        self.assertFalse(found['partial'])
+        [item] = found['results']
+        self.assertEqual((item['book_id'], item['gbooks_id'], item['sources']),
+                         (book.id, 'hobbit1', ['local', 'google']))
+        self.assertEqual(item['thumbnail'], 'http://books.google.com/hobbit.jpg')
+
+    def test_google_result_already_in_catalogue(self):
+        book = models.Book.objects.create(title='Hobbit, annotated', isbn='0261102214')
+        models.Book.objects.create(title='Dune', isbn='9780441013593')
+        found = fanout.search_all({'title': 'dune'}, client=self.gbooks)
+        self.assertEqual([(item['title'], item['book_id'], item['in_catalogue']) for item in found['results']],
+                         [('Dune', found['results'][0]['book_id'], True), ('The Hobbit', book.id, True)])
+        self.assertEqual(found['results'][1]['sources'], ['google'])
+
+    def test_new_google_result(self):
+        found = fanout.search_all({'title': 'hobbit'}, client=self.gbooks)
+        [item] = found['results']
+        self.assertEqual((item['book_id'], item['in_catalogue']), (None, False))
+
+    def test_partial_results_when_google_is_late(self):
+        models.Book.objects.create(title='The Hobbit')
+        self.stub.server.delay = 0.3
+        found = fanout.search_all({'title': 'hobbit'}, timeout=0.1, client=self.gbooks)
+        self.assertEqual(found['sources'], {'google': 'timeout', 'local': 'ok'})
+        self.assertTrue(found['partial'])
+        self.assertEqual([item['sources'] for item in found['results']], [['local']])
+
+    def test_async_search(self):
+        book = models.Book.objects.create(title='The Hobbit', isbn='9780261102217')
+        client = gbooks.AsyncGoogleBooksClient(**self.client_options)
+        found = async_to_sync(fanout.asearch_all)({'title': 'hobbit'}, client=client)
+        self.assertEqual([(item['book_id'], item['sources']) for item in found['results']],
+                         [(book.id, ['local', 'google'])])
+        self.stub.server.delay = 0.3
+        found = async_to_sync(fanout.asearch_all)({'title': 'dune'}, timeout=0.1, client=client)
+        self.assertEqual((found['sources'], found['results']), ({'google': 'timeout', 'local': 'ok'}, []))
+
+    def test_partial_results_when_google_fails(self):
+        self.stub.server.status = 503
+        found = fanout.search_all({'title': 'hobbit'}, client=self.gbooks)
+        self.assertEqual((found['sources']['google'], found['results']), ('error', []))
+
+    def test_partial_results_when_catalogue_fails(self):
+        def broken_search_local(*args):
+            raise RuntimeError('catalogue is down')
+
+        client = gbooks.AsyncGoogleBooksClient(**self.client_options)
+        with mock.patch.object(fanout, 'search_local', broken_search_local), self.assertLogs(fanout.logger):
+            for found in [fanout.search_all({'title': 'hobbit'}, client=self.gbooks),
+                          async_to_sync(fanout.asearch_all)({'title': 'hobbit'}, client=client)]:
+                self.assertEqual(found['sources'], {'google': 'ok', 'local': 'error'})
+                self.assertTrue(found['partial'])
+                self.assertEqual([item['sources'] for item in found['results']], [['google']])
+
+    def test_empty_query(self):
+        models.Book.objects.create(title='The Hobbit')
+        self.assertEqual(fanout.search_all({'title': ' '}, client=self.gbooks)['results'], [])
+        self.assertEqual(self.stub.requests, [])
+
+    def test_view_and_api(self):
+        models.Book.objects.create(title='The Hobbit', isbn='9780261102217')
+        # the google search of the async view stores its results from another thread, which would wait for the
+        # transaction of the test
+        with override_settings(GOOGLE_BOOKS={**self.client_options, 'STORE': False}):
+            response = self.client.get('/search/', {'title': 'hobbit'})
+            self.assertContains(response, 'Already in catalogue', count=1)
+            data = self.client.get('/api/books/search/', {'title': 'hobbit'}).json()
+        self.assertEqual(data['sources'], {'google': 'ok', 'local': 'ok'})
+        self.assertEqual([item['gbooks_id'] for item in data['results']], ['hobbit1'])
+
+
+class ConcurrentFanoutSearchTest(GoogleBooksStubMixin, TransactionTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.gbooks = gbooks.GoogleBooksClient(**self.client_options)
+        self.addCleanup(self.gbooks.close)
+
+    def test_sources_run_concurrently(self):
+        book = models.Book.objects.create(title='The Hobbit', isbn='9780261102217')
+        # neither source gets past the barrier before the other one has started, run one after the other they
+        # would both fail
+        barrier = threading.Barrier(2, timeout=5)
+
+        def after_barrier(function):
+            def wrapper(*args):
+                barrier.wait()
+                return function(*args)
+            return wrapper
+
+        with mock.patch.object(fanout, 'search_local', after_barrier(fanout.search_local)), \
+                mock.patch.object(fanout, '_search_google_in_thread', after_barrier(fanout._search_google_in_thread)):
+            found = fanout.search_all({'title': 'hobbit'}, timeout=10, client=self.gbooks)
+        self.assertEqual(found['sources'], {'google': 'ok', 'local': 'ok'})
+        self.assertEqual([(item['book_id'], item['sources']) for item in found['results']],
+                         [(book.id, ['local', 'google'])])
+
+    def test_partial_results_when_catalogue_is_late(self):
+        models.Book.objects.create(title='The Hobbit')
+        released = threading.Event()
+        self.addCleanup(released.set)
+        client = gbooks.AsyncGoogleBooksClient(**self.client_options)
+        with mock.patch.object(fanout, 'search_local', lambda *args: released.wait(5)):
+            for found in [fanout.search_all({'title': 'hobbit'}, timeout=1, client=self.gbooks),
+                          async_to_sync(fanout.asearch_all)({'title': 'hobbit'}, timeout=1, client=client)]:
+                self.assertEqual(found['sources'], {'google': 'ok', 'local': 'timeout'})
+                self.assertEqual([item['sources'] for item in found['results']], [['google']])
@@ -0,0 +1,75 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import caching
+from .. import friends
+from .. import models
+
+
+class FriendsTest(TestCase):
+    def setUp(self) -> None:
+        caching.get_cache().clear()
+        self.profiles = {}
+        for name in ['dummy', 'anna', 'bob', 'carl', 'dora']:
+            user = get_user_model().objects.create_user(username=name, password='123secret')
+            self.profiles[name] = models.Profile.objects.create(name=name, user=user)
+        self.dummy, self.anna, self.bob, self.carl, self.dora = self.profiles.values()
+        self.dummy.friends.add(self.anna, self.bob)
+        self.anna.friends.add(self.carl, self.dora)
+        self.bob.friends.add(self.carl)
+
+    def test_adjacency_is_cached(self):
+        self.assertEqual(friends.get_friend_ids(self.dummy.pk), {self.anna.pk, self.bob.pk})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(friends.are_friends(self.dummy.pk, self.anna.pk))
+            self.assertTrue(friends.are_friends(self.anna.pk, self.dummy.pk))
+            self.assertFalse(friends.are_friends(self.dummy.pk, self.carl.pk))
+        self.assertEqual(len(queries), 1)
+
+    def test_invalidation(self):
+        friends.get_adjacency(self.profiles[name].pk for name in self.profiles)
+        self.carl.friends.add(self.dummy)
+        self.assertTrue(friends.are_friends(self.dummy.pk, self.carl.pk))
+        self.anna.friends.clear()
+        self.assertEqual(friends.get_friend_ids(self.dora.pk), set())
+        self.assertEqual(friends.get_friend_ids(self.dummy.pk), {self.bob.pk, self.carl.pk})
+        self.bob.user.delete()
+        self.assertEqual(friends.get_friend_ids(self.dummy.pk), {self.carl.pk})
+
+    def test_refill_racing_a_change_is_not_served(self):
+        # a reader that loaded the rows before the friendship was added stores them under the old version
+        version = caching.get_object_versions(friends.SCOPE, [self.dummy.pk])[self.dummy.pk]
+        self.dummy.friends.add(self.carl)
+        caching.get_cache().set(friends.cache_key(self.dummy.pk, version), frozenset([self.anna.pk]), friends.TIMEOUT)
+        self.assertTrue(friends.are_friends(self.dummy.pk, self.carl.pk))
+
+    def test_mutual_friends_and_suggestions(self):
+        self.assertEqual(friends.get_mutual_friend_ids(self.dummy.pk, self.carl.pk), {self.anna.pk, self.bob.pk})
+        self.assertEqual(friends.get_suggestions(self.dummy.pk), [(self.carl.pk, 2), (self.dora.pk, 1)])
+
+    def test_profile_pages(self):
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.get(path='/profile/{}/'.format(self.dummy.pk))
+        self.assertEqual([(profile.name, count) for profile, count in response.context['suggestions']],
+                         [('carl', 2), ('dora', 1)])
+        self.assertContains(response, 'People you may know:')
+        response = self.client.get(path='/profile/{}/'.format(self.carl.pk))
+        self.assertFalse(response.context['are_friends'])
+        self.assertEqual([profile.name for profile in response.context['mutual_friends']], ['anna', 'bob'])
+        self.assertContains(response, 'Mutual friends (2):')
+        self.assertTrue(self.client.get(path='/profile/{}/'.format(self.anna.pk)).context['are_friends'])
+
+        response = self.client.get(path='/profile/list/')
+        self.assertEqual(response.context['friend_ids'], {self.anna.pk, self.bob.pk})
+
+    def test_api(self):
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.get(path='/api/profiles/{}/friends/'.format(self.carl.pk))
+        self.assertEqual(response.json(), {'friends': sorted([str(self.anna.pk), str(self.bob.pk)]),
+                                           'is_friend': False,
+                                           'mutual': sorted([str(self.anna.pk), str(self.bob.pk)])})
+        response = self.client.get(path='/api/profiles/{}/suggestions/'.format(self.dummy.pk))
+        self.assertEqual(response.json()[0], {'id': str(self.carl.pk), 'name': 'carl', 'mutual': 2})
+        self.assertEqual(self.client.get(path='/api/profiles/{}/suggestions/'.format(self.carl.pk)).status_code, 403)
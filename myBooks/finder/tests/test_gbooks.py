@@ -0,0 +1,173 @@
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from .. import gbooks
+from .. import models
+from .gbooks_stub import GoogleBooksStub
+
+
+class GoogleBooksStubMixin:
+    def setUp(self) -> None:
+        super().setUp()
+        self.stub = GoogleBooksStub().start()
+        self.addCleanup(self.stub.stop)
+        self.client_options = {'API_URL': self.stub.api_url, 'CONNECT_TIMEOUT': 1, 'READ_TIMEOUT': 0.5,
+                               'RETRIES': 0, 'FAILURE_THRESHOLD': 2, 'RECOVERY_TIMEOUT': 60}
+
+
+class BuildQueryTest(SimpleTestCase):
+    def test_query_is_normalized(self):
+        self.assertEqual(gbooks.build_query(title='  The   HOBBIT ', authors='Tolkien', isbn='978-0261'),
+                         'intitle:the intitle:hobbit inauthor:tolkien isbn:9780261')
+
+    def test_empty_query(self):
+        self.assertEqual(gbooks.build_query(title=' '), '')
+
+
+class TTLCacheTest(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = gbooks.TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_entry_is_dropped(self):
+        cache = gbooks.TTLCache(maxsize=2, ttl=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+class GoogleBooksClientTest(GoogleBooksStubMixin, SimpleTestCase):
+    def test_volume(self):
+        client = gbooks.GoogleBooksClient(**self.client_options)
+        self.assertEqual(client.volume('hobbit1')['volumeInfo']['title'], 'The Hobbit')
+        self.assertIsNone(client.volume('missing'))
+
+    def test_search_results_are_cached_by_normalized_query(self):
+        client = gbooks.GoogleBooksClient(**self.client_options)
+        self.assertEqual(len(client.search(title='Hobbit')), 1)
+        self.assertEqual(len(client.search(title='  hobbit ')), 1)
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(self.stub.requests[0][1]['q'], ['intitle:hobbit'])
+
+    def test_empty_search_does_not_hit_upstream(self):
+        client = gbooks.GoogleBooksClient(**self.client_options)
+        self.assertEqual(client.search(), [])
+        self.assertEqual(self.stub.requests, [])
+
+    def test_timeout(self):
+        self.stub.server.delay = 1
+        client = gbooks.GoogleBooksClient(**self.client_options)
+        self.assertIsNone(client.volume('hobbit1'))
+
+    def test_circuit_opens_after_failures(self):
+        self.stub.server.status = 503
+        client = gbooks.GoogleBooksClient(**self.client_options)
+        self.assertIsNone(client.volume('a'))
+        self.assertIsNone(client.volume('b'))
+        self.assertTrue(client.breaker.is_open)
+        self.assertIsNone(client.volume('hobbit1'))
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_circuit_recovers(self):
+        self.stub.server.status = 503
+        client = gbooks.GoogleBooksClient(**dict(self.client_options, RECOVERY_TIMEOUT=0))
+        client.volume('a')
+        client.volume('b')
+        self.stub.server.status = 200
+        self.assertIsNotNone(client.volume('hobbit1'))
+        self.assertFalse(client.breaker.is_open)
+
+    def test_retries_on_server_errors(self):
+        self.stub.server.status = 503
+        client = gbooks.GoogleBooksClient(**dict(self.client_options, RETRIES=2, BACKOFF_FACTOR=0))
+        self.assertIsNone(client.volume('hobbit1'))
+        self.assertEqual(len(self.stub.requests), 3)
+
+
+class AsyncGoogleBooksClientTest(GoogleBooksStubMixin, SimpleTestCase):
+    def test_search_and_volume(self):
+        client = gbooks.AsyncGoogleBooksClient(**self.client_options)
+        items = async_to_sync(client.search)(title='hobbit')
+        self.assertEqual(items[0]['id'], 'hobbit1')
+        self.assertEqual(async_to_sync(client.volume)('hobbit1')['volumeInfo']['title'], 'The Hobbit')
+        self.assertIsNone(async_to_sync(client.volume)('missing'))
+
+    def test_shares_cache_with_the_sync_client(self):
+        client = gbooks.GoogleBooksClient(**self.client_options)
+        async_client = gbooks.AsyncGoogleBooksClient(cache=client.cache, breaker=client.breaker, **self.client_options)
+        async_to_sync(async_client.volume)('hobbit1')
+        self.assertEqual(client.volume('hobbit1')['id'], 'hobbit1')
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_failures(self):
+        self.stub.server.status = 503
+        client = gbooks.AsyncGoogleBooksClient(**dict(self.client_options, RETRIES=1, BACKOFF_FACTOR=0))
+        with self.assertRaises(gbooks.GoogleBooksError):
+            async_to_sync(client.search)(title='hobbit', strict=True)
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertIsNone(async_to_sync(client.volume)('hobbit1'))
+        self.assertTrue(client.breaker.is_open)
+
+    def test_timeout(self):
+        self.stub.server.delay = 1
+        client = gbooks.AsyncGoogleBooksClient(**self.client_options)
+        self.assertIsNone(async_to_sync(client.volume)('hobbit1'))
+
+
+class GoogleBooksViewsTest(GoogleBooksStubMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        override = override_settings(GOOGLE_BOOKS=self.client_options)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        models.Profile.objects.create(name=self.user.username, user=self.user)
+
+    def test_gbooks_list_view(self):
+        response = self.client.get(path='/gbooks/', data={'title': 'hobbit'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['gbooks_list'][0]['gbooks_id'], 'hobbit1')
+
+    def test_gbooks_detail_view(self):
+        response = self.client.get(path='/gbooks/hobbit1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['book']['title'], 'The Hobbit')
+
+    def test_gbooks_views_close_their_session(self):
+        # the test client request is served like under WSGI, on an event loop of its own
+        self.client.get(path='/gbooks/', data={'title': 'hobbit'})
+        self.client.get(path='/gbooks/hobbit1/')
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertEqual(len(gbooks.get_async_client()._sessions), 0)
+
+    def test_gbooks_detail_view_upstream_down(self):
+        self.stub.server.status = 503
+        response = self.client.get(path='/gbooks/hobbit1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('book', response.context)
+
+    def test_book_create_initial_from_gbooks(self):
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.get(path='/book/create/hobbit1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].initial['title'], 'The Hobbit')
+        self.assertEqual(response.context['form'].initial['authors'], 'J.R.R. Tolkien')
+
+    def test_book_create_from_gbooks_keeps_rating(self):
+        self.client.login(username='dummy', password='123secret')
+        self.client.post(path='/book/create/hobbit1/', data={'title': 'The Hobbit'})
+        self.assertEqual(models.Book.objects.get(title='The Hobbit').g_rank, 4.5)
+
+    def test_book_create_requires_login(self):
+        response = self.client.get(path='/book/create/hobbit1/')
+        self.assertRedirects(response, '/login/?next=/book/create/hobbit1/', fetch_redirect_response=False)
+        self.assertEqual(self.stub.requests, [])
+
+    def test_gbooks_list_view_is_get_only(self):
+        self.assertEqual(self.client.post(path='/gbooks/', data={'title': 'hobbit'}).status_code, 405)
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from .. import importer
+from .. import models
+from .. import search
+from .gbooks_stub import VOLUME
+
+CSV = '''title,authors,categories,publisher,year,isbn
+Dune,Frank Herbert,"science fiction, classic",Chilton Books,1965,978-0441013593
+Children of Dune,Frank Herbert,science fiction,Putnam,1976,
+,Nobody,,,,
+Hobbit,J.R.R. Tolkien,fantasy,,1937,
+'''
+
+
+class ImporterTest(TestCase):
+    def setUp(self) -> None:
+        self.author = models.Author.objects.create(name='Frank Herbert')
+
+    def write(self, content, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_csv(self):
+        stats = importer.BookImporter(batch_size=2).run(importer.read_records(StringIO(CSV), 'csv'))
+        self.assertEqual((stats.imported, stats.skipped, stats.batches, stats.position), (3, 1, 2, 4))
+
+        dune = models.Book.objects.get(title='Dune')
+        self.assertEqual((dune.year, dune.isbn, dune.publisher.name), (1965, '9780441013593', 'Chilton Books'))
+        self.assertEqual(list(dune.authors.all()), [self.author])
+        self.assertCountEqual(dune.categories.values_list('name', flat=True), ['science fiction', 'classic'])
+        self.assertEqual(models.Author.objects.count(), 2)
+        self.assertEqual(models.Category.objects.count(), 3)
+        self.assertEqual(dune.vote_count, 0)
+
+    def test_imported_books_are_searchable(self):
+        importer.BookImporter().run(importer.read_records(StringIO(CSV), 'csv'))
+        found = search.search_books(models.Book.objects.all(), {'authors': 'herbert'})
+        self.assertCountEqual(found.values_list('title', flat=True), ['Dune', 'Children of Dune'])
+
+    def test_batch_query_count_is_constant(self):
+        records = [{'title': 'Book {}'.format(i), 'authors': ['Author {}'.format(i % 7)], 'categories': 'novel'}
+                   for i in range(50)]
+        with self.assertNumQueries(16):
+            importer.BookImporter(batch_size=50).run(records)
+        self.assertEqual(models.Book.authors.through.objects.count(), 50)
+
+    def test_import_jsonl_and_gbooks(self):
+        lines = [json.dumps({'title': 'Dune', 'authors': ['Frank Herbert'], 'g_rank': '4.5'}),
+                 json.dumps({'items': [VOLUME]})]
+        importer.BookImporter().run(importer.read_records(StringIO(lines[0]), 'jsonl'))
+        importer.BookImporter().run(importer.read_records(StringIO(lines[1]), 'gbooks'))
+        self.assertEqual(models.Book.objects.get(title='Dune').g_rank, 4.5)
+        hobbit = models.Book.objects.get(title=VOLUME['volumeInfo']['title'])
+        self.assertEqual(list(hobbit.authors.values_list('name', flat=True)), VOLUME['volumeInfo']['authors'])
+
+    def test_invalid_json_line(self):
+        with self.assertRaises(importer.InvalidRecord):
+            importer.BookImporter(batch_size=1).run(
+                importer.read_records(StringIO('{"title": "Dune"}\n{oops\n'), 'jsonl'))
+        self.assertTrue(models.Book.objects.filter(title='Dune').exists())
+
+    def test_command_resumes_after_failure(self):
+        path = self.write(CSV, '.csv')
+        broken = self.write('{"title": "Dune"}\n{"title": "Hobbit"}\n{oops\n{"title": "Emma"}\n', '.jsonl')
+        with self.assertRaises(CommandError):
+            call_command('import_books', broken, batch_size=1, stdout=StringIO())
+        self.assertEqual(models.ImportCheckpoint.objects.get(name=os.path.abspath(broken)).position, 2)
+
+        with open(broken, 'w', encoding='utf-8') as stream:
+            stream.write('{"title": "Dune"}\n{"title": "Hobbit"}\n{"title": "Ulysses"}\n{"title": "Emma"}\n')
+        out = StringIO()
+        call_command('import_books', broken, resume=True, batch_size=1, stdout=out)
+        self.assertIn('Imported 2 books', out.getvalue())
+        self.assertEqual(models.Book.objects.filter(title='Dune').count(), 1)
+        self.assertTrue(models.Book.objects.filter(title='Ulysses').exists())
+
+        call_command('import_books', path, offset=3, stdout=StringIO())
+        self.assertEqual(list(models.Book.objects.filter(title='Children of Dune')), [])
+        self.assertTrue(models.Book.objects.filter(title='Hobbit', year=1937).exists())
+
+
+class ImportApiTest(TestCase):
+    def setUp(self) -> None:
+        self.admin = get_user_model().objects.create_user(username='admin', password='123secret', is_staff=True)
+        models.Profile.objects.create(name='admin', user=self.admin)
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+
+    def test_import_requires_admin(self):
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.post('/api/books/import/', [{'title': 'Dune'}], content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_import_json(self):
+        self.client.login(username='admin', password='123secret')
+        response = self.client.post('/api/books/import/', [{'title': 'Dune', 'authors': 'Frank Herbert'}, {}],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['imported'], response.json()['skipped']), (1, 1))
+        self.assertEqual(models.Book.objects.get(title='Dune').added_by, self.admin.profile)
+
+    def test_import_file(self):
+        self.client.login(username='admin', password='123secret')
+        response = self.client.post('/api/books/import/', {
+            'file': SimpleUploadedFile('books.csv', CSV.encode()), 'format': 'csv'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['imported'], 3)
@@ -0,0 +1,86 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import caching
+from .. import library
+from .. import models
+
+
+class LibraryTest(TestCase):
+    def setUp(self) -> None:
+        caching.get_cache().clear()
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        self.profile = models.Profile.objects.create(name='dummy', user=self.user)
+        self.books = [models.Book.objects.create(title=title) for title in ['Dune', 'Hobbit', 'Emma']]
+        self.profile.books.add(self.books[0])
+        models.Vote.objects.create(profile=self.profile, book=self.books[1], value=8)
+        self.client.login(username='dummy', password='123secret')
+
+    def get_library(self):
+        return self.client.get('/book/list/').context['library']
+
+    def test_library_is_loaded_on_login(self):
+        self.assertEqual(self.client.session[library.SESSION_KEY]['owned'], [self.books[0].id])
+        with CaptureQueriesContext(connection) as queries:
+            user_library = self.get_library()
+        self.assertEqual(user_library.owned, {self.books[0].id})
+        self.assertEqual(user_library.vote_for(self.books[1].id), 8)
+        self.assertIsNone(user_library.vote_for(self.books[0].id))
+        self.assertFalse(any('finder_profile_books' in query['sql'] for query in queries.captured_queries))
+
+    def test_library_is_reloaded_for_another_user(self):
+        other = get_user_model().objects.create_user(username='other', password='123secret')
+        models.Profile.objects.create(name='other', user=other)
+        self.client.force_login(other)
+        self.assertEqual(self.get_library().owned, set())
+
+    def test_owned_change_invalidates_library(self):
+        self.get_library()
+        self.client.post('/profile/{}/owned/{}/'.format(self.profile.id, self.books[2].id), data={'owned': 'True'})
+        self.assertEqual(self.get_library().owned, {self.books[0].id, self.books[2].id})
+        self.books[0].profile_set.clear()
+        self.assertEqual(self.get_library().owned, {self.books[2].id})
+
+    def test_vote_change_invalidates_library(self):
+        self.get_library()
+        self.client.post('/book/{}/vote/'.format(self.books[2].id), data={'value': 3})
+        self.assertEqual(self.get_library().vote_for(self.books[2].id), 3)
+        response = self.client.post('/api/votes/bulk/', data=[{'book_id': self.books[0].id, 'value': 10}],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_library().vote_for(self.books[0].id), 10)
+        models.Vote.objects.filter(book=self.books[1]).delete()
+        self.assertIsNone(self.get_library().vote_for(self.books[1].id))
+
+    def test_stale_copy_is_reloaded_in_one_query_without_writing_the_session(self):
+        self.books[0].profile_set.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_library().owned, set())
+        sqls = [query['sql'] for query in queries.captured_queries]
+        loads = [sql for sql in sqls if 'finder_profile_books' in sql]
+        self.assertEqual(len(loads), 1)
+        self.assertIn('finder_vote', loads[0])
+        self.assertFalse(any(sql.startswith('UPDATE "django_session"') for sql in sqls))
+
+    def test_version_is_kept_in_the_database(self):
+        self.profile.refresh_from_db()
+        self.profile.books.add(self.books[2])
+        # a full save of a stale profile must not take the version back
+        self.profile.name = 'renamed'
+        self.profile.save()
+        caching.get_cache().clear()
+        self.assertEqual(self.get_library().owned, {self.books[0].id, self.books[2].id})
+
+    def test_detail_view_uses_library(self):
+        response = self.client.get('/book/{}/'.format(self.books[0].id))
+        self.assertTrue(response.context['owned'])
+        response = self.client.get('/book/{}/'.format(self.books[1].id))
+        self.assertFalse(response.context['owned'])
+        self.assertEqual(str(response.context['vote_form']['value'].value()), '8')
+
+    def test_anonymous_user_has_empty_library(self):
+        self.client.logout()
+        self.assertEqual(self.get_library().owned, set())
+        self.assertNotIn(library.SESSION_KEY, self.client.session)
@@ -0,0 +1,21 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import loadtest
+
+
+class LoadTestTest(TestCase):
+    def test_asgi_serves_slow_upstream_requests_concurrently(self):
+        wsgi, asgi = loadtest.run(requests=6, concurrency=6, threads=1, latency=0.1)
+        for result in [wsgi, asgi]:
+            self.assertEqual((result['requests'], result['errors'], result['upstream']), (6, 0, 6))
+        self.assertGreaterEqual(wsgi['seconds'], 0.6)
+        self.assertGreater(asgi['rps'], wsgi['rps'])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('loadtest', requests=2, concurrency=2, threads=1, latency=0, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[:3] for line in lines[1:]], [['wsgi', '2', '0'], ['asgi', '2', '0']])
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from .. import metrics
+from .. import models
+from .test_gbooks import GoogleBooksStubMixin
+
+
+@override_settings(METRICS={'HEADERS': True})
+class RequestMetricsMiddlewareTest(TestCase):
+    def setUp(self) -> None:
+        for title in ['Hobbit', 'Dune']:
+            models.Book.objects.create(title=title)
+
+    def test_headers(self):
+        response = self.client.get(path='/book/list/')
+        self.assertEqual(response['X-Query-Count'], '4')
+        timings = dict(part.split(';dur=') for part in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timings), ['sql', 'render', 'total'])
+        self.assertGreaterEqual(float(timings['total']), float(timings['render']))
+
+    def test_api_view_name(self):
+        with self.assertLogs('finder.metrics', 'INFO') as logs, \
+                self.settings(METRICS={'LOG': True}):
+            self.client.get(path='/api/books/')
+            self.client.get(path='/book/list/')
+        lines = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual([line['view'] for line in lines], ['api:book-list', 'book-list'])
+        self.assertEqual(lines[0]['status'], 200)
+        self.assertIn('sql_ms', lines[0])
+
+    def test_headers_are_optional(self):
+        with self.settings(METRICS={}):
+            response = self.client.get(path='/book/list/')
+        self.assertNotIn('X-Query-Count', response)
+
+    def test_budget(self):
+        with self.settings(METRICS={'BUDGETS': {'book-list': {'queries': 0}}}):
+            with self.assertLogs('finder.metrics', 'WARNING') as logs:
+                self.assertEqual(self.client.get(path='/book/list/').status_code, 200)
+        self.assertIn('book-list exceeded its budget: 4 queries > 0', logs.output[0])
+        with self.settings(METRICS={'BUDGETS': {'book-list': {'queries': 0}}, 'STRICT': True}):
+            with self.assertRaises(metrics.BudgetExceeded):
+                self.client.get(path='/book/list/')
+            self.client.get(path='/book/{}/'.format(models.Book.objects.first().id))
+
+
+class AsyncRequestMetricsTest(TestCase):
+    def test_queries_of_async_request_are_counted(self):
+        async def get_response(request):
+            # the query runs in a thread, which gets the metrics with the copied context
+            await sync_to_async(models.Book.objects.count)()
+            return HttpResponse()
+
+        middleware = metrics.RequestMetricsMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertTrue(asyncio.iscoroutinefunction(middleware.process_template_response))
+        with self.settings(METRICS={'HEADERS': True}):
+            response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertEqual(response['X-Query-Count'], '1')
+
+
+class GoogleBooksTimingTest(GoogleBooksStubMixin, TestCase):
+    def test_upstream_time(self):
+        with self.settings(GOOGLE_BOOKS=self.client_options, METRICS={'HEADERS': True}):
+            response = self.client.get(path='/gbooks/', data={'title': 'hobbit'})
+        self.assertIn('gbooks;dur=', response['Server-Timing'])
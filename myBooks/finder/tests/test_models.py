@@ -1,6 +1,7 @@
 from django.test import RequestFactory, TestCase
 from django.contrib.auth.models import User, AnonymousUser
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError
 from ..models import Book, Author, Category, Publisher, Profile, Vote
 
 
@@ -232,6 +233,11 @@ class VoteCRUDTest(TestCase):
         self.assertEqual(vote.profile, self.profile)
         self.assertEqual(vote.book, self.book1)
 
+    def test_vote_is_unique_per_profile_and_book(self):
+        Vote.objects.create(profile=self.profile, book=self.book1, value=7)
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(profile=self.profile, book=self.book1, value=3)
+
     def test_vote_retrieving(self):
         vote = Vote.objects.create(profile=self.profile, book=self.book1, value=7.5)
         vote_id = vote.id
@@ -0,0 +1,98 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from .. import models
+from ..pagination import KeysetPaginator, InvalidCursor, decode_cursor, encode_cursor, get_ordering
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self) -> None:
+        for title in ['Dune', 'Hobbit', 'Dune', 'Emma', 'Dune', 'Ulysses', 'Beloved']:
+            models.Book.objects.create(title=title)
+        self.expected = list(models.Book.objects.order_by('title', 'id'))
+
+    def walk(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        return pages
+
+    def test_ordering_gets_unique_tie_breaker(self):
+        self.assertEqual(get_ordering(models.Book.objects.order_by('title')), ['title', 'id'])
+        self.assertEqual(get_ordering(models.Book.objects.order_by('-vote_average')), ['-vote_average', '-id'])
+        self.assertEqual(get_ordering(models.Author.objects.order_by('name')), ['name'])
+        self.assertEqual(get_ordering(models.Book.objects.all()), ['id'])
+
+    def test_walk_forward_visits_every_row_once(self):
+        pages = self.walk(KeysetPaginator(models.Book.objects.order_by('title'), 2))
+        self.assertEqual([book for page in pages for book in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[1].has_previous())
+
+    def test_walk_backward(self):
+        paginator = KeysetPaginator(models.Book.objects.order_by('title'), 2)
+        pages = self.walk(paginator)
+        previous = paginator.page(before=pages[2].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        self.assertTrue(previous.has_next())
+        first = paginator.page(before=previous.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_descending_ordering(self):
+        pages = self.walk(KeysetPaginator(models.Book.objects.order_by('-title'), 3))
+        self.assertEqual([book for page in pages for book in page], list(models.Book.objects.order_by('-title', '-id')))
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(models.Book.objects.order_by('title'), 2)
+        with self.assertRaises(InvalidCursor):
+            paginator.page(after='not a cursor')
+        with self.assertRaises(InvalidCursor):
+            paginator.page(after=encode_cursor(['Dune']))
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(['Dune', 3])), ['Dune', 3])
+
+
+class KeysetPaginationViewsTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        models.Profile.objects.create(name=self.user.username, user=self.user)
+        for i in range(25):
+            models.Book.objects.create(title='Book {:02d}'.format(i))
+            models.Author.objects.create(name='Author {:02d}'.format(i))
+
+    def test_book_list_view_pages(self):
+        response = self.client.get(path='/book/list/')
+        self.assertEqual(len(response.context['object_list']), 10)
+        self.assertTrue(response.context['is_paginated'])
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, 'after={}'.format(cursor))
+        response = self.client.get(path='/book/list/', data={'after': cursor})
+        self.assertEqual(response.context['object_list'][0].title, 'Book 10')
+
+    def test_author_list_view_pages(self):
+        response = self.client.get(path='/author/list/', data={'name': 'author'})
+        cursor = response.context['page_obj'].next_cursor
+        self.assertEqual(response.context['q'], 'name=author')
+        response = self.client.get(path='/author/list/', data={'name': 'author', 'after': cursor})
+        self.assertEqual(response.context['object_list'][0].name, 'Author 10')
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(path='/book/list/', data={'after': '!!'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_pages(self):
+        response = self.client.get(path='/api/books/', data={'page_size': 20})
+        self.assertEqual(len(response.json()['results']), 20)
+        self.assertIsNone(response.json()['previous'])
+        response = self.client.get(path=response.json()['next'])
+        self.assertEqual([book['title'] for book in response.json()['results']],
+                         ['Book {:02d}'.format(i) for i in range(20, 25)])
+        self.assertIsNone(response.json()['next'])
+        self.assertIsNotNone(response.json()['previous'])
+
+    def test_api_invalid_cursor(self):
+        response = self.client.get(path='/api/authors/', data={'after': '!!'})
+        self.assertEqual(response.status_code, 404)
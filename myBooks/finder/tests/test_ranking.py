@@ -0,0 +1,77 @@
+import io
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import models
+from .. import ranking
+
+
+class RankingTest(TestCase):
+    def setUp(self) -> None:
+        self.profiles = []
+        for i in range(5):
+            user = get_user_model().objects.create_user(username='user{}'.format(i), password='123secret')
+            self.profiles.append(models.Profile.objects.create(name=user.username, user=user))
+        self.category = models.Category.objects.create(name='fantasy')
+        self.books = {title: models.Book.objects.create(title=title) for title in ['Dune', 'Hobbit', 'Emma', 'Ulysses']}
+        self.books['Hobbit'].categories.add(self.category)
+        self.books['Emma'].categories.add(self.category)
+
+    def vote(self, title, values):
+        for profile, value in zip(self.profiles, values):
+            models.Vote.objects.create(profile=profile, book=self.books[title], value=value)
+
+    def positions(self, category=None):
+        return [rank.book.title for rank in ranking.get_top(category)]
+
+    def test_bayesian_scores(self):
+        scores = ranking.bayesian_scores([1, 4], [10, 32], [float('nan'), 4.0],
+                                         {'PRIOR_VOTES': 5, 'GOOGLE_WEIGHT': 0.5})
+        mean = 42 / 5
+        self.assertAlmostEqual(scores[0], (5 * mean + 10) / 6)
+        self.assertAlmostEqual(scores[1], (5 * (0.5 * 8 + 0.5 * mean) + 32) / 9)
+
+    def test_few_votes_do_not_beat_many(self):
+        self.vote('Dune', [10])
+        self.vote('Hobbit', [9, 9, 9, 9, 9])
+        self.vote('Emma', [3, 4])
+        self.books['Ulysses'].g_rank = 4
+        self.books['Ulysses'].save()
+        self.assertEqual(ranking.refresh(), {'created': 6, 'updated': 0, 'deleted': 0})
+        self.assertEqual(self.positions(), ['Hobbit', 'Dune', 'Ulysses', 'Emma'])
+        self.assertEqual(self.positions(self.category.id), ['Hobbit', 'Emma'])
+        self.assertEqual([rank.position for rank in ranking.get_top(self.category.id)], [1, 2])
+        self.assertEqual([rank.book.title for rank in ranking.get_top(order='title')],
+                         ['Dune', 'Emma', 'Hobbit', 'Ulysses'])
+
+    def test_refresh_writes_changes_only(self):
+        self.vote('Dune', [8])
+        self.vote('Hobbit', [6])
+        ranking.refresh()
+        self.assertEqual(ranking.refresh(), {'created': 0, 'updated': 0, 'deleted': 0})
+        models.Vote.objects.filter(book=self.books['Dune']).delete()
+        self.vote('Emma', [7])
+        self.assertEqual(ranking.refresh(), {'created': 2, 'updated': 2, 'deleted': 1})
+        self.assertEqual(self.positions(), ['Emma', 'Hobbit'])
+        self.assertEqual(self.positions(self.category.id), ['Emma', 'Hobbit'])
+
+    def test_views(self):
+        self.vote('Hobbit', [9, 8])
+        self.vote('Emma', [5])
+        out = io.StringIO()
+        call_command('rebuild_rankings', stdout=out)
+        self.assertIn('4 created', out.getvalue())
+
+        response = self.client.get(path='/book/top/', data={'category': self.category.id, 'order': 'votes'})
+        self.assertEqual([rank.book.title for rank in response.context['ranks']], ['Hobbit', 'Emma'])
+        self.assertContains(response, 'Top books: fantasy')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path='/api/books/top/', data={'limit': 1})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.json()[0]['title'], 'Hobbit')
+        self.assertEqual((response.json()[0]['position'], response.json()[0]['vote_count']), (1, 2))
+        self.assertEqual(self.client.get(path='/api/books/top/', data={'category': 'x'}).status_code, 400)
@@ -0,0 +1,100 @@
+import io
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import caching
+from .. import models
+from .. import recommendations
+from .. import similarity
+
+
+class RecommendationsTest(TestCase):
+    def setUp(self) -> None:
+        caching.get_cache().clear()
+        self.profiles = []
+        for name in ['dummy', 'friend', 'other', 'stranger']:
+            user = get_user_model().objects.create_user(username=name, password='123secret')
+            self.profiles.append(models.Profile.objects.create(name=name, user=user))
+        self.profile, self.friend, self.other, self.stranger = self.profiles
+        self.profile.friends.add(self.friend, self.other)
+        self.books = {title: models.Book.objects.create(title=title)
+                      for title in ['Dune', 'Dune Messiah', 'Hobbit', 'Emma', 'Ulysses']}
+
+    def vote(self, profile, title, value):
+        models.Vote.objects.create(profile=profile, book=self.books[title], value=value)
+
+    def titles(self, profile):
+        return [book.title for book, score in recommendations.get_recommended_books(profile.pk)]
+
+    def test_friends_votes_and_books(self):
+        self.vote(self.friend, 'Hobbit', 10)
+        self.vote(self.other, 'Hobbit', 8)
+        self.vote(self.friend, 'Emma', 2)
+        self.vote(self.stranger, 'Ulysses', 10)
+        self.other.books.add(self.books['Dune'])
+        self.profile.books.add(self.books['Dune Messiah'])
+        self.friend.books.add(self.books['Dune Messiah'])
+        self.assertEqual(self.titles(self.profile), ['Hobbit', 'Dune'])
+        self.assertEqual(self.titles(self.stranger), [])
+
+    def test_similar_books(self):
+        for profile, values in zip([self.friend, self.other, self.stranger], [[9, 8, 3], [10, 9, 2], [2, 3, 9]]):
+            for title, value in zip(['Dune', 'Dune Messiah', 'Emma'], values):
+                self.vote(profile, title, value)
+        self.profile.friends.clear()
+        similarity.rebuild()
+        self.vote(self.profile, 'Dune', 9)
+        self.assertEqual(self.titles(self.profile), ['Dune Messiah'])
+
+    def test_batch_matches_single_profile(self):
+        self.vote(self.friend, 'Hobbit', 10)
+        self.vote(self.profile, 'Emma', 7)
+        self.stranger.friends.add(self.friend)
+        batch = recommendations.score_profiles([profile.pk for profile in self.profiles])
+        for profile in self.profiles:
+            self.assertEqual(batch[profile.pk], recommendations.score_profiles([profile.pk])[profile.pk])
+
+    def test_cache_and_invalidation(self):
+        self.vote(self.friend, 'Hobbit', 10)
+        self.assertEqual(self.titles(self.profile), ['Hobbit'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.titles(self.profile), ['Hobbit'])
+        self.assertEqual(len(queries), 1)
+
+        self.vote(self.other, 'Emma', 9)
+        self.assertEqual(self.titles(self.profile), ['Hobbit', 'Emma'])
+        self.vote(self.profile, 'Emma', 4)
+        self.assertEqual(self.titles(self.profile), ['Hobbit'])
+        self.profile.books.add(self.books['Hobbit'])
+        self.assertEqual(self.titles(self.profile), [])
+        self.books['Hobbit'].profile_set.clear()
+        self.assertEqual(self.titles(self.profile), ['Hobbit'])
+        self.profile.friends.remove(self.friend)
+        self.assertEqual(self.titles(self.profile), [])
+        self.stranger.friends.add(self.friend)
+        self.assertEqual(self.titles(self.stranger), ['Hobbit'])
+
+    def test_warm_command(self):
+        self.vote(self.friend, 'Hobbit', 10)
+        out = io.StringIO()
+        call_command('warm_recommendations', stdout=out)
+        self.assertIn('Cached recommendations of 4 profiles.', out.getvalue())
+        self.assertEqual(caching.get_cache().get(recommendations.cache_key(self.profile.pk)),
+                         [(self.books['Hobbit'].id, 1.0 / 2 * (10 - 5.5) / 4.5)])
+
+    def test_profile_page_and_api(self):
+        self.vote(self.friend, 'Hobbit', 10)
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.get(path='/profile/{}/'.format(self.profile.pk))
+        self.assertContains(response, 'Recommended:')
+        self.assertContains(response, 'href="/book/{}/"'.format(self.books['Hobbit'].id))
+        self.assertNotContains(self.client.get(path='/profile/{}/'.format(self.friend.pk)), 'Recommended:')
+
+        response = self.client.get(path='/api/profiles/{}/recommendations/'.format(self.profile.pk))
+        self.assertEqual([book['title'] for book in response.json()], ['Hobbit'])
+        response = self.client.get(path='/api/profiles/{}/recommendations/'.format(self.friend.pk))
+        self.assertEqual(response.status_code, 403)
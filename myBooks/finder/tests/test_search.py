@@ -0,0 +1,101 @@
+from io import StringIO
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from .. import models
+from .. import search
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self) -> None:
+        self.author = models.Author.objects.create(name='Frank Herbert')
+        self.category = models.Category.objects.create(name='science fiction')
+        self.publisher = models.Publisher.objects.create(name='Chilton Books')
+        self.dune = models.Book.objects.create(title='Dune', isbn='9780441013593', publisher=self.publisher)
+        self.dune.authors.add(self.author)
+        self.dune.categories.add(self.category)
+        self.children = models.Book.objects.create(title='Children of Dune')
+        self.children.authors.add(self.author)
+        self.hobbit = models.Book.objects.create(title='Hobbit')
+
+    def search(self, **params):
+        return list(search.search_books(models.Book.objects.all(), params))
+
+    def test_index_is_available(self):
+        self.assertTrue(search.is_available())
+
+    def test_prefix_match_on_title(self):
+        self.assertEqual(self.search(title='hob'), [self.hobbit])
+
+    def test_results_are_ranked(self):
+        longer = models.Book.objects.create(title='Chapterhouse Dune Collector Edition')
+        shorter = models.Book.objects.create(title='Chapterhouse Dune')
+        self.assertEqual(self.search(title='chapterhouse'), [shorter, longer])
+
+    def test_match_on_related_names(self):
+        self.assertCountEqual(self.search(authors='herb'), [self.dune, self.children])
+        self.assertEqual(self.search(categories='science'), [self.dune])
+        self.assertEqual(self.search(publisher='chilton'), [self.dune])
+
+    def test_match_on_isbn(self):
+        self.assertEqual(self.search(isbn='978-0441'), [self.dune])
+
+    def test_year_filter(self):
+        models.Book.objects.filter(id=self.dune.id).update(year=1965)
+        models.Book.objects.filter(id=self.children.id).update(year=1976)
+        self.assertEqual(self.search(year='1965'), [self.dune])
+        self.assertEqual(self.search(year='19'), [self.dune, self.children])
+
+    def test_fields_are_combined(self):
+        self.assertEqual(self.search(title='children', authors='frank'), [self.children])
+        self.assertEqual(self.search(title='hobbit', authors='frank'), [])
+
+    def test_index_follows_renames(self):
+        self.author.name = 'Brian Herbert'
+        self.author.save()
+        self.assertCountEqual(self.search(authors='brian'), [self.dune, self.children])
+        self.assertEqual(self.search(authors='frank'), [])
+
+    def test_index_follows_m2m_changes(self):
+        self.hobbit.authors.add(self.author)
+        self.assertIn(self.hobbit, self.search(authors='frank'))
+        self.author.book_set.clear()
+        self.assertEqual(self.search(authors='frank'), [])
+
+    def test_deferred_indexing(self):
+        with search.deferred_indexing():
+            self.hobbit.authors.add(self.author)
+            self.assertNotIn(self.hobbit, self.search(authors='frank'))
+        self.assertIn(self.hobbit, self.search(authors='frank'))
+
+    def test_index_follows_deletes(self):
+        self.publisher.delete()
+        self.assertEqual(self.search(publisher='chilton'), [])
+        self.dune.delete()
+        self.assertEqual(self.search(title='dune'), [self.children])
+
+    def test_rebuild_command(self):
+        search.remove_books([self.dune.id, self.children.id, self.hobbit.id])
+        self.assertEqual(self.search(title='dune'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertCountEqual(self.search(title='dune'), [self.dune, self.children])
+
+
+class SearchViewsTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        models.Profile.objects.create(name=self.user.username, user=self.user)
+        self.book1 = models.Book.objects.create(title='Hobbit', added_by=self.user.profile)
+        self.book2 = models.Book.objects.create(title='Dune', added_by=self.user.profile)
+
+    def test_book_list_view_search(self):
+        response = self.client.get(path='/book/list/', data={'title': 'hob', 'authors': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['object_list']), [self.book1])
+
+    def test_book_api_search(self):
+        response = self.client.get(path='/api/books/', data={'title': 'dun'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['title'] for book in response.json()['results']], ['Dune'])
@@ -0,0 +1,114 @@
+import io
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import caching
+from .. import models
+from .. import similarity
+
+
+class SimilarityTest(TestCase):
+    def setUp(self) -> None:
+        caching.get_cache().clear()
+        self.profiles = []
+        for i in range(4):
+            user = get_user_model().objects.create_user(username='user{}'.format(i), password='123secret')
+            self.profiles.append(models.Profile.objects.create(name=user.username, user=user))
+        self.books = [models.Book.objects.create(title=title) for title in ['Dune', 'Dune Messiah', 'Hobbit', 'Emma']]
+        # fans of Dune like its sequel and dislike Emma, the others the other way round
+        for profile, values in zip(self.profiles, [[9, 8, 5, 2], [10, 9, 6, 3], [3, 2, 7, 9], [2, 3, 6, 10]]):
+            for book, value in zip(self.books, values):
+                models.Vote.objects.create(profile=profile, book=book, value=value)
+
+    def similar_titles(self, book):
+        return [item.similar.title for item in similarity.get_similar(book.id)]
+
+    def test_adjusted_cosine(self):
+        ratings = similarity.Ratings.load()
+        dense = ratings.matrix.toarray()
+        norms = np.linalg.norm(dense, axis=0)
+        expected = dense.T @ dense / np.outer(norms, norms)
+        for book_id, similar in ratings.top_similar(ratings.columns([self.books[0].id])):
+            for similar_id, score in similar:
+                self.assertAlmostEqual(score, expected[0, ratings.columns([similar_id])[0]])
+
+    def test_rebuild(self):
+        self.assertTrue(models.Book.objects.filter(similarity_stale=True).exists())
+        self.assertEqual(similarity.rebuild(), {'books': 4, 'pairs': 4})
+        self.assertEqual(self.similar_titles(self.books[0]), ['Dune Messiah'])
+        self.assertEqual(self.similar_titles(self.books[3]), ['Hobbit'])
+        self.assertFalse(models.Book.objects.filter(similarity_stale=True).exists())
+        self.assertEqual(similarity.rebuild(), {'books': 0, 'pairs': 0})
+
+    def test_failed_rebuild_keeps_unprocessed_books_stale(self):
+        top_similar = similarity.Ratings.top_similar
+        chunks = []
+
+        def fail_second_chunk(ratings, *args, **kwargs):
+            chunks.append(args)
+            if len(chunks) > 1:
+                raise MemoryError
+            return top_similar(ratings, *args, **kwargs)
+
+        with mock.patch.object(similarity.Ratings, 'top_similar', fail_second_chunk):
+            with self.assertRaises(MemoryError):
+                similarity.rebuild(chunk_size=2)
+        self.assertEqual(list(models.Book.objects.filter(similarity_stale=True).order_by('id')), self.books[2:])
+        self.assertEqual(similarity.rebuild(), {'books': 4, 'pairs': 4})
+        self.assertFalse(models.Book.objects.filter(similarity_stale=True).exists())
+
+    def test_books_voted_on_during_rebuild_stay_stale(self):
+        load = similarity.Ratings.load
+
+        def vote_after_load(*args, **kwargs):
+            ratings = load(*args, **kwargs)
+            models.Vote.objects.filter(profile=self.profiles[0], book=self.books[3]).update(value=1)
+            models.Vote.objects.get(profile=self.profiles[1], book=self.books[3]).delete()
+            return ratings
+
+        with mock.patch.object(similarity.Ratings, 'load', vote_after_load):
+            similarity.rebuild()
+        self.assertEqual(list(models.Book.objects.filter(similarity_stale=True)), [self.books[3]])
+
+    def test_incremental_rebuild(self):
+        similarity.rebuild()
+        book = models.Book.objects.create(title='Children of Dune')
+        other = models.Book.objects.create(title='Unrelated')
+        for profile, value in zip(self.profiles[:2], [10, 9]):
+            models.Vote.objects.create(profile=profile, book=book, value=value)
+        models.Vote.objects.create(profile=self.profiles[2], book=book, value=1)
+        user = get_user_model().objects.create_user(username='loner', password='123secret')
+        models.Vote.objects.create(profile=models.Profile.objects.create(name='loner', user=user), book=other, value=5)
+        stats = similarity.rebuild()
+        self.assertEqual(stats['books'], 6)
+        self.assertEqual(set(self.similar_titles(book)[:2]), {'Dune', 'Dune Messiah'})
+        self.assertIn('Children of Dune', self.similar_titles(self.books[0]))
+        self.assertEqual(self.similar_titles(other), [])
+
+    def test_full_rebuild_command(self):
+        similarity.rebuild()
+        models.Vote.objects.filter(book=self.books[3]).delete()
+        models.Book.objects.update(similarity_stale=False)
+        out = io.StringIO()
+        call_command('rebuild_similarities', '--full', '--top-k', '1', stdout=out)
+        self.assertIn('Updated similar books of 3 books', out.getvalue())
+        self.assertFalse(models.BookSimilarity.objects.filter(book=self.books[3]).exists())
+        self.assertEqual(models.BookSimilarity.objects.filter(book=self.books[0]).count(), 1)
+
+    def test_detail_page_and_api(self):
+        similarity.rebuild()
+        response = self.client.get(path='/book/{}/'.format(self.books[0].id))
+        self.assertContains(response, 'Readers also liked:')
+        self.assertContains(response, 'href="/book/{}/"'.format(self.books[1].id))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path='/api/books/{}/similar/'.format(self.books[0].id))
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([item['title'] for item in response.json()], ['Dune Messiah'])
+        self.assertEqual(self.client.get(path='/api/books/0/similar/').status_code, 404)
@@ -1,13 +1,21 @@
-from django.test import RequestFactory, TestCase
+from django.conf import settings
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth.models import User, AnonymousUser
 from django.contrib.auth import get_user_model
 from django.contrib.auth import authenticate
 from django.contrib.auth import logout, login
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
 
 from .. import views
 from .. import models
 from .. import forms
+from .. import search
+from .. import caching
+from .. import ranking
+from .. import library
 
 
 class UserLoginViewTest(TestCase):
@@ -215,6 +223,23 @@ class BookCreateViewTest(TestCase):
         self.assertEqual(book.title, 'Hobbit')
 
 
+    def count_create_queries(self, title, authors, categories):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(path='/book/create/', data={'title': title, 'authors': authors,
+                                                                    'categories': categories})
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_creating_book_query_count_does_not_grow_with_authors(self):
+        models.Author.objects.create(name='A00')
+        self.client.login(username='dummy', password='123secret')
+        search.is_available()
+        few = self.count_create_queries('Dune', 'B00', 'sci-fi')
+        many = self.count_create_queries('Hobbit', ','.join('A{:02}'.format(i) for i in range(20)), 'fantasy, tale')
+        self.assertEqual(many, few)
+        self.assertEqual(models.Book.objects.get(title='Hobbit').authors.count(), 20)
+        self.assertEqual(models.Author.objects.count(), 21)
+
 class BookUpdateViewTest(TestCase):
     def setUp(self) -> None:
         self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
@@ -247,6 +272,20 @@ class BookUpdateViewTest(TestCase):
         self.assertTrue(book.categories.get(name='sci-fi'))
         self.assertEqual(book.publisher.name, 'Another Pub Inc.')
 
+    def test_update_book_replaces_relations(self):
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.post(path='/book/{}/update/'.format(self.book.id),
+                                    data={'title': 'Hobbit', 'authors': 'Frank Herbert, J.R.R. Tolkien',
+                                          'categories': '', 'publisher': ''})
+        self.assertEqual(response.status_code, 302)
+        self.assertCountEqual(self.book.authors.values_list('name', flat=True), ['Frank Herbert', 'J.R.R. Tolkien'])
+        self.client.post(path='/book/{}/update/'.format(self.book.id),
+                         data={'title': 'Hobbit', 'authors': 'Frank Herbert'})
+        self.assertEqual(list(self.book.authors.values_list('name', flat=True)), ['Frank Herbert'])
+        self.assertFalse(self.book.categories.exists())
+        self.book.refresh_from_db()
+        self.assertIsNone(self.book.publisher)
+
     def test_update_book_unauthenticated_user(self):
         self.client.logout()
         authors = models.Author.objects.create(name='Frank Herbert')
@@ -337,6 +376,44 @@ class BookListViewTest(TestCase):
         self.assertIsInstance(response.context['form'], forms.BookSearchForm)
 
 
+class BookListViewQueriesTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        models.Profile.objects.create(name=self.user.username, user=self.user)
+        voter = get_user_model().objects.create_user(username='voter', password='123secret')
+        voter_profile = models.Profile.objects.create(name=voter.username, user=voter)
+        publisher = models.Publisher.objects.create(name='Pub inc.')
+        for i in range(10):
+            book = models.Book.objects.create(title='Book {}'.format(i), publisher=publisher)
+            book.authors.add(models.Author.objects.create(name='Author {}'.format(i)))
+            book.categories.add(models.Category.objects.create(name='Category {}'.format(i)))
+            models.Vote.objects.create(profile=self.user.profile, book=book, value=5)
+            models.Vote.objects.create(profile=voter_profile, book=book, value=7)
+            if i % 2:
+                self.user.profile.books.add(book)
+
+    def count_queries(self, page_size):
+        with mock.patch.object(views.BookListView, 'paginate_by', page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path='/book/list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['object_list']), page_size)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_page_size_anonymous(self):
+        self.assertEqual(self.count_queries(2), self.count_queries(10))
+
+    def test_query_count_does_not_grow_with_page_size_authenticated(self):
+        self.client.login(username='dummy', password='123secret')
+        self.assertEqual(self.count_queries(2), self.count_queries(10))
+
+    def test_owned_ids_in_context(self):
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.get(path='/book/list/')
+        owned = set(self.user.profile.books.values_list('id', flat=True))
+        self.assertEqual(response.context['library'].owned, owned)
+
+
 class VoteCreateUpdateViewTest(TestCase):
     def setUp(self) -> None:
         self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
@@ -768,4 +845,116 @@ class CategoryListViewTest(TestCase):
         response = self.client.get(path='/category/list/')
         self.assertEqual(response.status_code, 200)
         self.assertIn('form', response.context)
-        self.assertIsInstance(response.context['form'], forms.CategorySearchForm)
\ No newline at end of file
+        self.assertIsInstance(response.context['form'], forms.CategorySearchForm)
+
+class AutocompleteViewTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        models.Profile.objects.create(name=self.user.username, user=self.user)
+        for name in ['Tolkien', 'Tolstoy', 'tom Clancy', 'Terry Pratchett', 'Herbert']:
+            models.Author.objects.create(name=name)
+
+    def test_prefix_match_is_case_insensitive_and_sorted(self):
+        response = self.client.get(path='/autocomplete/author/', data={'q': 'TO'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], ['Tolkien', 'Tolstoy', 'tom Clancy'])
+        self.assertIsNone(response.json()['next'])
+
+    def test_results_are_capped_and_paginated(self):
+        response = self.client.get(path='/autocomplete/author/', data={'q': 't', 'limit': 2})
+        self.assertEqual(response.json()['results'], ['Terry Pratchett', 'Tolkien'])
+        response = self.client.get(path='/autocomplete/author/',
+                                   data={'q': 't', 'limit': 2, 'after': response.json()['next']})
+        self.assertEqual(response.json()['results'], ['Tolstoy', 'tom Clancy'])
+        response = self.client.get(path='/autocomplete/author/', data={'q': 't', 'limit': 1000})
+        self.assertEqual(len(response.json()['results']), 4)
+
+    def test_case_variants_are_not_skipped(self):
+        models.Author.objects.create(name='TOLKIEN')
+        pages, after = [], None
+        while True:
+            data = {'q': 'tol', 'limit': 1, **({'after': after} if after else {})}
+            response = self.client.get(path='/autocomplete/author/', data=data).json()
+            pages.append(response['results'])
+            after = response['next']
+            if after is None:
+                break
+        self.assertEqual(pages, [['TOLKIEN'], ['Tolkien'], ['Tolstoy']])
+        response = self.client.get(path='/autocomplete/author/', data={'q': 'tol', 'after': 'tolkien'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_non_ascii_prefix(self):
+        models.Author.objects.create(name='Żeromski')
+        for prefix in ['Że', 'ŻE', 'Żeromski']:
+            response = self.client.get(path='/autocomplete/author/', data={'q': prefix})
+            self.assertEqual(response.json()['results'], ['Żeromski'])
+        if connection.vendor != 'sqlite':
+            # lower() of SQLite folds ascii letters only
+            response = self.client.get(path='/autocomplete/author/', data={'q': 'że'})
+            self.assertEqual(response.json()['results'], ['Żeromski'])
+
+    def test_empty_prefix(self):
+        response = self.client.get(path='/autocomplete/author/', data={'q': ''})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_unknown_model(self):
+        response = self.client.get(path='/autocomplete/book/', data={'q': 'a'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_profiles_require_login(self):
+        response = self.client.get(path='/autocomplete/profile/', data={'q': 'dum'})
+        self.assertEqual(response.status_code, 403)
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.get(path='/autocomplete/profile/', data={'q': 'dum'})
+        self.assertEqual(response.json()['results'], ['dummy'])
+
+    def test_forms_do_not_embed_tables(self):
+        response = self.client.get(path='/book/list/')
+        self.assertNotContains(response, 'Tolstoy')
+        self.assertContains(response, 'data-autocomplete="/autocomplete/author/"')
+
+
+@override_settings(METRICS={**settings.METRICS, 'STRICT': True})
+class ViewQueryBudgetTest(TestCase):
+    def setUp(self) -> None:
+        caching.get_cache().clear()
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        profile = models.Profile.objects.create(name=self.user.username, user=self.user)
+        voter = get_user_model().objects.create_user(username='voter', password='123secret')
+        voter_profile = models.Profile.objects.create(name=voter.username, user=voter)
+        self.publisher = models.Publisher.objects.create(name='Pub inc.', added_by=profile)
+        self.author = models.Author.objects.create(name='Author', added_by=profile)
+        self.category = models.Category.objects.create(name='Category', added_by=profile)
+        for i in range(12):
+            book = models.Book.objects.create(title='Book {}'.format(i), publisher=self.publisher, added_by=profile)
+            book.authors.add(self.author, models.Author.objects.create(name='Author {}'.format(i)))
+            book.categories.add(self.category)
+            models.Vote.objects.create(profile=profile, book=book, value=5)
+            models.Vote.objects.create(profile=voter_profile, book=book, value=7)
+            if i % 2:
+                profile.books.add(book)
+        self.book = book
+        ranking.refresh()
+
+    def get_paths(self):
+        return ['/', '/book/list/', '/book/list/?title=book&authors=author', '/book/{}/'.format(self.book.id),
+                '/author/list/', '/author/{}/'.format(self.author.id), '/category/list/',
+                '/category/{}/'.format(self.category.id), '/publisher/list/',
+                '/publisher/{}/'.format(self.publisher.id), '/autocomplete/author/?q=au', '/api/books/',
+                '/api/books/?title=book', '/book/top/', '/book/top/?category={}'.format(self.category.id),
+                '/api/books/top/']
+
+    def test_anonymous_views_are_within_budget(self):
+        for path in self.get_paths():
+            self.assertEqual(self.client.get(path).status_code, 200)
+
+    def test_authenticated_views_are_within_budget(self):
+        self.client.login(username='dummy', password='123secret')
+        for path in self.get_paths():
+            self.assertEqual(self.client.get(path).status_code, 200)
+
+    def test_views_with_invalidated_library_are_within_budget(self):
+        self.client.login(username='dummy', password='123secret')
+        for path in self.get_paths():
+            library.invalidate(models.Profile.objects.filter(name='dummy').values_list('id', flat=True))
+            self.assertEqual(self.client.get(path).status_code, 200)
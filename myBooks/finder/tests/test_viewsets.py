@@ -0,0 +1,225 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import models
+from ..api import bulk
+from ..api.serializers import BookSerializer, BookReadSerializer
+
+
+class BookApiReadTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        self.profile = models.Profile.objects.create(name=self.user.username, user=self.user)
+        self.publisher = models.Publisher.objects.create(name='Chilton Books')
+        self.book = models.Book.objects.create(title='Dune', year=1965, isbn='9780441013593', g_rank=4.5,
+                                               description='Spice.', thumbnail='https://example.com/dune.jpg',
+                                               publisher=self.publisher, added_by=self.profile)
+        self.book.authors.add(models.Author.objects.create(name='Frank Herbert'))
+        self.book.categories.add(models.Category.objects.create(name='science fiction'))
+        models.Vote.objects.create(profile=self.profile, book=self.book, value=8)
+
+    def test_read_matches_write_serializer(self):
+        response = self.client.get(path='/api/books/{}/'.format(self.book.id))
+        self.assertEqual(response.status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual(response.json(), dict(BookSerializer(self.book).data))
+        self.assertEqual(response.json()['authors'], [{'name': 'Frank Herbert', 'id': str(self.book.authors.get().id)}])
+        self.assertEqual((response.json()['year'], response.json()['vote_average']), (1965, 8.0))
+
+    def test_list(self):
+        models.Book.objects.create(title='Anathem')
+        response = self.client.get(path='/api/books/')
+        self.assertEqual([book['title'] for book in response.json()['results']], ['Anathem', 'Dune'])
+        self.assertEqual(response.json()['results'][0]['publisher'], None)
+        self.assertEqual(response.json()['results'][1]['publisher'],
+                         {'name': 'Chilton Books', 'id': str(self.publisher.id)})
+
+    def test_missing_book(self):
+        self.assertEqual(self.client.get(path='/api/books/0/').status_code, 404)
+
+    def test_create_accepts_all_fields(self):
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.post(path='/api/books/', data={'title': 'Hobbit', 'year': 1937, 'isbn': '9780261102217'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(models.Book.objects.get(title='Hobbit').year, 1937)
+        self.assertEqual(response.json()['added_by'], str(self.profile.id))
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for i in range(30):
+            book = models.Book.objects.create(title='Book {}'.format(i), publisher=self.publisher)
+            book.authors.add(models.Author.objects.create(name='Author {}'.format(i)))
+        counts = []
+        for page_size in [5, 30]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path='/api/books/', data={'page_size': page_size})
+            self.assertEqual(len(response.json()['results']), page_size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class BookReadSerializerThroughputTest(TestCase):
+    def setUp(self) -> None:
+        publisher = models.Publisher.objects.create(name='Chilton Books')
+        authors = models.Author.objects.bulk_create([models.Author(name='Author {}'.format(i)) for i in range(100)])
+        categories = models.Category.objects.bulk_create([models.Category(name='Category {}'.format(i))
+                                                          for i in range(10)])
+        books = models.Book.objects.bulk_create([models.Book(title='Book {}'.format(i), year=1900 + i % 100,
+                                                             publisher=publisher) for i in range(10000)])
+        models.Book.authors.through.objects.bulk_create([
+            models.Book.authors.through(book_id=book.id, author_id=authors[i % 100].id)
+            for i, book in enumerate(books)])
+        models.Book.categories.through.objects.bulk_create([
+            models.Book.categories.through(book_id=book.id, category_id=categories[i % 10].id)
+            for i, book in enumerate(books)])
+
+    def measure(self, serialize, repeat=3):
+        # the best of a few runs keeps a busy machine from failing the comparison
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = serialize()
+            timings.append(time.perf_counter() - started)
+        return min(timings), data
+
+    def test_read_serializer_is_five_times_faster(self):
+        queryset = models.Book.objects.order_by('id')
+        nested_time, nested = self.measure(lambda: BookSerializer(
+            queryset.select_related('publisher').prefetch_related('authors', 'categories'), many=True).data)
+        read_time, read = self.measure(lambda: BookReadSerializer(
+            BookReadSerializer.get_values(queryset), many=True).data)
+        self.assertEqual(len(read), 10000)
+        self.assertEqual(read[0], dict(nested[0]))
+        self.assertGreaterEqual(nested_time / read_time, 5)
+
+
+class BulkApiTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='dummy', password='123secret')
+        self.profile = models.Profile.objects.create(name=self.user.username, user=self.user)
+        self.author = models.Author.objects.create(name='Frank Herbert')
+        self.client.login(username='dummy', password='123secret')
+
+    def send(self, method, path, data):
+        return getattr(self.client, method)(path=path, data=data, content_type='application/json')
+
+    def test_create_books(self):
+        items = [{'title': 'Book {}'.format(i), 'authors': [{'id': self.author.id}, {'name': 'Author {}'.format(i)}],
+                  'categories': [{'name': 'science fiction'}], 'publisher': {'name': 'Chilton Books'}}
+                 for i in range(20)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.send('post', '/api/books/bulk/', items)
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(len(queries), 30)
+        books = models.Book.objects.in_bulk([int(result['id']) for result in response.json()])
+        self.assertEqual([result['status'] for result in response.json()], ['created'] * 20)
+        self.assertEqual(sorted(books[int(response.json()[3]['id'])].authors.values_list('name', flat=True)),
+                         ['Author 3', 'Frank Herbert'])
+        self.assertEqual(models.Category.objects.count(), 1)
+        self.assertEqual({book.publisher.name for book in books.values()}, {'Chilton Books'})
+        self.assertEqual(len(self.client.get(path='/api/books/', data={'authors': 'author 7'}).json()['results']), 1)
+
+    def test_batch_is_validated_as_a_whole(self):
+        response = self.send('post', '/api/books/bulk/', [{'title': 'Dune'}, {'year': 1965},
+                                                          {'title': 'Hobbit', 'authors': [{'id': 0}]}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn('title', response.json()[1])
+        self.assertFalse(models.Book.objects.exists())
+
+        response = self.send('post', '/api/books/bulk/', [{'title': 'Dune'},
+                                                          {'title': 'Hobbit', 'authors': [{'id': 0}]}])
+        self.assertEqual(response.json(), [{}, {'authors': ['Author 0 not found.']}])
+        self.assertFalse(models.Book.objects.exists())
+
+    def test_update_and_delete_books(self):
+        books = [models.Book.objects.create(title=title) for title in ['Dune', 'Hobbit']]
+        books[0].authors.add(self.author)
+        response = self.send('patch', '/api/books/bulk/', [
+            {'id': books[0].id, 'year': 1965, 'authors': [{'name': 'Brian Herbert'}]},
+            {'id': books[1].id, 'title': 'The Hobbit'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()], ['updated', 'updated'])
+        books[0].refresh_from_db()
+        self.assertEqual((books[0].title, books[0].year), ('Dune', 1965))
+        self.assertEqual(list(books[0].authors.values_list('name', flat=True)), ['Brian Herbert'])
+        self.assertEqual(models.Book.objects.get(id=books[1].id).title, 'The Hobbit')
+
+        self.assertEqual(self.send('patch', '/api/books/bulk/', [{'id': 0, 'title': 'Gone'}]).json(),
+                         [{'id': ['Not found.']}])
+        response = self.send('delete', '/api/books/bulk/', [books[0].id, {'id': books[1].id}])
+        self.assertEqual(response.json(), [{'id': str(books[0].id), 'status': 'deleted'},
+                                           {'id': str(books[1].id), 'status': 'deleted'}])
+        self.assertFalse(models.Book.objects.exists())
+
+    def test_named(self):
+        response = self.send('post', '/api/authors/bulk/', [{'name': 'Frank Herbert'}, {'name': 'Tolkien'},
+                                                            {'name': 'Tolkien'}])
+        self.assertEqual(response.json(), [{'name': ['Author with this name already exists.']},
+                                           {'name': ['Duplicated in this request.']},
+                                           {'name': ['Duplicated in this request.']}])
+        response = self.send('post', '/api/publishers/bulk/', [{'name': 'Chilton Books'}, {'name': 'Allen & Unwin'}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(models.Publisher.objects.get(id=response.json()[0]['id']).added_by, self.profile)
+
+        book = models.Book.objects.create(title='Dune')
+        book.authors.add(self.author)
+        response = self.send('patch', '/api/authors/bulk/', [{'id': self.author.id, 'name': 'F. Herbert'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.client.get(path='/api/books/', data={'authors': 'f. herbert'}).json()['results']), 1)
+
+    def test_create_without_returning_bulk_inserts(self):
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            response = self.send('post', '/api/books/bulk/', [{'title': 'Dune', 'authors': [{'id': self.author.id}]},
+                                                              {'title': 'Hobbit'}])
+        self.assertEqual(response.status_code, 201)
+        books = models.Book.objects.in_bulk([int(result['id']) for result in response.json()])
+        self.assertEqual(sorted(book.title for book in books.values()), ['Dune', 'Hobbit'])
+        self.assertEqual(list(models.Book.objects.get(title='Dune').authors.all()), [self.author])
+
+    def test_concurrent_duplicate_is_reported_per_item(self):
+        original = bulk.NamedBulkHandler.validate_create
+        calls = []
+
+        def validate_before_concurrent_write(handler, validated, errors):
+            # the first validation runs before a concurrent request commits an author of the same name
+            if calls:
+                original(handler, validated, errors)
+            calls.append(validated)
+
+        with mock.patch.object(bulk.NamedBulkHandler, 'validate_create', validate_before_concurrent_write):
+            response = self.send('post', '/api/authors/bulk/', [{'name': 'Tolkien'}, {'name': 'Frank Herbert'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), [{}, {'name': ['Author with this name already exists.']}])
+        self.assertFalse(models.Author.objects.filter(name='Tolkien').exists())
+
+    def test_votes(self):
+        books = [models.Book.objects.create(title=title) for title in ['Dune', 'Hobbit']]
+        response = self.send('post', '/api/votes/bulk/', [{'book_id': books[0].id, 'value': 8},
+                                                          {'book_id': books[1].id, 'value': 4}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(models.Book.objects.get(id=books[0].id).vote_average, 8)
+        response = self.send('post', '/api/votes/bulk/', [{'book_id': books[0].id, 'value': 2}])
+        self.assertEqual(response.json(), [{'book_id': ['You have already voted on this book.']}])
+
+        vote = models.Vote.objects.get(book=books[1])
+        self.send('patch', '/api/votes/bulk/', [{'id': vote.id, 'value': 10}])
+        self.assertEqual(models.Book.objects.get(id=books[1].id).vote_average, 10)
+        self.send('delete', '/api/votes/bulk/', [vote.id])
+        self.assertEqual(models.Book.objects.get(id=books[1].id).vote_count, 0)
+
+        other = get_user_model().objects.create_user(username='other', password='123secret')
+        models.Profile.objects.create(name=other.username, user=other)
+        self.client.login(username='other', password='123secret')
+        vote = models.Vote.objects.get()
+        self.assertEqual(self.send('delete', '/api/votes/bulk/', [vote.id]).json(), [{'id': ['Not found.']}])
+
+    def test_requires_authentication_and_list(self):
+        self.assertEqual(self.send('post', '/api/books/bulk/', {'title': 'Dune'}).status_code, 400)
+        self.client.logout()
+        self.assertIn(self.send('post', '/api/books/bulk/', [{'title': 'Dune'}]).status_code, [401, 403])
@@ -0,0 +1,123 @@
+from datetime import timedelta
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import gbooks
+from .. import models
+from .. import routers
+from .. import volumes
+from .test_gbooks import GoogleBooksStubMixin
+
+
+class VolumeStoreTest(GoogleBooksStubMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.store = volumes.VolumeStore()
+
+    def get_client(self, **options):
+        # a new client starts with an empty memory cache, only the database is shared
+        return gbooks.GoogleBooksClient(store=self.store, **dict(self.client_options, **options))
+
+    def test_volume_is_served_from_the_database(self):
+        self.assertEqual(self.get_client().volume('hobbit1')['id'], 'hobbit1')
+        details = self.get_client().volume_details('hobbit1')
+        self.assertEqual(details['isbn'], '9780261102217')
+        self.assertEqual(details['gbooks_rank'], 4.5)
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(self.store.get_stats()['fetched'], 1)
+        self.assertEqual(self.store.get_stats()['stored'], 1)
+
+    def test_search_is_served_from_the_database(self):
+        self.get_client().search(title='hobbit')
+        client = self.get_client()
+        self.assertEqual([item['id'] for item in client.search(title='Hobbit ')], ['hobbit1'])
+        self.assertEqual(client.search_details(title='hobbit')[0]['title'], 'The Hobbit')
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(self.store.get_stats()['memory'], 1)
+
+    def test_search_result_does_not_replace_the_volume(self):
+        self.get_client().volume('hobbit1')
+        self.stub.server.volumes['hobbit1'] = {'id': 'hobbit1', 'volumeInfo': {'title': 'Short'}}
+        self.get_client().search(title='hobbit')
+        self.assertEqual(self.get_client().volume_details('hobbit1')['title'], 'The Hobbit')
+        self.assertTrue(models.GoogleBooksVolume.objects.get(gbooks_id='hobbit1').complete)
+
+    def test_volume_found_by_a_search_is_fetched_in_full(self):
+        self.get_client().search(title='hobbit')
+        self.assertFalse(models.GoogleBooksVolume.objects.get(gbooks_id='hobbit1').complete)
+        self.get_client().volume('hobbit1')
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertTrue(models.GoogleBooksVolume.objects.get(gbooks_id='hobbit1').complete)
+
+    def test_expired_entry_is_revalidated(self):
+        self.stub.server.etag = '"v1"'
+        self.get_client().volume('hobbit1')
+        models.GoogleBooksVolume.objects.update(expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.get_client().volume('hobbit1')['id'], 'hobbit1')
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertEqual(self.store.get_stats()['revalidated'], 1)
+        self.assertGreater(models.GoogleBooksVolume.objects.get().expires, timezone.now())
+
+    def test_expired_entry_is_served_while_the_api_fails(self):
+        self.get_client().volume('hobbit1')
+        models.GoogleBooksVolume.objects.update(expires=timezone.now() - timedelta(seconds=1))
+        self.stub.server.status = 503
+        self.assertEqual(self.get_client().volume('hobbit1')['id'], 'hobbit1')
+        self.assertEqual(self.store.get_stats()['stale'], 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        now = timezone.now()
+        for number in range(4):
+            models.GoogleBooksVolume.objects.create(gbooks_id='v{}'.format(number), payload={}, details={},
+                                                    expires=now, accessed=now - timedelta(hours=number))
+        store = volumes.VolumeStore(MAX_VOLUMES=2)
+        self.assertEqual(store.evict(), 2)
+        self.assertEqual(sorted(models.GoogleBooksVolume.objects.values_list('gbooks_id', flat=True)), ['v0', 'v1'])
+
+    def test_reads_do_not_pin_the_request_to_the_primary(self):
+        self.get_client().volume('hobbit1')
+        models.GoogleBooksVolume.objects.update(accessed=timezone.now() - timedelta(days=1))
+        state = routers.RoutingState(use_replicas=True)
+        token = routers._current.set(state)
+        try:
+            self.assertEqual(self.store.safely(self.store.get, ('volume', 'hobbit1')).data['id'], 'hobbit1')
+            self.assertIsNone(self.store.safely(self.store.get, ('volume', 'missing')))
+        finally:
+            routers._current.reset(token)
+        self.assertEqual((state.use_replicas, state.wrote), (True, False))
+        self.assertLess(models.GoogleBooksVolume.objects.get().accessed, timezone.now() - timedelta(hours=1))
+        # the access time is saved with the next write
+        self.store.evict()
+        self.assertGreater(models.GoogleBooksVolume.objects.get().accessed, timezone.now() - timedelta(hours=1))
+
+    def test_search_with_evicted_volumes_is_fetched_again(self):
+        self.get_client().search(title='hobbit')
+        models.GoogleBooksVolume.objects.all().delete()
+        self.get_client().search(title='hobbit')
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_async_client_shares_the_store(self):
+        self.get_client().volume('hobbit1')
+        client = gbooks.AsyncGoogleBooksClient(store=self.store, **self.client_options)
+        self.assertEqual(async_to_sync(client.volume_details)('hobbit1')['gbooks_id'], 'hobbit1')
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_hit_ratio(self):
+        self.assertIsNone(self.store.get_stats()['hit_ratio'])
+        client = self.get_client()
+        client.volume('hobbit1')
+        client.volume('hobbit1')
+        self.get_client().volume('hobbit1')
+        self.get_client().volume('missing')
+        self.assertEqual(self.store.get_stats()['hit_ratio'], 0.5)
+
+    def test_command(self):
+        self.get_client().volume('hobbit1')
+        out = StringIO()
+        call_command('gbooks_store', '--clear', stdout=out)
+        self.assertIn('Deleted 1 entries.', out.getvalue())
+        self.assertFalse(models.GoogleBooksVolume.objects.exists())
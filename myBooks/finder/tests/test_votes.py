@@ -0,0 +1,123 @@
+from io import StringIO
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from .. import forms
+from .. import models
+
+
+class VoteAggregatesTest(TestCase):
+    def setUp(self) -> None:
+        self.profiles = []
+        for name in ['dummy', 'dummy2', 'dummy3']:
+            user = get_user_model().objects.create_user(username=name, password='123secret')
+            self.profiles.append(models.Profile.objects.create(name=name, user=user))
+        self.book = models.Book.objects.create(title='Hobbit')
+        self.other_book = models.Book.objects.create(title='Dune')
+
+    def assertAggregates(self, book, count, total, average):
+        book.refresh_from_db()
+        self.assertEqual((book.vote_count, book.vote_sum), (count, total))
+        if average is None:
+            self.assertIsNone(book.vote_average)
+        else:
+            self.assertAlmostEqual(book.vote_average, average)
+
+    def test_new_book_has_no_votes(self):
+        self.assertAggregates(self.book, 0, 0, None)
+
+    def test_create_update_delete(self):
+        vote1 = models.Vote.objects.create(profile=self.profiles[0], book=self.book, value=10)
+        models.Vote.objects.create(profile=self.profiles[1], book=self.book, value=5)
+        self.assertAggregates(self.book, 2, 15, 7.5)
+
+        vote1 = models.Vote.objects.get(id=vote1.id)
+        vote1.value = 6
+        vote1.save()
+        self.assertAggregates(self.book, 2, 11, 5.5)
+        vote1.save()
+        self.assertAggregates(self.book, 2, 11, 5.5)
+
+        vote1.delete()
+        self.assertAggregates(self.book, 1, 5, 5.0)
+        models.Vote.objects.all().delete()
+        self.assertAggregates(self.book, 0, 0, None)
+
+    def test_moving_vote_to_other_book(self):
+        vote = models.Vote.objects.create(profile=self.profiles[0], book=self.book, value=8)
+        vote.book = self.other_book
+        vote.save()
+        self.assertAggregates(self.book, 0, 0, None)
+        self.assertAggregates(self.other_book, 1, 8, 8.0)
+
+    def test_book_save_does_not_overwrite_aggregates(self):
+        stale = models.Book.objects.get(id=self.book.id)
+        models.Vote.objects.create(profile=self.profiles[0], book=self.book, value=9)
+        stale.title = 'The Hobbit'
+        stale.save()
+        self.assertAggregates(self.book, 1, 9, 9.0)
+        self.assertEqual(self.book.title, 'The Hobbit')
+
+    def test_vote_through_view(self):
+        self.client.login(username='dummy', password='123secret')
+        self.client.post(path='/book/{}/vote/'.format(self.book.id), data={'value': 4})
+        self.assertAggregates(self.book, 1, 4, 4.0)
+        self.client.post(path='/book/{}/vote/'.format(self.book.id), data={'value': 8})
+        self.assertAggregates(self.book, 1, 8, 8.0)
+
+    def test_vote_through_api(self):
+        self.client.login(username='dummy', password='123secret')
+        response = self.client.post(path='/api/votes/', data={'book_id': self.book.id, 'book': '', 'value': 7})
+        self.assertEqual(response.status_code, 201)
+        self.assertAggregates(self.book, 1, 7, 7.0)
+        response = self.client.patch(path='/api/votes/{}/'.format(response.json()['id']), data={'value': 3},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertAggregates(self.book, 1, 3, 3.0)
+
+    def test_duplicate_vote_through_api(self):
+        self.client.login(username='dummy', password='123secret')
+        self.client.post(path='/api/votes/', data={'book_id': self.book.id, 'book': '', 'value': 7})
+        response = self.client.post(path='/api/votes/', data={'book_id': self.book.id, 'book': '', 'value': 2})
+        self.assertEqual(response.status_code, 400)
+        self.assertAggregates(self.book, 1, 7, 7.0)
+
+    def test_vote_created_concurrently_is_updated(self):
+        self.client.login(username='dummy', password='123secret')
+        profile = models.Profile.objects.get(user__username='dummy')
+        is_valid = forms.VoteForm.is_valid
+        calls = []
+
+        def create_concurrent_vote(form):
+            # another request of the same user votes between the lookup and the insert
+            if not calls:
+                models.Vote.objects.create(profile=profile, book=self.book, value=2)
+            calls.append(form)
+            return is_valid(form)
+
+        with mock.patch.object(forms.VoteForm, 'is_valid', create_concurrent_vote):
+            response = self.client.post(path='/book/{}/vote/'.format(self.book.id), data={'value': 8})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(models.Vote.objects.get(book=self.book).value, 8)
+        self.assertAggregates(self.book, 1, 8, 8.0)
+
+    def test_rebuild_command(self):
+        for profile, value in zip(self.profiles, [2, 4, 9]):
+            models.Vote.objects.create(profile=profile, book=self.book, value=value)
+        models.Book.objects.update(vote_count=0, vote_sum=0, vote_average=None)
+        call_command('rebuild_vote_aggregates', batch_size=1, stdout=StringIO())
+        self.assertAggregates(self.book, 3, 15, 5.0)
+        self.assertAggregates(self.other_book, 0, 0, None)
+
+    def test_top_rated_ordering_and_filter(self):
+        models.Vote.objects.create(profile=self.profiles[0], book=self.book, value=6)
+        models.Vote.objects.create(profile=self.profiles[0], book=self.other_book, value=9)
+        unrated = models.Book.objects.create(title='Emma')
+        response = self.client.get(path='/book/list/', data={'order': 'rating'})
+        self.assertEqual(list(response.context['object_list']), [self.other_book, self.book])
+        self.assertNotIn(unrated, response.context['object_list'])
+        response = self.client.get(path='/book/list/', data={'min_rating': 7})
+        self.assertEqual(list(response.context['object_list']), [self.other_book])
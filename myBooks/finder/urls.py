@@ -11,6 +11,7 @@ urlpatterns = [
     path('register/', views.RegistrationView.as_view(), name='register'),
 
     path('book/list/', views.BookListView.as_view(), name='book-list'),
+    path('book/top/', views.TopBooksView.as_view(), name='book-top'),
     path('book/create/', views.BookCreateView.as_view(), name='book-create'),
     path('book/create/<gbooks_id>/', views.BookCreateView.as_view(), name='book-create'),
     path('book/<pk>/', views.BookDetailView.as_view(), name='book-detail'),
@@ -42,8 +43,12 @@ urlpatterns = [
     path('profile/<uuid:uuid>/owned/<int:pk>/', views.ProfileBooksOwnedView.as_view(), name='profile-owned'),
     path('profile/<uuid:uuid>/friends/<uuid:uuid2>', views.ProfileFriendsUpdateView.as_view(), name='profile-friends'),
 
+    path('search/', views.SearchView.as_view(), name='search'),
     path('gbooks/', views.GoogleBooksListView.as_view(), name='gbooks-list'),
     path('gbooks/<gbooks_id>/', views.GoogleBooksDetailView.as_view(), name='gbooks-detail'),
 
+    path('autocomplete/<str:model>/', views.AutocompleteView.as_view(), name='autocomplete'),
+    path('export/<str:dataset>/', views.ExportView.as_view(), name='export'),
+
 ]
 
@@ -1,20 +1,44 @@
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.contrib.auth.views import LoginView, LogoutView
+from django.contrib.auth.views import LoginView, LogoutView, redirect_to_login
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormMixin, FormView
 from django.views.generic.list import ListView
 from django.urls import reverse, reverse_lazy
 from django.forms.models import model_to_dict
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Q, Value
+from django.db.models.functions import Lower
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import classonlymethod
+from django.utils.functional import SimpleLazyObject
 
 from . import models
 from . import forms
-
-import requests
+from . import search
+from . import gbooks
+from . import names
+from . import caching
+from . import enrichment
+from . import exporter
+from . import similarity
+from . import recommendations
+from . import ranking
+from . import friends
+from . import library
+from . import fanout
+from . import duplicates
+from . import pagination
+from .pagination import KeysetPaginationMixin
 
 
 class RegistrationView(CreateView):
@@ -53,14 +77,25 @@ class ProfileDetailView(LoginRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.object in self.request.user.profile.friends.all():
-            context['friends_form'] = forms.ProfileFriendsForm(data={'are_friends': True})
+        profile = self.request.user.profile
+        context['are_friends'] = friends.are_friends(profile.pk, self.object.pk)
+        context['friends_form'] = forms.ProfileFriendsForm(data={'are_friends': context['are_friends']})
+        if self.object == profile:
+            context['recommendations'] = SimpleLazyObject(
+                lambda: recommendations.get_recommended_books(self.object.pk))
+            context['suggestions'] = SimpleLazyObject(lambda: self.get_suggestions(profile.pk))
         else:
-            context['friends_form'] = forms.ProfileFriendsForm(data={'are_friends': False})
+            context['mutual_friends'] = SimpleLazyObject(lambda: list(models.Profile.objects.filter(
+                pk__in=friends.get_mutual_friend_ids(profile.pk, self.object.pk)).order_by('name')))
         return context
 
+    def get_suggestions(self, profile_id):
+        counts = friends.get_suggestions(profile_id)
+        profiles = models.Profile.objects.in_bulk([pk for pk, count in counts])
+        return [(profiles[pk], count) for pk, count in counts if pk in profiles]
+
 
-class ProfileListView(LoginRequiredMixin, ListView):
+class ProfileListView(KeysetPaginationMixin, LoginRequiredMixin, ListView):
     model = models.Profile
     login_url = reverse_lazy('login')
     template_name = 'finder/profile_list.html'
@@ -72,13 +107,13 @@ class ProfileListView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         form = self.form_class(self.request.GET)
         context['form'] = form
-        q = self.request.GET.copy()
-        q.pop(self.page_kwarg, None)
-        context['q'] = q.urlencode()
+        context['q'] = self.get_query_string()
+        profile = getattr(self.request.user, 'profile', None)
+        context['friend_ids'] = friends.get_friend_ids(profile.pk) if profile else frozenset()
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().prefetch_related('books', 'friends')
         if 'name' in self.request.GET:
             queryset = queryset.filter(name__icontains=self.request.GET.get('name'))
         return queryset
@@ -177,82 +212,100 @@ class ProfileBooksOwnedView(LoginRequiredMixin, UserPassesTestMixin, UpdateView)
             elif self.request.POST['owned'] == 'False':
                 profile.books.remove(self.kwargs.get('pk'))
         profile.save()
+        library.refresh(self.request)
         return redirect(self.get_success_url())
 
 
-class GoogleBooksSerializerMixin:
-    @staticmethod
-    def gbooks_serializer(gbook):
-        book = dict()
-        book['title'] = gbook['volumeInfo'].get('title', '')
-        book['authors'] = gbook['volumeInfo'].get('authors', '')
-        book['publisher'] = gbook['volumeInfo'].get('publisher', '')
-        if 'industryIdentifiers' in gbook['volumeInfo']:
-            for identifier in gbook['volumeInfo']['industryIdentifiers']:
-                if identifier['type'] == 'ISBN_13':
-                    book['isbn'] = identifier['identifier']
-                    break
-                elif identifier['type'] == 'ISBN_10':
-                    book['isbn'] = identifier['identifier']
-        else:
-            book['isbn'] = ''
-        book['description'] = gbook['volumeInfo'].get('description', '')
-        if 'imageLinks' in gbook['volumeInfo']:
-            book['thumbnail'] = gbook['volumeInfo']['imageLinks'].get('thumbnail', '')
-        else:
-            book['thumbnail'] = ''
-        book['gbooks_rank'] = gbook['volumeInfo'].get('averageRating', '')
-        book['gbooks_link'] = gbook['volumeInfo'].get('previewLink', '')
-        book['gbooks_id'] = gbook.get('id', '')
-        book['year'] = gbook['volumeInfo'].get('publishedDate', '')[:4]
+class AsyncViewMixin:
+    # class based views of Django 4.0 are sync only, a coroutine function as the view runs the handlers on the event
+    # loop, its sync parts like a redirect or 405 are returned as they are
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            try:
+                response = view(request, *args, **kwargs)
+                return await response if asyncio.iscoroutine(response) else response
+            finally:
+                if not isinstance(request, ASGIRequest):
+                    await gbooks.close_request_session()
+        return functools.update_wrapper(async_view, view)
+
+
+class AsyncLoginRequiredMixin(AsyncViewMixin, LoginRequiredMixin):
+    # request.user is loaded from the session lazily, an async view has to do it outside the event loop
+    async def dispatch(self, request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return self.handle_no_permission()
+        response = super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+        return await response if asyncio.iscoroutine(response) else response
+
+
+class BookFormMixin:
+    def save_book(self, form, **attrs):
+        book = form.save(commit=False)
+        for name, value in attrs.items():
+            setattr(book, name, value)
+        profile = self.request.user.profile
+        publisher = names.split_names([form.cleaned_data.get('publisher') or ''])
+        authors = names.split_names(form.cleaned_data.get('authors'))
+        categories = names.split_names(form.cleaned_data.get('categories'))
+        # saving the book and each of its relations would reindex it for search, once at the end is enough
+        with transaction.atomic(), search.deferred_indexing():
+            publisher_ids = names.resolve_names(models.Publisher, publisher, profile)
+            book.publisher_id = publisher_ids[0] if publisher_ids else None
+            book.save()
+            book.authors.set(names.resolve_names(models.Author, authors, profile))
+            book.categories.set(names.resolve_names(models.Category, categories, profile))
         return book
 
+    def form_valid(self, form):
+        # the book is saved once here, ModelFormMixin.form_valid would save it a second time
+        self.object = self.save_book(form)
+        success_message = self.get_success_message(form.cleaned_data)
+        if success_message:
+            messages.success(self.request, success_message)
+        return redirect(self.get_success_url())
+
 
-class BookCreateView(GoogleBooksSerializerMixin, LoginRequiredMixin, SuccessMessageMixin, CreateView):
+class BookCreateView(BookFormMixin, AsyncLoginRequiredMixin, SuccessMessageMixin, CreateView):
     model = models.Book
     form_class = forms.BookCreateForm
     login_url = reverse_lazy('login')
     success_message = '%(title)s was created successfully!'
     template_name = 'finder/book_create.html'
+    http_method_names = ['get', 'post', 'head', 'options']
+    details = None
+
+    async def get(self, request, *args, **kwargs):
+        # the volume is fetched on the event loop, only the form and the database work take a thread
+        self.details = await gbooks.get_async_client().volume_details(self.kwargs.get('gbooks_id'))
+        # an edition already in the catalogue is opened instead of being added again
+        book_id = await sync_to_async(duplicates.find_book)(self.details['isbn']) if self.details else None
+        if book_id is not None:
+            messages.info(request, '{} is already in the catalogue.'.format(self.details['title']))
+            return redirect('book-detail', book_id)
+        return await sync_to_async(super().get)(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        # the volume is still in the client's cache from rendering the form
+        self.details = await gbooks.get_async_client().volume_details(self.kwargs.get('gbooks_id'))
+        return await sync_to_async(super().post)(request, *args, **kwargs)
 
     def get_success_url(self):
         return reverse('book-detail', args=(self.object.pk,))
 
-    def form_valid(self, form):
-        new_book = form.save(commit=False)
-        new_book.added_by = self.request.user.profile
-
-        publisher = form.cleaned_data.pop('publisher', None)
-        if publisher:
-            pub, pub_created = models.Publisher.objects.get_or_create(
-                name=publisher,
-                defaults={'added_by': self.request.user.profile})
-            new_book.publisher_id = pub.pk
-        new_book.save()
-
-        authors_list = form.cleaned_data.pop('authors', None)
-        if authors_list:
-            for author in authors_list.split(sep=','):
-                auth, auth_created = models.Author.objects.get_or_create(
-                    name=author.strip(),
-                    defaults={'added_by': self.request.user.profile})
-                new_book.authors.add(auth.id)
-            new_book.save()
-
-        categories_list = form.cleaned_data.pop('categories', None)
-        if categories_list:
-            for category in categories_list.split(sep=','):
-                cat, cat_created = models.Category.objects.get_or_create(
-                    name=category.strip(),
-                    defaults={'added_by': self.request.user.profile})
-                new_book.categories.add(cat.id)
-            new_book.save()
-
-        if 'owned' in self.request.POST:
-            if self.request.POST['owned'] == 'True':
-                self.request.user.profile.books.add(new_book.id)
-
-        return super().form_valid(form)
+    def save_book(self, form):
+        attrs = {'added_by': self.request.user.profile}
+        if self.details and self.details['gbooks_rank'] != '':
+            attrs['g_rank'] = self.details['gbooks_rank']
+        new_book = super().save_book(form, **attrs)
+        if self.request.POST.get('owned') == 'True':
+            self.request.user.profile.books.add(new_book.id)
+        # missing details are filled in by the enrich_books workers, not while the user waits
+        enrichment.enqueue_incomplete([new_book])
+        return new_book
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -261,15 +314,13 @@ class BookCreateView(GoogleBooksSerializerMixin, LoginRequiredMixin, SuccessMess
 
     def get_initial(self):
         initial = super().get_initial()
-        if 'gbooks_id' in self.kwargs:
-            response = requests.get(url='https://www.googleapis.com/books/v1/volumes/' + self.kwargs.get('gbooks_id'))
-            if response.status_code == 200:
-                initial = self.gbooks_serializer(response.json())
-                initial['authors'] = ','.join(initial['authors'])
+        if self.details:
+            # the details are shared through the client's cache, they are copied before the change
+            initial = {**self.details, 'authors': ','.join(self.details['authors'])}
         return initial
 
 
-class BookUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
+class BookUpdateView(BookFormMixin, LoginRequiredMixin, SuccessMessageMixin, UpdateView):
     model = models.Book
     form_class = forms.BookCreateForm
     template_name = 'finder/book_update.html'
@@ -297,42 +348,6 @@ class BookUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
         initial['publisher'] = getattr(instance, 'publisher').name if getattr(instance, 'publisher', None) else None
         return initial
 
-    def form_valid(self, form):
-        updated_book = form.save(commit=False)
-
-        publisher = form.cleaned_data.pop('publisher', None)
-        if publisher:
-            pub, pub_created = models.Publisher.objects.get_or_create(
-                name=publisher,
-                defaults={'added_by': self.request.user.profile})
-            updated_book.publisher_id = pub.pk
-        else:
-            updated_book.publisher = None
-        updated_book.save()
-
-        authors_list = form.cleaned_data.pop('authors', None)
-        if authors_list:
-            for author in authors_list.split(sep=','):
-                auth, auth_created = models.Author.objects.get_or_create(
-                    name=author.strip(),
-                    defaults={'added_by': self.request.user.profile})
-                updated_book.authors.add(auth.id)
-            updated_book.save()
-        else:
-            updated_book.authors.clear()
-
-        categories_list = form.cleaned_data.pop('categories', None)
-        if categories_list:
-            for category in categories_list.split(sep=','):
-                cat, cat_created = models.Category.objects.get_or_create(
-                    name=category.strip(),
-                    defaults={'added_by': self.request.user.profile})
-                updated_book.categories.add(cat.id)
-            updated_book.save()
-        else:
-            updated_book.categories.clear()
-        return super().form_valid(form)
-
 
 class BookDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessageMixin, DeleteView):
     model = models.Book
@@ -364,29 +379,39 @@ class BookDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessageMixi
         return context
 
 
-class BookDetailView(DetailView):
+class FragmentCacheMixin:
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(caching.get_context((self.model._meta.model_name, self.object.pk)))
+        return context
+
+
+class BookDetailView(FragmentCacheMixin, DetailView):
     model = models.Book
+    queryset = models.Book.objects.select_related('publisher', 'added_by')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['details'] = model_to_dict(self.object, )
-        context['details']['added_by'] = self.object.added_by
-        context['details']['publisher'] = getattr(self.object, 'publisher')
+        # details and votes are loaded only when the cached fragment has to be rendered again
+        context['details'] = SimpleLazyObject(self.get_details)
+        context['votes'] = SimpleLazyObject(lambda: list(self.object.vote_set.select_related('profile')))
+        context['similar'] = SimpleLazyObject(lambda: list(similarity.get_similar(self.object.pk)))
         if self.request.user.is_authenticated:
-            try:
-                vote = self.object.vote_set.get(profile=self.request.user.profile, book=self.object.id)
-                context['vote_form'] = forms.VoteForm(data={'value': vote.value})
-            except ObjectDoesNotExist:
-                context['vote_form'] = forms.VoteForm()
-
-            if self.object in self.request.user.profile.books.all():
-                context['owned_form'] = forms.ProfileBooksOwnedForm(data={'owned': True})
-            else:
-                context['owned_form'] = forms.ProfileBooksOwnedForm(data={'owned': False})
+            user_library = library.get_library(self.request)
+            vote = user_library.vote_for(self.object.id)
+            context['vote_form'] = forms.VoteForm(data={'value': vote}) if vote is not None else forms.VoteForm()
+            context['owned'] = user_library.owns(self.object.id)
+            context['owned_form'] = forms.ProfileBooksOwnedForm(data={'owned': context['owned']})
         return context
 
+    def get_details(self):
+        details = model_to_dict(self.object)
+        details['added_by'] = self.object.added_by
+        details['publisher'] = self.object.publisher
+        return details
 
-class BookListView(ListView):
+
+class BookListView(KeysetPaginationMixin, ListView):
     model = models.Book
     template_name = 'finder/book_list.html'
     success_url = reverse_lazy('book-list')
@@ -399,23 +424,47 @@ class BookListView(ListView):
         context = super().get_context_data(**kwargs)
         form = self.form_class(self.request.GET)
         context['form'] = form
-        q = self.request.GET.copy()
-        q.pop(self.page_kwarg, None)
-        context['q'] = q.urlencode()
+        context['q'] = self.get_query_string()
+        book_ids = [book.id for book in context['object_list']]
+        if not self.request.user.is_authenticated:
+            context.update(caching.get_context(caching.BOOK_LIST_SCOPE))
+            context['cache_page'] = ','.join(str(book_id) for book_id in book_ids)
+        # relations are prefetched only when the page is not served from the fragment cache
+        context['object_list'] = context['book_list'] = caching.lazy_prefetch(
+            context['object_list'], 'authors', 'categories',
+            Prefetch('vote_set', queryset=models.Vote.objects.select_related('profile')))
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        for k, v in self.request.GET.items():
-            if k == 'page':
-                continue
-            if len(self.request.GET.get(k)) > 0:
-                key = '{}__icontains'.format(k)
-                if k in ['authors', 'categories', 'publisher']:
-                    key = '{}__name__icontains'.format(k)
-                queryset = queryset.filter(**{key: v})
+        queryset = super().get_queryset().select_related('publisher')
+        return search.search_books(queryset, self.request.GET)
 
-        return queryset
+
+class TopBooksView(ListView):
+    template_name = 'finder/book_top.html'
+    context_object_name = 'ranks'
+
+    def get_category(self):
+        try:
+            return models.Category.objects.filter(pk=int(self.request.GET.get('category', ''))).first()
+        except ValueError:
+            return None
+
+    def get_queryset(self):
+        self.category = self.get_category()
+        try:
+            limit = int(self.request.GET.get('limit', ''))
+        except ValueError:
+            limit = None
+        return ranking.get_top(self.category.pk if self.category else None, limit, self.request.GET.get('order'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['category'] = self.category
+        context['order'] = self.request.GET.get('order') if self.request.GET.get('order') in ranking.ORDERINGS \
+            else 'rank'
+        context['orderings'] = list(ranking.ORDERINGS)
+        return context
 
 
 class VoteCreateUpdateView(LoginRequiredMixin, UpdateView):
@@ -431,12 +480,23 @@ class VoteCreateUpdateView(LoginRequiredMixin, UpdateView):
         except ObjectDoesNotExist:
             form = self.form_class(data={'profile': profile, 'book': book, 'value': self.request.POST.get('value')})
             if form.is_valid():
-                vote = models.Vote.objects.create(profile=profile, book=book, value=self.request.POST.get('value'))
+                try:
+                    with transaction.atomic():
+                        vote = models.Vote.objects.create(profile=profile, book=book,
+                                                          value=self.request.POST.get('value'))
+                except IntegrityError:
+                    # a concurrent request voted first, its vote is updated with this value instead
+                    vote = models.Vote.objects.get(profile=profile, book=book)
             else:
                 messages.error(self.request, form.errors)
                 return redirect('book-detail', pk=book.id)
         return vote
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        library.refresh(self.request)
+        return response
+
     def get_success_url(self):
         return reverse('book-detail', args=(self.object.book.pk,))
 
@@ -489,11 +549,11 @@ class PublisherDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessag
         return super().handle_no_permission()
 
 
-class PublisherDetailView(DetailView):
+class PublisherDetailView(FragmentCacheMixin, DetailView):
     model = models.Publisher
 
 
-class PublisherListView(ListView):
+class PublisherListView(KeysetPaginationMixin, ListView):
     model = models.Publisher
     template_name = 'finder/publisher_list.html'
     success_url = reverse_lazy('publisher-list')
@@ -505,13 +565,12 @@ class PublisherListView(ListView):
         context = super().get_context_data(**kwargs)
         form = self.form_class(self.request.GET)
         context['form'] = form
-        q = self.request.GET.copy()
-        q.pop(self.page_kwarg, None)
-        context['q'] = q.urlencode()
+        context['q'] = self.get_query_string()
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().prefetch_related(
+            Prefetch('book_set', queryset=models.Book.objects.only('id', 'title', 'publisher')))
         if 'name' in self.request.GET:
             queryset = queryset.filter(name__icontains=self.request.GET.get('name'))
         return queryset
@@ -565,11 +624,11 @@ class AuthorDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessageMi
         return super().handle_no_permission()
 
 
-class AuthorDetailView(DetailView):
+class AuthorDetailView(FragmentCacheMixin, DetailView):
     model = models.Author
 
 
-class AuthorListView(ListView):
+class AuthorListView(KeysetPaginationMixin, ListView):
     model = models.Author
     template_name = 'finder/author_list.html'
     success_url = reverse_lazy('author-list')
@@ -581,13 +640,12 @@ class AuthorListView(ListView):
         context = super(AuthorListView, self).get_context_data(**kwargs)
         form = self.form_class(self.request.GET)
         context['form'] = form
-        q = self.request.GET.copy()
-        q.pop(self.page_kwarg, None)
-        context['q'] = q.urlencode()
+        context['q'] = self.get_query_string()
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().prefetch_related(
+            Prefetch('book_set', queryset=models.Book.objects.only('id', 'title')))
         if 'name' in self.request.GET:
             queryset = queryset.filter(name__icontains=self.request.GET.get('name'))
         return queryset
@@ -641,11 +699,11 @@ class CategoryDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessage
         return super().handle_no_permission()
 
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(FragmentCacheMixin, DetailView):
     model = models.Category
 
 
-class CategoryListView(ListView):
+class CategoryListView(KeysetPaginationMixin, ListView):
     model = models.Category
     template_name = 'finder/category_list.html'
     success_url = reverse_lazy('category-list')
@@ -657,29 +715,30 @@ class CategoryListView(ListView):
         context = super(CategoryListView, self).get_context_data(**kwargs)
         form = self.form_class(self.request.GET)
         context['form'] = form
-        q = self.request.GET.copy()
-        q.pop(self.page_kwarg, None)
-        context['q'] = q.urlencode()
+        context['q'] = self.get_query_string()
         return context
 
     def get_queryset(self):
-        queryset = super(CategoryListView, self).get_queryset()
+        queryset = super(CategoryListView, self).get_queryset().prefetch_related(
+            Prefetch('book_set', queryset=models.Book.objects.only('id', 'title')))
         if 'name' in self.request.GET:
             queryset = queryset.filter(name__icontains=self.request.GET.get('name'))
         return queryset
 
 
-class GoogleBooksListView(GoogleBooksSerializerMixin, FormView):
+class GoogleBooksListView(AsyncViewMixin, FormView):
     form_class = forms.GoogleBooksForm
     template_name = 'finder/gbooks_list.html'
+    http_method_names = ['get', 'head', 'options']
 
-    def get_context_data(self, **kwargs):
+    async def get(self, request, *args, **kwargs):
+        items = await gbooks.get_async_client().search_details(**self.get_gbooks_query())
+        return self.render_to_response(self.get_context_data(items=items))
+
+    def get_context_data(self, items=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        response = requests.get(url=self.get_gbooks_url())
-        if response.status_code == 200:
-            response = response.json()
-            if 'items' in response:
-                context['gbooks_list'] = [self.gbooks_serializer(book) for book in response['items']]
+        if items:
+            context['gbooks_list'] = items
         return context
 
     def get_initial(self):
@@ -688,31 +747,111 @@ class GoogleBooksListView(GoogleBooksSerializerMixin, FormView):
             initial[field] = self.request.GET[field]
         return initial
 
-    def get_gbooks_url(self):
-        url = 'https://www.googleapis.com/books/v1/volumes?q='
-        if 'title' in self.request.GET and self.request.GET['title'].strip() != '':
-            url += '+intitle:' + '+intitle:'.join(self.request.GET['title'].split())
-        if 'authors' in self.request.GET and self.request.GET['authors'].strip() != '':
-            url += '+inauthor:' + '+inauthor:'.join(self.request.GET['authors'].split())
-        if 'publisher' in self.request.GET and self.request.GET['publisher'].strip() != '':
-            url += '+inpublisher:' + 'inpublisher:'.join(self.request.GET['publisher'].split())
-        if 'isbn' in self.request.GET and self.request.GET['isbn'].strip() != '':
-            url += '+isbn:' + self.request.GET['isbn']
-        url += '&maxResults=20'
-        return url
-
-
-class GoogleBooksDetailView(GoogleBooksSerializerMixin, TemplateView):
+    def get_gbooks_query(self):
+        return {field: self.request.GET.get(field, '') for field in ['title', 'authors', 'publisher', 'isbn']}
+
+
+class SearchView(AsyncViewMixin, FormView):
+    form_class = forms.GoogleBooksForm
+    template_name = 'finder/search.html'
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data()
+        if context['form'].is_valid():
+            context.update(await fanout.asearch_all(context['form'].cleaned_data))
+        return self.render_to_response(context)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['data'] = self.request.GET
+        return kwargs
+
+
+class GoogleBooksDetailView(AsyncViewMixin, TemplateView):
     template_name = 'finder/gbooks_detail.html'
 
-    def get_context_data(self, **kwargs):
+    async def get(self, request, *args, **kwargs):
+        details = await gbooks.get_async_client().volume_details(self.kwargs.get('gbooks_id'))
+        return self.render_to_response(self.get_context_data(details=details, **kwargs))
+
+    def get_context_data(self, details=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        response = requests.get(url='https://www.googleapis.com/books/v1/volumes/' + self.kwargs.get('gbooks_id'))
-        if response.status_code == 200:
-            book = self.gbooks_serializer(response.json())
-            context['book'] = book
+        if details:
+            context['book'] = details
         return context
 
 
+class AutocompleteView(View):
+    autocomplete_models = {
+        'author': models.Author,
+        'category': models.Category,
+        'publisher': models.Publisher,
+        'profile': models.Profile,
+    }
+    login_required_models = ['profile']
+    paginate_by = 10
+    max_paginate_by = 50
+
+    def get(self, request, *args, **kwargs):
+        model_name = self.kwargs['model']
+        if model_name not in self.autocomplete_models:
+            raise Http404
+        if model_name in self.login_required_models and not request.user.is_authenticated:
+            return JsonResponse({'results': [], 'next': None}, status=403)
+
+        prefix = request.GET.get('q', '').strip()
+        if not prefix:
+            return JsonResponse({'results': [], 'next': None})
+        try:
+            limit = max(1, min(int(request.GET.get('limit', self.paginate_by)), self.max_paginate_by))
+        except ValueError:
+            limit = self.paginate_by
+
+        # a range scan over lower(name) is served by the functional index, unlike LIKE on SQLite; the prefix is lowered
+        # by the database too, SQLite only folds ascii and str.lower() would miss non-ascii names
+        queryset = self.autocomplete_models[model_name].objects.annotate(name_lower=Lower('name')).filter(
+            name_lower__gte=Lower(Value(prefix)), name_lower__lt=Lower(Value(prefix + chr(0x10ffff))))
+        if request.GET.get('after'):
+            # names differing only in case share lower(name), the unique name breaks the tie
+            try:
+                after_lower, after_name = pagination.decode_cursor(request.GET.get('after'))
+            except (pagination.InvalidCursor, ValueError):
+                raise Http404('Invalid cursor.')
+            queryset = queryset.filter(Q(name_lower__gt=after_lower) | Q(name_lower=after_lower, name__gt=after_name))
+        # the cursor keeps lower(name) as the database computed it, it differs from str.lower() outside ascii on SQLite
+        rows = list(queryset.order_by('name_lower', 'name').values_list('name_lower', 'name')[:limit + 1])
+        next_after = pagination.encode_cursor(list(rows[limit - 1])) if len(rows) > limit else None
+        return JsonResponse({'results': [name for _, name in rows[:limit]], 'next': next_after})
+
+
+class ExportView(View):
+    login_required_datasets = ['votes', 'owned']
+
+    def get_profile_ids(self, dataset):
+        # staff get the full dump, everyone else only the rows the profile page would show them
+        if self.request.user.is_staff:
+            return None
+        profile_id = self.request.user.profile.id
+        if dataset == 'owned':
+            return [profile_id, *friends.get_friend_ids(profile_id)]
+        return [profile_id]
+
+    def get(self, request, *args, **kwargs):
+        dataset = self.kwargs['dataset']
+        format = request.GET.get('format', 'jsonl')
+        if dataset not in exporter.DATASETS or format not in exporter.FORMATS:
+            raise Http404
+        filters = {}
+        if dataset in self.login_required_datasets:
+            if not request.user.is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            filters['profile_ids'] = self.get_profile_ids(dataset)
+        response = StreamingHttpResponse(exporter.export(dataset, format, **filters),
+                                         content_type=exporter.CONTENT_TYPES[format])
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(dataset, format)
+        return response
+
+
 class AboutView(TemplateView):
     template_name = 'finder/about.html'
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'VOLUME_TTL': 7 * 24 * 3600,
+    'SEARCH_TTL': 24 * 3600,
+    'MAX_VOLUMES': 20000,
+    'MAX_SEARCHES': 5000,
+    # accessed orders the eviction, it is written at most this often per entry, with the next write of the store
+    'TOUCH_INTERVAL': 3600,
+    # saved entries between two evictions
+    'EVICT_EVERY': 100,
+}
+
+VOLUME, SEARCH = 'volume', 'search'
+# memory and stored are answered without google, revalidated costs a request without a body
+OUTCOMES = ['memory', 'stored', 'revalidated', 'fetched', 'stale']
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'GOOGLE_BOOKS_STORE', {})}
+
+
+def search_key(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class Entry:
+    def __init__(self, data, details, etag, expires):
+        self.data = data
+        self.details = details
+        self.etag = etag
+        self.expires = expires
+
+    @property
+    def fresh(self):
+        return self.expires > timezone.now()
+
+
+class VolumeStore:
+    # keys are the ones of the client cache, ('volume', gbooks_id) and ('search', query, max_results)
+    def __init__(self, using=None, **options):
+        self.options = {**get_options(), **options}
+        self.using = using
+        self.stats = Counter()
+        self._writes = 0
+        self._touched = {VOLUME: set(), SEARCH: set()}
+        self._lock = threading.Lock()
+
+    def record(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = {outcome: self.stats[outcome] for outcome in OUTCOMES}
+        total = sum(stats.values())
+        stats['hit_ratio'] = (stats['memory'] + stats['stored']) / total if total else None
+        return stats
+
+    def safely(self, method, *args):
+        # the store is only a cache, a failing database must not fail the request
+        try:
+            return method(*args)
+        except DatabaseError:
+            logger.exception('Google Books store failed.')
+            return None
+
+    def _write_db(self):
+        # only writes ask the router for the primary, which pins the rest of the request to it
+        return self.using or router.db_for_write(models.GoogleBooksVolume)
+
+    def _volumes(self):
+        return models.GoogleBooksVolume.objects.using(self.using)
+
+    def _searches(self):
+        return models.GoogleBooksSearch.objects.using(self.using)
+
+    def _ttl(self, key):
+        return timedelta(seconds=self.options['VOLUME_TTL' if key[0] == VOLUME else 'SEARCH_TTL'])
+
+    def _query(self, key):
+        return '{}|{}'.format(key[1], key[2])
+
+    def _touch(self, kind, pks):
+        with self._lock:
+            self._touched[kind].update(pks)
+
+    def _save_touched(self, now):
+        with self._lock:
+            touched, self._touched = self._touched, {VOLUME: set(), SEARCH: set()}
+        if touched[VOLUME]:
+            self._volumes().filter(pk__in=sorted(touched[VOLUME]), accessed__lt=now).update(accessed=now)
+        if touched[SEARCH]:
+            self._searches().filter(pk__in=sorted(touched[SEARCH]), accessed__lt=now).update(accessed=now)
+
+    def get(self, key):
+        # reads stay on the database the router reads from, the access times are saved by the next write
+        touch = timezone.now() - timedelta(seconds=self.options['TOUCH_INTERVAL'])
+        if key[0] == VOLUME:
+            row = self._volumes().filter(gbooks_id=key[1], complete=True).first()
+            if row is None:
+                return None
+            if row.accessed < touch:
+                self._touch(VOLUME, [row.pk])
+            return Entry(row.payload, row.details, row.etag, row.expires)
+
+        row = self._searches().filter(key=search_key(self._query(key))).first()
+        if row is None:
+            return None
+        volumes = {volume.gbooks_id: volume for volume in self._volumes().filter(gbooks_id__in=row.volume_ids)}
+        if len(volumes) < len(row.volume_ids):
+            # some of its volumes were evicted, the search is fetched again
+            return None
+        if row.accessed < touch:
+            self._touch(SEARCH, [row.pk])
+            self._touch(VOLUME, [volume.pk for volume in volumes.values() if volume.accessed < touch])
+        return Entry({'items': [volumes[gbooks_id].payload for gbooks_id in row.volume_ids]},
+                     [volumes[gbooks_id].details for gbooks_id in row.volume_ids], row.etag, row.expires)
+
+    def set(self, key, data, details, etag=''):
+        now = timezone.now()
+        expires = now + self._ttl(key)
+        with transaction.atomic(self._write_db()):
+            self._save_touched(now)
+            if key[0] == VOLUME:
+                self._volumes().update_or_create(gbooks_id=key[1], defaults={
+                    'payload': data, 'details': details, 'complete': True, 'etag': etag or '', 'expires': expires,
+                    'accessed': now})
+            else:
+                items = (data or {}).get('items', [])
+                volume_ids = self._save_results(items, details, expires, now)
+                self._searches().update_or_create(key=search_key(self._query(key)), defaults={
+                    'query': self._query(key), 'volume_ids': volume_ids, 'etag': etag or '', 'expires': expires,
+                    'accessed': now})
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.options['EVICT_EVERY'] == 0
+        if evict:
+            self.evict()
+
+    def _save_results(self, items, details, expires, now):
+        # search results are shorter than the volumes, a complete volume is not replaced by one
+        results = {item['id']: (item, item_details) for item, item_details in zip(items, details) if item.get('id')}
+        rows = {row.gbooks_id: row for row in self._volumes().filter(gbooks_id__in=list(results))}
+        changed = []
+        for gbooks_id, row in rows.items():
+            if not row.complete:
+                row.payload, row.details = results[gbooks_id]
+                row.expires, row.accessed = expires, now
+                changed.append(row)
+        self._volumes().bulk_update(changed, ['payload', 'details', 'expires', 'accessed'])
+        self._volumes().bulk_create([
+            models.GoogleBooksVolume(gbooks_id=gbooks_id, payload=item, details=item_details, expires=expires,
+                                     accessed=now)
+            for gbooks_id, (item, item_details) in results.items() if gbooks_id not in rows], ignore_conflicts=True)
+        return list(results)
+
+    def refresh(self, key):
+        # google answered 304, the stored copy is fresh for another ttl
+        now = timezone.now()
+        if key[0] == VOLUME:
+            rows = self._volumes().filter(gbooks_id=key[1], complete=True)
+        else:
+            rows = self._searches().filter(key=search_key(self._query(key)))
+        with transaction.atomic(self._write_db()):
+            self._save_touched(now)
+            rows.update(expires=now + self._ttl(key), accessed=now)
+
+    def evict(self):
+        # the least recently used entries above the limits are deleted
+        evicted = 0
+        with transaction.atomic(self._write_db()):
+            self._save_touched(timezone.now())
+            for queryset, limit in [(self._searches(), self.options['MAX_SEARCHES']),
+                                    (self._volumes(), self.options['MAX_VOLUMES'])]:
+                boundary = queryset.order_by('-accessed', '-id').values_list('accessed', 'id')[limit:limit + 1]
+                for accessed, pk in boundary:
+                    older = Q(accessed__lt=accessed) | Q(accessed=accessed, id__lte=pk)
+                    evicted += queryset.filter(older).delete()[0]
+        return evicted
+
+    def clear(self):
+        return self._searches().delete()[0] + self._volumes().delete()[0]
+
+    def count(self):
+        now = timezone.now()
+        return {'volumes': self._volumes().count(), 'complete_volumes': self._volumes().filter(complete=True).count(),
+                'searches': self._searches().count(),
+                'expired_volumes': self._volumes().filter(expires__lte=now).count(),
+                'expired_searches': self._searches().filter(expires__lte=now).count()}
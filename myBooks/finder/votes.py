@@ -0,0 +1,48 @@
+from django.db.models import Avg, Case, Count, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from . import models
+
+
+def apply_vote_delta(book_id, count_delta, sum_delta):
+    count = F('vote_count') + count_delta
+    total = F('vote_sum') + sum_delta
+    # every right-hand side sees the row before the update, so the whole change is a single atomic statement
+    models.Book.objects.filter(pk=book_id).update(
+        vote_count=count,
+        vote_sum=total,
+        similarity_stale=True,
+        vote_average=Case(
+            When(vote_count__gt=-count_delta, then=Cast(total, FloatField()) / Cast(count, FloatField())),
+            default=Value(None),
+            output_field=FloatField()))
+
+
+def vote_saved(vote, created):
+    value = int(vote.value)
+    loaded = getattr(vote, '_loaded_values', {})
+    if created:
+        apply_vote_delta(vote.book_id, 1, value)
+    elif 'book_id' not in loaded or 'value' not in loaded:
+        rebuild_vote_aggregates(models.Book.objects.filter(pk=vote.book_id))
+    elif loaded['book_id'] != vote.book_id:
+        apply_vote_delta(loaded['book_id'], -1, -loaded['value'])
+        apply_vote_delta(vote.book_id, 1, value)
+    elif loaded['value'] != value:
+        apply_vote_delta(vote.book_id, 0, value - loaded['value'])
+    vote._loaded_values = {'book_id': vote.book_id, 'value': value}
+
+
+def vote_deleted(vote):
+    loaded = getattr(vote, '_loaded_values', {})
+    apply_vote_delta(loaded.get('book_id', vote.book_id), -1, -loaded.get('value', int(vote.value)))
+
+
+def rebuild_vote_aggregates(queryset=None):
+    if queryset is None:
+        queryset = models.Book.objects.all()
+    votes = models.Vote.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    return queryset.update(
+        vote_count=Coalesce(Subquery(votes.annotate(count=Count('id')).values('count')), 0),
+        vote_sum=Coalesce(Subquery(votes.annotate(total=Sum('value')).values('total')), 0),
+        vote_average=Subquery(votes.annotate(average=Avg('value')).values('average')))
@@ -0,0 +1,21 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    # tests clear the cache, so they get a file cache of their own instead of the shared one
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_location = tempfile.mkdtemp(prefix='mybooks-cache-')
+        self.cache_settings = override_settings(CACHES=dict(
+            settings.CACHES, default=dict(settings.CACHES['default'], LOCATION=self.cache_location)))
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_location, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
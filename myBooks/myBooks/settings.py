@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+from . import database
 from .secret_settings import SECRET_KEY
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -34,6 +35,8 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'finder.metrics.RequestMetricsMiddleware',
+    'finder.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +61,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'finder.context_processors.library',
             ],
         },
     },
@@ -69,11 +73,15 @@ WSGI_APPLICATION = 'myBooks.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# DATABASE_URL (sqlite:///db.sqlite3 by default), DATABASE_REPLICA_URLS, DATABASE_CONN_MAX_AGE and
+# DATABASE_CONN_HEALTH_CHECKS are read from the environment
+DATABASES = database.get_databases(os.environ, BASE_DIR)
+
+DATABASE_ROUTERS = ['finder.routers.ReplicaRouter']
+
+DATABASE_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': 10,
 }
 
 
@@ -124,10 +132,87 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'static/images')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'login/'
 
+GOOGLE_BOOKS = {
+    'API_URL': 'https://www.googleapis.com/books/v1/volumes',
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 5,
+    'CACHE_TTL': 600,
+    'CACHE_SIZE': 1000,
+    'STORE': True,
+}
+
+GOOGLE_BOOKS_STORE = {
+    'VOLUME_TTL': 7 * 24 * 3600,
+    'SEARCH_TTL': 24 * 3600,
+    'MAX_VOLUMES': 20000,
+    'MAX_SEARCHES': 5000,
+}
+
+FANOUT_SEARCH = {
+    'TIMEOUT': 2.5,
+    'LOCAL_LIMIT': 20,
+}
+
+# the enrichment workers and the management commands bump the versions of cached pages after their writes, so the
+# cache has to be shared by all processes, a process-local LocMemCache would keep serving stale pages;
+# CACHE_LOCATION (myBooks/cache by default) is read from the environment
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION') or BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# the tests run against a temporary cache directory
+TEST_RUNNER = 'myBooks.runner.TestRunner'
+
+PAGE_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': 600,
+}
+
+METRICS = {
+    'HEADERS': DEBUG,
+    'LOG': False,
+    'STRICT': False,
+    'BUDGETS': {
+        'main': {'queries': 8},
+        'book-list': {'queries': 8},
+        'book-detail': {'queries': 10},
+        'author-list': {'queries': 6},
+        'author-detail': {'queries': 6},
+        'category-list': {'queries': 6},
+        'category-detail': {'queries': 6},
+        'publisher-list': {'queries': 6},
+        'publisher-detail': {'queries': 6},
+        'autocomplete': {'queries': 3},
+        'book-top': {'queries': 6},
+        'search': {'queries': 4},
+        'api:book-list': {'queries': 6},
+        'api:book-top': {'queries': 3},
+    },
+}
+
+ENRICHMENT = {
+    'BATCH_SIZE': 20,
+    'RATE': 1.0,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 60,
+}
+
+RANKING = {
+    'PRIOR_VOTES': 5,
+    'GOOGLE_WEIGHT': 0.5,
+    'TOP_LIMIT': 100,
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAdminUser'],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'finder.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }